@@ -0,0 +1,185 @@
+"""Benchmark harness for the Financial Dashboard API.
+
+Usage (from backend/, needs requirements-dev.txt):
+    python -m benchmarks.run                                   # 10k and 1M rows
+    python -m benchmarks.run --sizes 10k,1m,10m --output benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json --tolerance 0.25
+
+For every size a database is seeded once with generate_sample_data.py and
+cached under ``--fixtures-dir``. Each run benchmarks a scratch copy of it in
+a separate worker process (see benchmarks.worker) and the results land in
+one JSON file. ``--compare`` checks the new results against a baseline and
+exits with status 1 when a scenario got slower or lost throughput beyond the
+tolerance, so it can gate a deploy.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATABASE_FILE = "financial_dashboard.db"
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+
+def parse_sizes(value):
+    sizes = []
+    for name in value.split(","):
+        name = name.strip().lower()
+        if name not in SIZES:
+            raise argparse.ArgumentTypeError(f"unknown size {name!r}, choose from {', '.join(SIZES)}")
+        sizes.append(name)
+    return sizes
+
+
+def seed_fixture(size, args):
+    """Seeded database for ``size``, generated on first use"""
+    fixture_dir = os.path.join(args.fixtures_dir, f"{size}-seed{args.seed}-years{args.years:g}")
+    fixture = os.path.join(fixture_dir, DATABASE_FILE)
+    if os.path.exists(fixture):
+        return fixture_dir, None
+
+    print(f"🌱 Gerando base {size} ({SIZES[size]:,} transações)...", file=sys.stderr)
+    os.makedirs(fixture_dir, exist_ok=True)
+    started = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable, "generate_sample_data.py",
+            "--scale", str(SIZES[size] / 1_000_000),
+            "--seed", str(args.seed),
+            "--years", str(args.years),
+            "--database-dir", fixture_dir,
+        ],
+        cwd=BACKEND_DIR,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    # Fold the WAL into the main file so a plain copy is complete
+    with sqlite3.connect(fixture) as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return fixture_dir, round(time.perf_counter() - started, 1)
+
+
+def run_size(size, args):
+    fixture_dir, seed_seconds = seed_fixture(size, args)
+    with tempfile.TemporaryDirectory(prefix=f"benchmark-{size}-") as scratch:
+        # Writes would otherwise change the cached fixture between runs
+        shutil.copy(os.path.join(fixture_dir, DATABASE_FILE), os.path.join(scratch, DATABASE_FILE))
+        result_file = os.path.join(scratch, "result.json")
+        command = [
+            sys.executable, "-m", "benchmarks.worker",
+            "--database-dir", scratch,
+            "--result-file", result_file,
+            "--seed", str(args.seed),
+            "--requests", str(args.requests),
+            "--duration", str(args.duration),
+            "--concurrency", str(args.concurrency),
+            "--max-seconds", str(args.max_seconds),
+        ]
+        if args.only:
+            command += ["--only", *args.only]
+        if args.with_cache:
+            command.append("--with-cache")
+        if args.columnar:
+            command.append("--columnar")
+
+        print(f"⏱️  Benchmark {size}...", file=sys.stderr)
+        subprocess.run(command, cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL)
+        with open(result_file, encoding="utf-8") as handle:
+            result = json.load(handle)
+
+    result["transactions"] = SIZES[size]
+    if seed_seconds is not None:
+        result["seed_seconds"] = seed_seconds
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of ``results`` against ``baseline``, as printable lines"""
+    regressions = []
+    for size, current in results["sizes"].items():
+        previous = baseline.get("sizes", {}).get(size)
+        if not previous:
+            continue
+        for name, scenario in current["scenarios"].items():
+            before = previous["scenarios"].get(name)
+            if not before:
+                continue
+            p95, old_p95 = scenario["sequential"]["p95_ms"], before["sequential"]["p95_ms"]
+            if p95 and old_p95 and p95 > old_p95 * (1 + tolerance):
+                regressions.append(f"{size} {name}: p95 {old_p95} ms -> {p95} ms")
+            rps = scenario["concurrent"].get("throughput_rps")
+            old_rps = before["concurrent"].get("throughput_rps")
+            if rps and old_rps and rps < old_rps * (1 - tolerance):
+                regressions.append(f"{size} {name}: throughput {old_rps} -> {rps} req/s")
+            if scenario["sequential"]["errors"] or scenario["concurrent"]["errors"]:
+                regressions.append(f"{size} {name}: requests failed")
+        peak, old_peak = current.get("peak_rss_mb"), previous.get("peak_rss_mb")
+        if peak and old_peak and peak > old_peak * (1 + tolerance):
+            regressions.append(f"{size}: peak RSS {old_peak} MB -> {peak} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Financial Dashboard API benchmarks")
+    parser.add_argument("--sizes", type=parse_sizes, default=parse_sizes("10k,1m"), help="Comma separated: 10k,100k,1m,10m")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--years", type=float, default=3.0, help="History covered by the seeded data")
+    parser.add_argument("--requests", type=int, default=50, help="Sequential requests per scenario")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds of concurrent load per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Parallel clients in the load phase")
+    parser.add_argument("--max-seconds", type=float, default=30.0, help="Time cap of a sequential phase")
+    parser.add_argument("--only", nargs="*", help="Scenario names to run (default: all)")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the response cache on")
+    parser.add_argument("--columnar", action="store_true", help="Answer analytics from the columnar engine")
+    parser.add_argument("--fixtures-dir", default=os.path.join(tempfile.gettempdir(), "financial_dashboard_benchmarks"))
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results.json"))
+    parser.add_argument("--compare", metavar="BASELINE", help="Fail when results regress against this file")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Allowed relative slowdown (0.20 = 20%%)")
+    args = parser.parse_args()
+
+    results = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": args.seed,
+            "years": args.years,
+            "requests": args.requests,
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "response_cache": args.with_cache,
+            "columnar": args.columnar,
+        },
+        "sizes": {size: run_size(size, args) for size in args.sizes},
+    }
+
+    output = os.path.abspath(args.output)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2, ensure_ascii=False)
+    print(f"✅ Resultados salvos em {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        if regressions:
+            print("❌ Regressões de desempenho:", file=sys.stderr)
+            for line in regressions:
+                print(f"   • {line}", file=sys.stderr)
+            sys.exit(1)
+        print("✅ Nenhuma regressão em relação ao baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
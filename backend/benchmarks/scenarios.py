@@ -0,0 +1,163 @@
+"""Requests driven by the benchmark, one scenario per route.
+
+Each scenario builds a request from the context the worker discovered in
+the seeded database (account ids, the latest year, the id range) and a
+seeded ``random.Random``, so runs against the same fixture are comparable.
+Read scenarios come first; writes run last because they change the data.
+Streamed scenarios (the SSE feed) are timed up to their first chunk, after
+which the client disconnects.
+"""
+from datetime import timedelta
+
+
+class Scenario:
+    def __init__(self, name, build, write=False, heavy=False):
+        self.name = name
+        self.build = build
+        # Writes mutate the fixture and run after every read
+        self.write = write
+        # Heavy scenarios (full exports) get fewer iterations
+        self.heavy = heavy
+
+
+def _random_transaction(context, rng):
+    day = context["latest_date"] - timedelta(days=rng.randint(0, 365))
+    expense = rng.random() < 0.8
+    return {
+        "date": day.isoformat(),
+        "description": rng.choice(["Supermercado", "Uber", "Padaria", "PIX recebido", "Salário mensal"]),
+        "transaction_type": "saida" if expense else "entrada",
+        "category": rng.choice(["Alimentação", "Transporte", "Restaurantes"]) if expense else "Transferencia bancária",
+        "amount": round(rng.uniform(5, 500), 2),
+        "account_id": rng.choice(context["account_ids"]),
+    }
+
+
+def _get(path, **params):
+    return lambda context, rng: {"method": "GET", "url": path, "params": params}
+
+
+def _transactions_page(context, rng):
+    # Deep pages go through the cursor the previous page handed out
+    if context.get("cursor") and rng.random() < 0.5:
+        return {"method": "GET", "url": "/transactions/", "params": {"limit": 100, "cursor": context["cursor"]}}
+    return {"method": "GET", "url": "/transactions/", "params": {"limit": 100}}
+
+
+def _transactions_month(context, rng):
+    return {
+        "method": "GET",
+        "url": "/transactions/",
+        "params": {"month": rng.randint(1, 12), "year": context["year"], "account_id": rng.choice(context["account_ids"])},
+    }
+
+
+def _stats_year(context, rng):
+    return {"method": "GET", "url": "/transactions/stats", "params": {"year": context["year"]}}
+
+
+def _monthly(context, rng):
+    return {"method": "GET", "url": "/transactions/monthly", "params": {"year": context["year"]}}
+
+
+def _balance_history_batch(context, rng):
+    return {
+        "method": "GET",
+        "url": "/accounts/balance-history",
+        "params": {"account_ids": context["account_ids"], "days": 365, "resolution": "week"},
+    }
+
+
+def _balance_history_account(context, rng):
+    return {"method": "GET", "url": f"/accounts/{rng.choice(context['account_ids'])}/balance-history", "params": {"days": 30}}
+
+
+def _balance_as_of(context, rng):
+    day = context["latest_date"].date() - timedelta(days=rng.randint(0, 365))
+    return {
+        "method": "GET",
+        "url": f"/accounts/{rng.choice(context['account_ids'])}/balance",
+        "params": {"as_of": day.isoformat()},
+    }
+
+
+def _changes(context, rng):
+    # What a polling client sends: the seq it got last time
+    return {"method": "GET", "url": "/changes", "params": {"since": context["change_seq"]}}
+
+
+def _events(context, rng):
+    # Subscribing up to the opening event
+    return {"method": "GET", "url": "/events", "stream": True}
+
+
+def _create_transaction(context, rng):
+    return {"method": "POST", "url": "/transactions/", "json": _random_transaction(context, rng)}
+
+
+def _create_bulk(context, rng):
+    return {"method": "POST", "url": "/transactions/bulk", "json": [_random_transaction(context, rng) for _ in range(100)]}
+
+
+def _update_transaction(context, rng):
+    transaction_id = rng.randint(1, context["max_id"])
+    return {"method": "PUT", "url": f"/transactions/{transaction_id}", "json": _random_transaction(context, rng)}
+
+
+def _delete_transaction(context, rng):
+    # Walk down from the newest id so each delete hits an existing row
+    context["max_id"] -= 1
+    return {"method": "DELETE", "url": f"/transactions/{context['max_id'] + 1}"}
+
+
+def _create_account(context, rng):
+    return {"method": "POST", "url": "/accounts/", "json": {"name": f"Conta benchmark {rng.randint(1, 10**6)}", "balance": 0.0}}
+
+
+def _update_account(context, rng):
+    account_id = rng.choice(context["account_ids"])
+    return {
+        "method": "PUT",
+        "url": f"/accounts/{account_id}",
+        "json": {"name": f"Conta {account_id}", "balance": round(rng.uniform(-1000, 10000), 2)},
+    }
+
+
+def _import_merge(context, rng):
+    # A JSON export with transactions only, appended to the ledger
+    document = {"accounts": [], "transactions": [_random_transaction(context, rng) for _ in range(100)]}
+    return {"method": "POST", "url": "/import", "params": {"format": "json", "mode": "merge"}, "json": document}
+
+
+def _rename_account(context, rng):
+    account_id = rng.choice(context["account_ids"])
+    return {"method": "PATCH", "url": f"/accounts/{account_id}/name", "json": {"name": f"Conta {account_id}"}}
+
+
+SCENARIOS = [
+    Scenario("accounts_list", _get("/accounts/")),
+    Scenario("accounts_balance", _get("/accounts/balance")),
+    Scenario("accounts_balance_history", _balance_history_batch),
+    Scenario("account_balance_history", _balance_history_account),
+    Scenario("account_balance_as_of", _balance_as_of),
+    Scenario("transactions_page", _transactions_page),
+    Scenario("transactions_month_filter", _transactions_month),
+    Scenario("transactions_search", _get("/transactions/", search="padaria", limit=50)),
+    Scenario("transactions_monthly", _monthly),
+    Scenario("transactions_yearly", _get("/transactions/yearly")),
+    Scenario("transactions_stats", _get("/transactions/stats")),
+    Scenario("transactions_stats_year", _stats_year),
+    Scenario("categories_list", _get("/categories/")),
+    Scenario("changes_poll", _changes),
+    Scenario("events_subscribe", _events),
+    Scenario("export_ndjson", _get("/export", format="ndjson"), heavy=True),
+    Scenario("export_json_gzip", _get("/export", format="json", gzip="true"), heavy=True),
+    Scenario("transactions_create", _create_transaction, write=True),
+    Scenario("transactions_bulk_100", _create_bulk, write=True),
+    Scenario("transactions_update", _update_transaction, write=True),
+    Scenario("transactions_delete", _delete_transaction, write=True),
+    Scenario("accounts_create", _create_account, write=True),
+    Scenario("accounts_update", _update_account, write=True),
+    Scenario("accounts_rename", _rename_account, write=True),
+    Scenario("import_merge_100", _import_merge, write=True),
+]
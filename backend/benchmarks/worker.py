@@ -0,0 +1,237 @@
+"""Benchmark one seeded database in-process.
+
+Run by ``benchmarks.run`` in a fresh interpreter per database size, so the
+app binds to that size's DATABASE_DIR and the peak RSS belongs to it alone.
+Every scenario gets a sequential phase (latency percentiles) and a
+concurrent phase (throughput under ``--concurrency`` parallel clients),
+both through httpx's ASGI transport (the event stream aside, see
+``first_chunk``), with no network in between.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, when the platform reports it"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+def summarize(latencies, errors, elapsed=None):
+    latencies = sorted(latencies)
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else None,
+    }
+    if elapsed:
+        summary["throughput_rps"] = round(len(latencies) / elapsed, 1)
+    return summary
+
+
+async def first_chunk(app, request):
+    """Status of a streamed response, once its first chunk arrived and the client hung up.
+
+    httpx's ASGI transport waits for the whole body, which an event stream
+    never finishes, so this drives the app directly.
+    """
+    status = None
+    arrived = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await arrived.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body"):
+            arrived.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": request["method"],
+        "scheme": "http",
+        "path": request["url"],
+        "raw_path": request["url"].encode(),
+        "root_path": "",
+        "query_string": urlencode(request.get("params") or {}, doseq=True).encode(),
+        "headers": [(b"host", b"benchmark"), (b"accept", b"text/event-stream")],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    await app(scope, receive, send)
+    return status
+
+
+async def timed_request(client, app, scenario, context, rng, latencies):
+    request = scenario.build(context, rng)
+    started = time.perf_counter()
+    if request.get("stream"):
+        status_code = await first_chunk(app, request)
+    else:
+        response = await client.request(
+            request["method"], request["url"], params=request.get("params"), json=request.get("json")
+        )
+        await response.aread()
+        status_code = response.status_code
+    latencies.append(round((time.perf_counter() - started) * 1000, 3))
+    return status_code < 400
+
+
+async def run_scenario(client, app, scenario, context, args):
+    rng = random.Random(f"{args.seed}-{scenario.name}")
+    iterations = max(1, args.requests // 10) if scenario.heavy else args.requests
+
+    for _ in range(args.warmup):
+        await timed_request(client, app, scenario, context, rng, [])
+
+    # Sequential phase: undisturbed latency of a single client
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + args.max_seconds
+    for _ in range(iterations):
+        if not await timed_request(client, app, scenario, context, rng, latencies):
+            errors += 1
+        if time.perf_counter() > deadline:
+            break
+    sequential = summarize(latencies, errors)
+
+    # Concurrent phase: throughput with several clients in flight
+    concurrent_latencies, concurrent_errors = [], 0
+
+    async def client_loop(stop_at):
+        nonlocal concurrent_errors
+        while time.perf_counter() < stop_at:
+            if not await timed_request(client, app, scenario, context, rng, concurrent_latencies):
+                concurrent_errors += 1
+
+    started = time.perf_counter()
+    stop_at = started + args.duration
+    clients = min(args.concurrency, 2) if scenario.heavy else args.concurrency
+    await asyncio.gather(*(client_loop(stop_at) for _ in range(clients)))
+    concurrent = summarize(concurrent_latencies, concurrent_errors, time.perf_counter() - started)
+
+    return {"sequential": sequential, "concurrent": concurrent, "rss_mb": peak_rss_mb()}
+
+
+async def discover_context(client):
+    """Ids, dates and a deep-page cursor from the seeded data"""
+    accounts = (await client.get("/accounts/")).json()
+    first_page = await client.get("/transactions/", params={"limit": 100})
+    newest = first_page.json()
+    latest_date = datetime.fromisoformat(newest[0]["date"]) if newest else datetime.now()
+
+    # Follow a few cursors so the page scenario also measures deep pages
+    cursor = first_page.headers.get("x-next-cursor")
+    for _ in range(20):
+        if not cursor:
+            break
+        page = await client.get("/transactions/", params={"limit": 100, "cursor": cursor})
+        cursor = page.headers.get("x-next-cursor") or cursor
+
+    changes = (await client.get("/changes")).json()
+
+    return {
+        "account_ids": [account["id"] for account in accounts],
+        "latest_date": latest_date,
+        "year": latest_date.year,
+        "max_id": newest[0]["id"] if newest else 0,
+        "cursor": cursor,
+        "change_seq": changes["seq"],
+    }
+
+
+async def run(args):
+    os.environ["DATABASE_DIR"] = args.database_dir
+    if not args.with_cache:
+        # Measure the routes themselves, not the response cache
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    if args.columnar:
+        os.environ["COLUMNAR_ENGINE"] = "true"
+    sys.path.insert(0, BACKEND_DIR)
+
+    import httpx
+    import main
+    from benchmarks.scenarios import SCENARIOS
+    from services import columnar
+
+    selected = [scenario for scenario in SCENARIOS if not args.only or scenario.name in args.only]
+    # Reads first, writes after them since they change the data
+    selected.sort(key=lambda scenario: scenario.write)
+
+    await main.app.router.startup()
+    if columnar.engine.loading is not None:
+        # Measure the loaded store, not the SQL fallback while it loads
+        await columnar.engine.loading
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            context = await discover_context(client)
+            for scenario in selected:
+                started = time.perf_counter()
+                results[scenario.name] = await run_scenario(client, main.app, scenario, context, args)
+                print(f"   • {scenario.name}: p95 {results[scenario.name]['sequential']['p95_ms']} ms, "
+                      f"{results[scenario.name]['concurrent'].get('throughput_rps')} req/s "
+                      f"({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+    finally:
+        await main.app.router.shutdown()
+
+    return {"scenarios": results, "peak_rss_mb": peak_rss_mb()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark scenarios against one database")
+    parser.add_argument("--database-dir", required=True)
+    parser.add_argument("--result-file", required=True)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--max-seconds", type=float, default=30.0)
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--only", nargs="*")
+    parser.add_argument("--with-cache", action="store_true")
+    parser.add_argument("--columnar", action="store_true")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    with open(args.result_file, "w", encoding="utf-8") as handle:
+        json.dump(result, handle)
+
+
+if __name__ == "__main__":
+    main()
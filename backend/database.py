@@ -1,33 +1,394 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Integer, create_engine, event, inspect
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from models.types import TYPE_CODES, Money, category_codes
+from services import metrics
+from services.search import drop_search_index
+
 # SQLite database URL
 import os
+import pathlib
+import time
 DATABASE_DIR = os.getenv("DATABASE_DIR", "./data")
 os.makedirs(DATABASE_DIR, exist_ok=True)
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_DIR}/financial_dashboard.db"
+DATABASE_PATH = f"{DATABASE_DIR}/financial_dashboard.db"
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+ASYNC_READ_DATABASE_URL = f"sqlite+aiosqlite:///file:{DATABASE_PATH}?mode=ro&uri=true"
+# URI filenames are what lets archives be ATTACHed read-only; a plain path still opens as before
+CONNECT_ARGS = {"uri": True}
+
+# Archived years (see services.archive) are attached to every connection under
+# archive_<year>; the connection's info maps each attached year to its file
+ARCHIVES_KEY = "archives"
+
+# Performance profile applied to every new connection
+SQLITE_PRAGMAS = {
+    # WAL lets readers proceed while a writer commits
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    # NORMAL is durable in WAL mode except for the last commits on power loss
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    # Negative values are KiB: 64 MiB page cache per connection
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "foreign_keys": os.getenv("SQLITE_FOREIGN_KEYS", "ON"),
+}
+
+# Connection pool shared by the engines. aiosqlite would otherwise default to
+# NullPool and open (and re-tune) a fresh connection for every session.
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "3600")),
+    "pool_pre_ping": True,
+}
+
+# Serve reads from a separate read-only engine so analytics never hold the writer
+SPLIT_READ_ENGINE = os.getenv("DB_SPLIT_READS", "false").lower() in ("1", "true", "yes")
+
+def _apply_pragmas(dbapi_connection, read_only=False):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            # journal_mode is a property of the database file, a reader cannot change it
+            if read_only and name == "journal_mode":
+                continue
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+    finally:
+        cursor.close()
+
+def archive_schema(year: int) -> str:
+    """Schema name an archived year is attached under"""
+    return f"archive_{int(year)}"
+
+def archive_path(file: str) -> str:
+    return os.path.join(DATABASE_DIR, file)
 
-# Create engine
+def _attach_archives(dbapi_connection, info):
+    """Bring the connection's attachments in line with the archived_years table.
+
+    Runs on checkout, outside any transaction, since SQLite cannot DETACH
+    inside one. Archives that were dropped or replaced since the last
+    checkout are detached, new ones attached read-only.
+    """
+    attached = info.setdefault(ARCHIVES_KEY, {})
+    cursor = dbapi_connection.cursor()
+    try:
+        registered = {}
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archived_years'")
+        if cursor.fetchone():
+            cursor.execute("SELECT year, file FROM archived_years")
+            registered = dict(cursor.fetchall())
+        for year, file in list(attached.items()):
+            if registered.get(year) != file:
+                cursor.execute(f"DETACH DATABASE {archive_schema(year)}")
+                del attached[year]
+        for year, file in sorted(registered.items()):
+            if year not in attached:
+                uri = pathlib.Path(archive_path(file)).resolve().as_uri() + "?mode=ro"
+                cursor.execute(f"ATTACH DATABASE ? AS {archive_schema(year)}", (uri,))
+                attached[year] = file
+    finally:
+        cursor.close()
+
+def _configure_engine(sync_engine, read_only=False):
+    """Run the pragma profile on each connection and time every statement"""
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, read_only=read_only)
+    
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _attach_archives(dbapi_connection, connection_record.info)
+    
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+    
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        metrics.record_query(statement, time.perf_counter() - started, executemany)
+    
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(exception_context):
+        # Failed statements never reach after_cursor_execute
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_started"):
+            connection.info["query_started"].pop()
+
+# Create engine (used for schema setup and maintenance scripts)
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False, **CONNECT_ARGS},
+    poolclass=QueuePool,
+    **POOL_OPTIONS
 )
+_configure_engine(engine)
+
+# Async engine used by the API, so queries never block the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=CONNECT_ARGS, poolclass=AsyncAdaptedQueuePool, **POOL_OPTIONS)
+_configure_engine(async_engine.sync_engine)
+
+if SPLIT_READ_ENGINE:
+    async_read_engine = create_async_engine(ASYNC_READ_DATABASE_URL, poolclass=AsyncAdaptedQueuePool, **POOL_OPTIONS)
+    _configure_engine(async_read_engine.sync_engine, read_only=True)
+else:
+    async_read_engine = async_engine
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async sessions keep attributes loaded after commit: lazy refreshes cannot run outside an await
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Create Base class
 Base = declarative_base()
 
-def create_tables():
+def create_tables(bind=None):
     """Create all tables"""
-    Base.metadata.create_all(bind=engine)
+    if bind is None:
+        with engine.begin() as conn:
+            return create_tables(conn)
+    if _has_text_categories(bind) or _stale_money_tables(bind):
+        _rebuild_stale_tables(bind)
+    Base.metadata.create_all(bind=bind)
+    add_opening_balance_column(bind)
+    create_missing_indexes(bind)
+    # Every process starts with the whole map, so encoding categories never queries
+    category_codes.load(bind.exec_driver_sql("SELECT id, name FROM categories").all())
 
-def get_db():
-    """Dependency to get database session"""
-    db = SessionLocal()
+def _rebuild_stale_tables(conn):
+    """Run the table rebuilding migrations with foreign keys off.
+
+    A rebuild renames the old table away. With foreign keys on, SQLite makes
+    the REFERENCES of other tables follow that rename, even under
+    legacy_alter_table, and dropping the renamed copy then fails. The pragma
+    only changes outside a transaction, so this must run before anything
+    else in the caller's. Rows are copied as they are: if the rebuilds leave
+    more foreign key violations than there were, they are undone.
+    """
+    conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
     try:
-        yield db
+        violations = len(conn.exec_driver_sql("PRAGMA foreign_key_check").all())
+        conn.exec_driver_sql("SAVEPOINT rebuild_stale_tables")
+        try:
+            # Before the money step: it rebuilds transactions from the current model
+            migrate_dictionary_columns(conn)
+            migrate_money_columns(conn)
+            broken = len(conn.exec_driver_sql("PRAGMA foreign_key_check").all()) - violations
+            if broken > 0:
+                raise RuntimeError(f"Rebuilding tables broke {broken} foreign key references")
+            conn.exec_driver_sql("RELEASE rebuild_stale_tables")
+        except Exception:
+            conn.exec_driver_sql("ROLLBACK TO rebuild_stale_tables")
+            conn.exec_driver_sql("RELEASE rebuild_stale_tables")
+            raise
     finally:
-        db.close() 
\ No newline at end of file
+        conn.exec_driver_sql(f"PRAGMA foreign_keys = {SQLITE_PRAGMAS['foreign_keys']}")
+
+def _stale_money_tables(conn) -> list:
+    """``(table, money_columns, old_columns)`` of tables whose Money columns are not INTEGER yet"""
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    stale = []
+    for table in Base.metadata.sorted_tables:
+        money_columns = [column.name for column in table.columns if isinstance(column.type, Money)]
+        if table.name not in existing or not money_columns:
+            continue
+        declared = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+        # Columns missing altogether are added later on, not converted
+        if any(name in declared and not isinstance(declared[name], Integer) for name in money_columns):
+            stale.append((table, money_columns, list(declared)))
+    return stale
+
+def _has_text_categories(conn) -> bool:
+    inspector = inspect(conn)
+    if "transactions" not in inspector.get_table_names():
+        return False
+    return "category" in {column["name"] for column in inspector.get_columns("transactions")}
+
+def migrate_money_columns(conn) -> bool:
+    """Rebuild tables whose Money columns still have the old REAL type.
+
+    SQLite cannot change a column's type in place, so each stale table is
+    renamed, recreated from the model and refilled with amounts converted to
+    integer cents. Everything runs in one savepoint: a failure leaves the
+    old tables untouched. Triggers go away with the old table and are
+    recreated by whoever owns them (see services.search). Foreign keys must
+    be off, as create_tables does through _rebuild_stale_tables.
+    """
+    stale = _stale_money_tables(conn)
+    if not stale:
+        return False
+    
+    conn.exec_driver_sql("SAVEPOINT money_to_cents")
+    try:
+        # Keep other tables' REFERENCES pointing at the original names
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+        for table, _, _ in stale:
+            for index in table.indexes:
+                conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{index.name}"')
+            conn.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{table.name}_real"')
+        
+        Base.metadata.create_all(bind=conn, tables=[table for table, _, _ in stale])
+        
+        # Parents first (sorted_tables order), so foreign keys stay satisfied
+        for table, money_columns, old_columns in stale:
+            names = [f'"{column.name}"' for column in table.columns if column.name in old_columns]
+            values = [
+                f"CAST(ROUND({name} * 100) AS INTEGER)" if name.strip('"') in money_columns else name
+                for name in names
+            ]
+            conn.exec_driver_sql(
+                f'INSERT INTO "{table.name}" ({", ".join(names)}) '
+                f'SELECT {", ".join(values)} FROM "{table.name}_real"'
+            )
+        for table, _, _ in reversed(stale):
+            conn.exec_driver_sql(f'DROP TABLE "{table.name}_real"')
+        
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+        conn.exec_driver_sql("RELEASE money_to_cents")
+    except Exception:
+        conn.exec_driver_sql("ROLLBACK TO money_to_cents")
+        conn.exec_driver_sql("RELEASE money_to_cents")
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+        raise
+    
+    print(f"✅ Money columns migrated to integer cents: {', '.join(table.name for table, _, _ in stale)}")
+    return True
+
+def migrate_dictionary_columns(conn) -> bool:
+    """Move text categories and transaction types to integer keys.
+
+    transactions.category (TEXT) becomes category_id, a key into the
+    categories table filled from the distinct names, and transaction_type
+    becomes its integer code (anything but "entrada" was always counted as
+    "saida"). The table is rebuilt as in migrate_money_columns, converting
+    amounts to cents on the way when they are still REAL. monthly_rollups is
+    dropped, to be rebuilt on startup, and the FTS index is dropped because
+    its triggers read the old column (services.search recreates it).
+    """
+    if not _has_text_categories(conn):
+        return False
+    declared = {column["name"]: column["type"] for column in inspect(conn).get_columns("transactions")}
+    
+    transactions = Base.metadata.tables["transactions"]
+    amount = '"amount"' if isinstance(declared.get("amount"), Integer) else 'CAST(ROUND("amount" * 100) AS INTEGER)'
+    
+    conn.exec_driver_sql("SAVEPOINT dictionary_columns")
+    try:
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+        drop_search_index(conn)
+        Base.metadata.tables["categories"].create(bind=conn, checkfirst=True)
+        conn.exec_driver_sql(
+            "INSERT OR IGNORE INTO categories (name) "
+            "SELECT DISTINCT category FROM transactions WHERE category IS NOT NULL"
+        )
+        
+        for index in transactions.indexes:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{index.name}"')
+        conn.exec_driver_sql('ALTER TABLE "transactions" RENAME TO "transactions_text"')
+        transactions.create(bind=conn)
+        conn.exec_driver_sql(
+            "INSERT INTO transactions (id, date, description, transaction_type, category_id, amount, account_id) "
+            f"SELECT old.id, old.date, old.description, "
+            f"CASE WHEN old.transaction_type = 'entrada' THEN {TYPE_CODES['entrada']} ELSE {TYPE_CODES['saida']} END, "
+            f"categories.id, {amount}, old.account_id "
+            "FROM transactions_text AS old LEFT JOIN categories ON categories.name = old.category"
+        )
+        conn.exec_driver_sql('DROP TABLE "transactions_text"')
+        conn.exec_driver_sql('DROP TABLE IF EXISTS "monthly_rollups"')
+        
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+        conn.exec_driver_sql("RELEASE dictionary_columns")
+    except Exception:
+        conn.exec_driver_sql("ROLLBACK TO dictionary_columns")
+        conn.exec_driver_sql("RELEASE dictionary_columns")
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+        raise
+    
+    print("✅ Categories and transaction types migrated to integer keys")
+    return True
+
+def migrate_autoincrement(conn) -> bool:
+    """Rebuild transactions with AUTOINCREMENT when it was created without it.
+
+    Plain rowid tables hand out max(id) + 1, which would give the ids of
+    archived transactions to new rows. Only archiving needs this, so it runs
+    before the first archive (services.archive) rather than on startup. The
+    FTS triggers go away with the old table and must be recreated.
+    """
+    declared = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'transactions'"
+    ).scalar()
+    if declared is None or "AUTOINCREMENT" in declared.upper():
+        return False
+    
+    transactions = Base.metadata.tables["transactions"]
+    names = ", ".join(f'"{column.name}"' for column in transactions.columns)
+    conn.exec_driver_sql("SAVEPOINT transactions_autoincrement")
+    try:
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+        for index in transactions.indexes:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{index.name}"')
+        conn.exec_driver_sql('ALTER TABLE "transactions" RENAME TO "transactions_rowid"')
+        transactions.create(bind=conn)
+        conn.exec_driver_sql(f'INSERT INTO transactions ({names}) SELECT {names} FROM "transactions_rowid"')
+        conn.exec_driver_sql('DROP TABLE "transactions_rowid"')
+        
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+        conn.exec_driver_sql("RELEASE transactions_autoincrement")
+    except Exception:
+        conn.exec_driver_sql("ROLLBACK TO transactions_autoincrement")
+        conn.exec_driver_sql("RELEASE transactions_autoincrement")
+        conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+        raise
+    
+    print("✅ Transactions table rebuilt with AUTOINCREMENT ids")
+    return True
+
+def add_opening_balance_column(conn) -> bool:
+    """Add accounts.opening_balance to databases created before it.
+
+    Existing rows are left NULL; services.reconcile fills them in with the
+    part of their balance that their transactions do not explain.
+    """
+    columns = {column["name"] for column in inspect(conn).get_columns("accounts")}
+    if "opening_balance" in columns:
+        return False
+    conn.exec_driver_sql('ALTER TABLE "accounts" ADD COLUMN "opening_balance" INTEGER')
+    return True
+
+def create_missing_indexes(bind=None):
+    """Create indexes added to the models after their table already existed.
+
+    ``create_all`` skips tables that are already present, so indexes declared
+    later would never reach existing databases without this step.
+    """
+    bind = bind if bind is not None else engine
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+async def get_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        # Categories a lookup missed are reloaded here, awaited, before the request's queries
+        await category_codes.refresh(db)
+        yield db
+
+async def get_read_db():
+    """Dependency for read-only endpoints (read-only engine when DB_SPLIT_READS is on)"""
+    async with AsyncReadSessionLocal() as db:
+        await category_codes.refresh(db)
+        yield db
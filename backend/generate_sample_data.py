@@ -1,260 +1,287 @@
-import sqlite3
+"""Generate a reproducible sample ledger for development and benchmarks.
+
+Usage:
+    python generate_sample_data.py                          # ~1.000 transações, tamanho de demonstração
+    python generate_sample_data.py --scale 1 --seed 42      # 1M transações
+    python generate_sample_data.py --scale 10 --years 5 --accounts 20
+
+``--scale`` is the number of transactions in millions. The same arguments
+always produce the same data. Rows are drawn with NumPy in chunks, written
+with executemany (one transaction per chunk) in date order, and the indexes,
+full-text index, balances and monthly rollups are built once at the end.
+Requires numpy (see requirements-dev.txt).
+"""
+import argparse
+import os
+import time
 from datetime import datetime, timedelta
-import random
-
-# Database connection
-def get_db_connection():
-    conn = sqlite3.connect('financial_dashboard.db')
-    conn.row_factory = sqlite3.Row
-    return conn
-
-# Create tables
-def create_tables():
-    conn = get_db_connection()
-    
-    # Create accounts table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS accounts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            balance REAL NOT NULL DEFAULT 0.0
-        )
-    ''')
-    
-    # Create transactions table
-    conn.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TIMESTAMP NOT NULL,
-            description TEXT NOT NULL,
-            transaction_type TEXT NOT NULL,
-            category TEXT,
-            amount REAL NOT NULL,
-            account_id INTEGER,
-            FOREIGN KEY (account_id) REFERENCES accounts (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-# Generate sample accounts
-def create_sample_accounts():
-    conn = get_db_connection()
-    
-    # Clear existing accounts to avoid duplicates
-    conn.execute("DELETE FROM accounts")
-    conn.commit()
-    
-    accounts = [
-        ("Conta Corrente Principal", 2500.00),
-        ("Conta Poupança", 15000.00),
-        ("Carteira", 150.00),
-        ("Conta Investimentos", 25000.00)
-    ]
-    
-    for name, initial_balance in accounts:
-        conn.execute(
-            "INSERT INTO accounts (name, balance) VALUES (?, ?)",
-            (name, initial_balance)
-        )
-    
-    conn.commit()
-    conn.close()
-    print("✅ Contas criadas com sucesso!")
-
-# Generate sample transactions
-def create_sample_transactions():
-    conn = get_db_connection()
-    
-    # Clear existing transactions to avoid duplicates
-    conn.execute("DELETE FROM transactions")
-    conn.commit()
-    
-    # Get account IDs
-    accounts = conn.execute("SELECT id, name FROM accounts").fetchall()
-    account_ids = [acc['id'] for acc in accounts]
-    
-    # Categories for expenses
-    expense_categories = [
-        "Alimentação", "Transporte", "Moradia", "Saúde", "Educação",
-        "Entretenimento", "Vestuário", "Supermercado", "Restaurantes",
-        "Combustível", "Farmácia", "Academia", "Cinema", "Shopping",
-        "Contas Obrigatórias"
-    ]
-    
-    # Categories for income
-    income_categories = [
-        "Salário", "Emprestimo", "Transferencia bancária", "Investimentos", "Bônus", "Dividendos"
-    ]
-    
-    # Sample transaction descriptions
-    expense_descriptions = {
-        "Alimentação": ["Supermercado", "Padaria", "Feira", "Açougue"],
-        "Transporte": ["Uber", "Gasolina", "Estacionamento", "Ônibus"],
-        "Moradia": ["Aluguel", "Condomínio", "Energia elétrica", "Água"],
-        "Saúde": ["Consulta médica", "Medicamentos", "Exames", "Dentista"],
-        "Educação": ["Curso online", "Livros", "Material escolar", "Mensalidade"],
-        "Entretenimento": ["Cinema", "Teatro", "Streaming", "Jogos"],
-        "Vestuário": ["Roupas", "Sapatos", "Acessórios", "Costura"],
-        "Supermercado": ["Compras mensais", "Produtos de limpeza", "Higiene"],
-        "Restaurantes": ["Almoço", "Jantar", "Lanche", "Delivery"],
-        "Combustível": ["Posto", "Gasolina", "Álcool", "Diesel"],
-        "Farmácia": ["Medicamentos", "Vitaminas", "Produtos de higiene"],
-        "Academia": ["Mensalidade", "Personal trainer", "Suplementos"],
-        "Cinema": ["Ingresso", "Pipoca", "Filme 3D"],
-        "Shopping": ["Compras variadas", "Presentes", "Eletônicos"],
-        "Contas Obrigatórias": ["Aluguel", "Financiamento", "Cartão de crédito", "Empréstimo"]
-    }
-    
-    income_descriptions = {
-        "Salário": ["Salário mensal", "Adiantamento", "13º salário"],
-        "Emprestimo": ["Empréstimo bancário", "Empréstimo pessoal", "Financiamento"],
-        "Transferencia bancária": ["Transferência recebida", "PIX recebido", "TED recebida"],
-        "Investimentos": ["Rendimento CDB", "Dividendos", "Juros poupança"],
-        "Bônus": ["Bônus performance", "Participação nos lucros"],
-        "Dividendos": ["Ações", "Fundos imobiliários"]
-    }
-    
-    transactions = []
-    
-    # Generate transactions for the last 6 months
-    start_date = datetime.now() - timedelta(days=180)
-    
-    for day in range(180):
-        current_date = start_date + timedelta(days=day)
-        
-        # Generate 1-5 transactions per day randomly
-        num_transactions = random.randint(0, 4)
-        
-        for _ in range(num_transactions):
-            account_id = random.choice(account_ids)
-            
-            # 80% chance of expense, 20% chance of income
-            if random.random() < 0.8:
-                # Expense transaction
-                transaction_type = "saida"
-                category = random.choice(expense_categories)
-                description = random.choice(expense_descriptions.get(category, [category]))
-                
-                # Different amount ranges based on category
-                if category in ["Moradia", "Salário"]:
-                    amount = round(random.uniform(800, 1500), 2)
-                elif category in ["Supermercado", "Combustível"]:
-                    amount = round(random.uniform(50, 200), 2)
-                elif category in ["Restaurantes", "Entretenimento"]:
-                    amount = round(random.uniform(20, 100), 2)
-                else:
-                    amount = round(random.uniform(10, 300), 2)
-            else:
-                # Income transaction
-                transaction_type = "entrada"
-                category = random.choice(income_categories)
-                description = random.choice(income_descriptions.get(category, [category]))
-                
-                if category == "Salário":
-                    amount = round(random.uniform(3000, 8000), 2)
-                elif category == "Emprestimo":
-                    amount = round(random.uniform(500, 2000), 2)
-                elif category == "Transferencia bancária":
-                    amount = round(random.uniform(100, 1000), 2)
-                else:
-                    amount = round(random.uniform(100, 1000), 2)
-            
-            # Add some time variation to the date
-            transaction_time = current_date.replace(
-                hour=random.randint(6, 22),
-                minute=random.randint(0, 59),
-                second=random.randint(0, 59)
-            )
-            
-            transactions.append((
-                transaction_time,
-                description,
-                transaction_type,
-                category,
-                amount,
-                account_id
-            ))
-    
-    # Insert transactions
-    conn.executemany(
-        "INSERT INTO transactions (date, description, transaction_type, category, amount, account_id) VALUES (?, ?, ?, ?, ?, ?)",
-        transactions
+
+import numpy as np
+
+from models.types import TYPE_CODES
+
+ACCOUNT_NAMES = ["Conta Corrente Principal", "Conta Poupança", "Carteira", "Conta Investimentos"]
+
+# (category, relative frequency, median amount, log-normal sigma, descriptions)
+EXPENSE_CATEGORIES = [
+    ("Alimentação", 14, 45.0, 0.6, ["Supermercado", "Padaria", "Feira", "Açougue"]),
+    ("Transporte", 10, 25.0, 0.7, ["Uber", "Gasolina", "Estacionamento", "Ônibus"]),
+    ("Moradia", 2, 1200.0, 0.35, ["Aluguel", "Condomínio", "Energia elétrica", "Água"]),
+    ("Saúde", 3, 150.0, 0.8, ["Consulta médica", "Medicamentos", "Exames", "Dentista"]),
+    ("Educação", 2, 250.0, 0.7, ["Curso online", "Livros", "Material escolar", "Mensalidade"]),
+    ("Entretenimento", 5, 60.0, 0.6, ["Cinema", "Teatro", "Streaming", "Jogos"]),
+    ("Vestuário", 3, 120.0, 0.7, ["Roupas", "Sapatos", "Acessórios", "Costura"]),
+    ("Supermercado", 12, 180.0, 0.5, ["Compras mensais", "Produtos de limpeza", "Higiene"]),
+    ("Restaurantes", 10, 55.0, 0.5, ["Almoço", "Jantar", "Lanche", "Delivery"]),
+    ("Combustível", 6, 150.0, 0.4, ["Posto", "Gasolina", "Álcool", "Diesel"]),
+    ("Farmácia", 4, 40.0, 0.7, ["Medicamentos", "Vitaminas", "Produtos de higiene"]),
+    ("Academia", 1, 110.0, 0.3, ["Mensalidade", "Personal trainer", "Suplementos"]),
+    ("Cinema", 2, 35.0, 0.4, ["Ingresso", "Pipoca", "Filme 3D"]),
+    ("Shopping", 4, 200.0, 0.9, ["Compras variadas", "Presentes", "Eletônicos"]),
+    ("Contas Obrigatórias", 3, 600.0, 0.6, ["Aluguel", "Financiamento", "Cartão de crédito", "Empréstimo"]),
+]
+
+INCOME_CATEGORIES = [
+    ("Salário", 40, 5000.0, 0.3, ["Salário mensal", "Adiantamento", "13º salário"]),
+    ("Emprestimo", 3, 1500.0, 0.5, ["Empréstimo bancário", "Empréstimo pessoal", "Financiamento"]),
+    ("Transferencia bancária", 30, 300.0, 0.8, ["Transferência recebida", "PIX recebido", "TED recebida"]),
+    ("Investimentos", 15, 150.0, 0.9, ["Rendimento CDB", "Dividendos", "Juros poupança"]),
+    ("Bônus", 2, 3000.0, 0.5, ["Bônus performance", "Participação nos lucros"]),
+    ("Dividendos", 10, 200.0, 0.8, ["Ações", "Fundos imobiliários"]),
+]
+
+# Spending seasonality: January to December, and Monday to Sunday
+MONTH_FACTORS = np.array([0.90, 0.85, 0.95, 0.95, 1.00, 1.00, 1.05, 0.95, 0.95, 1.00, 1.15, 1.35])
+WEEKDAY_FACTORS = np.array([0.90, 0.90, 0.95, 1.00, 1.20, 1.25, 0.80])
+
+# Income lands mostly in the first week of the month, and more in December
+INCOME_EARLY_MONTH_FACTOR = 6.0
+INCOME_DECEMBER_FACTOR = 1.5
+
+# Incomes are sized to cover expenses with this margin, so balances drift up slowly
+INCOME_MARGIN = 1.05
+
+
+class CategoryTable:
+    """Categories flattened into arrays for vectorized sampling"""
+
+    def __init__(self, categories):
+        self.names = np.array([name for name, *_ in categories], dtype=object)
+        weights = np.array([weight for _, weight, *_ in categories], dtype=float)
+        self.probabilities = weights / weights.sum()
+        self.medians = np.array([median for _, _, median, _, _ in categories])
+        self.sigmas = np.array([sigma for *_, sigma, _ in categories])
+
+        descriptions = [description for *_, options in categories for description in options]
+        self.descriptions = np.array(descriptions, dtype=object)
+        counts = np.array([len(options) for *_, options in categories])
+        self.description_counts = counts
+        self.description_offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    def register(self, ids):
+        """Keep the categories table ids of the names, which is what rows store"""
+        self.ids = np.array([ids[name] for name in self.names], dtype=np.int64)
+
+    def mean_amount(self) -> float:
+        """Expected amount of one row (log-normal mean = median * exp(sigma^2 / 2))"""
+        return float(np.sum(self.probabilities * self.medians * np.exp(self.sigmas ** 2 / 2)))
+
+    def sample(self, rng, size):
+        """Draw category ids, descriptions and amounts in cents for ``size`` rows"""
+        category = rng.choice(len(self.names), size=size, p=self.probabilities)
+        amounts = rng.lognormal(np.log(self.medians[category]), self.sigmas[category])
+        cents = np.maximum(np.round(amounts * 100), 1).astype(np.int64)
+        pick = (rng.random(size) * self.description_counts[category]).astype(np.int64)
+        descriptions = self.descriptions[self.description_offsets[category] + pick]
+        return self.ids[category], descriptions, cents
+
+
+def day_weights(days, income: bool):
+    """Relative chance of a transaction on each calendar day"""
+    months = days.astype("datetime64[M]").astype(int) % 12
+    # 1970-01-01 was a Thursday, so shift to make Monday == 0
+    weekdays = (days.astype(int) + 3) % 7
+    if income:
+        day_of_month = (days - days.astype("datetime64[M]")).astype(int)
+        weights = np.where(day_of_month < 7, INCOME_EARLY_MONTH_FACTOR, 1.0)
+        weights = weights * np.where(months == 11, INCOME_DECEMBER_FACTOR, 1.0)
+    else:
+        weights = MONTH_FACTORS[months] * WEEKDAY_FACTORS[weekdays]
+    return weights / weights.sum()
+
+
+def sample_timestamps(rng, days, size, income: bool):
+    """Seconds since the epoch, seasonal by day and between 06:00 and 23:00"""
+    day = rng.choice(days, size=size, p=day_weights(days, income))
+    seconds = rng.integers(6 * 3600, 23 * 3600, size=size)
+    return day.astype("datetime64[s]").astype(np.int64) + seconds
+
+
+def generate_schedule(rng, total, years, expenses: CategoryTable, incomes: CategoryTable):
+    """Timestamps and types for every row, sorted by time so ids follow dates"""
+    end = np.datetime64(datetime.now().date(), "D")
+    days = np.arange(end - int(round(years * 365)), end + 1)
+
+    income_share = INCOME_MARGIN * expenses.mean_amount() / (
+        incomes.mean_amount() + INCOME_MARGIN * expenses.mean_amount()
     )
-    
-    conn.commit()
-    
-    print(f"✅ {len(transactions)} transações criadas com sucesso!")
-    
-    # Update account balances based on transactions
-    update_account_balances()
-    
-    conn.close()
-
-def update_account_balances():
-    conn = get_db_connection()
-    
-    # Get all accounts
-    accounts = conn.execute("SELECT id, name FROM accounts").fetchall()
-    
-    for account in accounts:
-        account_id = account['id']
-        
-        # Calculate balance from transactions
-        income_sum = conn.execute(
-            "SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE account_id = ? AND transaction_type = 'entrada'",
-            (account_id,)
-        ).fetchone()[0]
-        
-        expense_sum = conn.execute(
-            "SELECT COALESCE(SUM(amount), 0) FROM transactions WHERE account_id = ? AND transaction_type = 'saida'",
-            (account_id,)
-        ).fetchone()[0]
-        
-        # Start with initial balance and add/subtract transactions
-        balance = income_sum - expense_sum
-        
-        # Update account balance
-        conn.execute(
-            "UPDATE accounts SET balance = ? WHERE id = ?",
-            (balance, account_id)
-        )
-    
-    conn.commit()
-    print("✅ Saldos das contas atualizados!")
+    is_income = rng.random(total) < income_share
+    income_count = int(is_income.sum())
+
+    timestamps = np.empty(total, dtype=np.int64)
+    timestamps[:income_count] = sample_timestamps(rng, days, income_count, income=True)
+    timestamps[income_count:] = sample_timestamps(rng, days, total - income_count, income=False)
+    is_income = np.arange(total) < income_count
+
+    order = np.argsort(timestamps, kind="stable")
+    return timestamps[order], is_income[order]
+
+
+def account_weights(count):
+    """The first accounts see most of the activity"""
+    weights = 1.0 / np.arange(1, count + 1) ** 0.8
+    return weights / weights.sum()
+
+
+def build_chunk(rng, timestamps, is_income, account_ids, expenses, incomes):
+    """Rows for executemany: (date, description, type code, category id, cents, account_id)"""
+    size = len(timestamps)
+    # Same text format SQLAlchemy's DateTime writes to SQLite
+    dates = np.datetime_as_string(timestamps.astype("datetime64[s]").astype("datetime64[us]"), unit="us")
+    dates = np.char.replace(dates.astype(str), "T", " ")
+
+    categories = np.empty(size, dtype=np.int64)
+    descriptions = np.empty(size, dtype=object)
+    amounts = np.empty(size, dtype=np.int64)
+    for table, mask in ((incomes, is_income), (expenses, ~is_income)):
+        categories[mask], descriptions[mask], amounts[mask] = table.sample(rng, int(mask.sum()))
+
+    types = np.where(is_income, TYPE_CODES["entrada"], TYPE_CODES["saida"])
+    accounts = rng.choice(account_ids, size=size, p=account_weights(len(account_ids)))
+    return zip(dates.tolist(), descriptions.tolist(), types.tolist(), categories.tolist(), amounts.tolist(), accounts.tolist())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Gera dados de exemplo para o Financial Dashboard")
+    parser.add_argument("--scale", type=float, default=0.001, help="Milhões de transações (padrão: 0.001 = 1.000)")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do gerador (mesma semente, mesmos dados)")
+    parser.add_argument("--years", type=float, default=1.0, help="Anos de histórico até hoje")
+    parser.add_argument("--accounts", type=int, default=len(ACCOUNT_NAMES), help="Número de contas")
+    parser.add_argument("--chunk-size", type=int, default=200_000, help="Linhas por transação de escrita")
+    parser.add_argument("--database-dir", default=os.getenv("DATABASE_DIR", "./data"), help="Diretório do banco (DATABASE_DIR)")
+    return parser.parse_args()
+
 
 def main():
-    print("🚀 Gerando dados de exemplo para o Financial Dashboard...")
-    
-    # Create tables
+    args = parse_args()
+    total = int(round(args.scale * 1_000_000))
+
+    # database.py reads DATABASE_DIR when it is imported
+    os.environ["DATABASE_DIR"] = args.database_dir
+    from sqlalchemy import delete, insert, text
+    from database import SessionLocal, create_missing_indexes, create_tables, engine
+    from models.account import Account
+    from models.transaction import Transaction
+    from models.category import Category  # noqa: F401
+    from models.types import category_codes, from_cents
+    from models.monthly_rollup import MonthlyRollup
+    from models.daily_balance import DailyBalance
+    from models.data_version import DataVersion  # noqa: F401
+    from models.change_log import ChangeLog  # noqa: F401
+    from models.archived_year import ArchivedYear
+    from services.change_log import record_reset
+    from services.data_version import bump_data_version
+    from services.ledger import apply_balance_deltas
+    from services.reconcile import ledger_totals
+    from services.daily_balances import rebuild_daily_balances
+    from services.rollups import rebuild_monthly_rollups
+    from services.categories import ensure_categories
+    from services.search import drop_search_index, ensure_search_index
+
+    print(f"🚀 Gerando {total:,} transações ({args.years:g} anos, {args.accounts} contas, seed {args.seed})...")
+    started = time.perf_counter()
+    rng = np.random.default_rng(args.seed)
+    expenses = CategoryTable(EXPENSE_CATEGORIES)
+    incomes = CategoryTable(INCOME_CATEGORIES)
+
     create_tables()
-    print("✅ Tabelas criadas!")
-    
-    # Create sample accounts
-    create_sample_accounts()
-    
-    # Create sample transactions
-    create_sample_transactions()
-    
-    # Show summary
-    conn = get_db_connection()
-    
-    account_count = conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
-    transaction_count = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
-    
-    print(f"\n📊 Resumo dos dados gerados:")
-    print(f"   • {account_count} contas criadas")
-    print(f"   • {transaction_count} transações criadas")
-    
-    # Show accounts with balances
+
+    # Start from an empty ledger without secondary indexes or FTS triggers,
+    # which are far cheaper to build once than to maintain row by row
+    with engine.begin() as conn:
+        drop_search_index(conn)
+        for index in Transaction.__table__.indexes:
+            conn.execute(text(f'DROP INDEX IF EXISTS "{index.name}"'))
+        # Archived years would be read alongside the new ledger
+        conn.execute(delete(ArchivedYear))
+        conn.execute(delete(MonthlyRollup))
+        conn.execute(delete(DailyBalance))
+        conn.execute(delete(Transaction))
+        conn.execute(delete(Account))
+        ensure_categories(conn, expenses.names.tolist() + incomes.names.tolist())
+        for table in (expenses, incomes):
+            table.register(category_codes.ids)
+        names = ACCOUNT_NAMES + [f"Conta {number}" for number in range(len(ACCOUNT_NAMES) + 1, args.accounts + 1)]
+        conn.execute(
+            insert(Account.__table__),
+            [{"id": number, "name": name, "balance": 0.0} for number, name in enumerate(names[:args.accounts], start=1)],
+        )
+    print("✅ Contas criadas!")
+
+    timestamps, is_income = generate_schedule(rng, total, args.years, expenses, incomes)
+    account_ids = np.arange(1, args.accounts + 1)
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute("PRAGMA synchronous = OFF")
+        for start in range(0, total, args.chunk_size):
+            stop = min(start + args.chunk_size, total)
+            rows = build_chunk(rng, timestamps[start:stop], is_income[start:stop], account_ids, expenses, incomes)
+            cursor.executemany(
+                "INSERT INTO transactions (date, description, transaction_type, category_id, amount, account_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            raw.commit()
+            print(f"   • {stop:,}/{total:,} transações inseridas")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+        cursor.close()
+    finally:
+        raw.close()
+    del timestamps, is_income
+
+    db = SessionLocal()
+    try:
+        create_missing_indexes(db.connection())
+        print("✅ Índices criados!")
+
+        # Every balance from a single GROUP BY over the ledger
+        totals = ledger_totals(db)
+        balances = apply_balance_deltas(db, {account_id: from_cents(total) for account_id, total in totals.items()})
+
+        rollups = rebuild_monthly_rollups(db)
+        rebuild_daily_balances(db)
+        ensure_search_index(db.connection())
+        bump_data_version(db)
+        # Clients syncing through /changes must reload everything
+        record_reset(db)
+        db.commit()
+        print(f"✅ Saldos, {rollups:,} resumos mensais, saldos diários e índice de busca atualizados!")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    print(f"\n📊 Resumo dos dados gerados ({time.perf_counter() - started:.1f}s):")
+    print(f"   • {args.accounts} contas criadas")
+    print(f"   • {total:,} transações criadas")
     print(f"\n💰 Contas criadas:")
-    accounts = conn.execute("SELECT name, balance FROM accounts").fetchall()
-    for account in accounts:
-        print(f"   • {account['name']}: R$ {account['balance']:,.2f}")
-    
-    conn.close()
+    for account_id, name in enumerate(names[:args.accounts], start=1):
+        print(f"   • {name}: R$ {balances.get(account_id, 0.0):,.2f}")
     print(f"\n✅ Dados gerados com sucesso! O banco de dados está pronto para uso.")
 
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
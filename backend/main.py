@@ -1,20 +1,56 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from database import create_tables, engine, get_db
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from database import AsyncSessionLocal, async_engine, create_tables, get_db
 from models.account import Account
 from models.transaction import Transaction
-from routers import transactions, accounts
-from sqlalchemy.orm import sessionmaker, Session
-import json
+from models.category import Category
+from models.monthly_rollup import MonthlyRollup
+from models.daily_balance import DailyBalance
+from models.data_version import DataVersion
+from models.change_log import ChangeLog
+from models.archived_year import ArchivedYear
+from routers import transactions, accounts, categories, changes
+from services.rollups import rebuild_monthly_rollups, rollups_need_rebuild
+from services.daily_balances import daily_balances_need_rebuild, rebuild_daily_balances
+from services.export import MEDIA_TYPES, stream_export
+from services.importer import ImportFormatError, merge_export, parse_export, restore_export
+from services.ledger import ArchivedYearError, UnknownAccountError
+from services.search import ensure_search_index
+from services.data_version import bump_data_version, ensure_data_version
+from services.change_log import ensure_change_log
+from services.events import publish_bulk_change, stream_events
+from services.response_cache import ResponseCacheMiddleware
+from services.compression import CompressionMiddleware
+from services.serialization import JSONResponse
+from services import columnar
+from services.write_batcher import batcher as write_batcher
+from services.reconcile import ensure_opening_balances, scheduler as reconcile_scheduler
+from services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, TimedRoute, render_metrics
+from routers.transactions import TransactionCreate
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
+from typing import Literal
 
 # Create FastAPI app
 app = FastAPI(
     title="Financial Dashboard API",
     description="API para dashboard financeiro pessoal",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson when installed: the final encoding step of every JSON route
+    default_response_class=JSONResponse
 )
+# Routes declared on the app itself also report endpoint timings
+app.router.route_class = TimedRoute
+
+# Brotli/gzip for large bodies (innermost, so the cache keeps compressed copies)
+app.add_middleware(CompressionMiddleware)
+
+# Cached GET responses with data-version ETags (added before CORS so CORS wraps the 304s too)
+app.add_middleware(ResponseCacheMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -26,22 +62,31 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# Per-route latency, SQL and profiling (outermost, so it sees the whole request)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(transactions.router)
 app.include_router(accounts.router)
+app.include_router(categories.router)
+app.include_router(changes.router)
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database and create default accounts"""
-    create_tables()
+    async with async_engine.begin() as conn:
+        await conn.run_sync(create_tables)
+        await conn.run_sync(ensure_search_index)
+        await conn.run_sync(ensure_data_version)
+        await conn.run_sync(ensure_change_log)
+        await conn.run_sync(ensure_opening_balances)
     
     # Create default accounts if they don't exist
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
+    db = AsyncSessionLocal()
     
     try:
         # Check if accounts already exist
-        existing_accounts = db.query(Account).count()
+        existing_accounts = await db.scalar(select(func.count()).select_from(Account))
         
         if existing_accounts == 0:
             # Create 3 default accounts
@@ -54,16 +99,40 @@ async def startup_event():
             for account in default_accounts:
                 db.add(account)
             
-            db.commit()
+            await db.commit()
             print("✅ Default accounts created successfully!")
         else:
             print(f"✅ Database already has {existing_accounts} accounts")
+        
+        # Databases created before the rollup table existed need a first build
+        if await db.run_sync(rollups_need_rebuild):
+            rows = await db.run_sync(rebuild_monthly_rollups)
+            await db.commit()
+            print(f"✅ Monthly rollups rebuilt ({rows} rows)")
+        
+        if await db.run_sync(daily_balances_need_rebuild):
+            rows = await db.run_sync(rebuild_daily_balances)
+            await db.commit()
+            print(f"✅ Daily balances rebuilt ({rows} rows)")
             
     except Exception as e:
         print(f"❌ Error creating default accounts: {e}")
-        db.rollback()
+        await db.rollback()
     finally:
-        db.close()
+        await db.close()
+    
+    # Loads in the background; analytics use SQL until it is ready
+    columnar.engine.start()
+    # Group commit of single writes, when WRITE_BATCHING is on
+    write_batcher.start()
+    # Balance reconciliation, when RECONCILE_INTERVAL_MINUTES is set
+    reconcile_scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Commit the writes still queued for the group commit"""
+    await reconcile_scheduler.stop()
+    await write_batcher.stop()
 
 @app.get("/")
 async def root():
@@ -77,58 +146,85 @@ async def root():
 async def health_check():
     return {"status": "healthy", "service": "financial-dashboard-api"}
 
+@app.get("/events")
+async def events(request: Request):
+    """Server-sent events for every committed change (see services.events)"""
+    return StreamingResponse(
+        stream_events(request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        # No proxy buffering, or events would arrive in bursts
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Request, phase and SQL metrics in the Prometheus text format"""
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/export")
-async def export_database(db: Session = Depends(get_db)):
-    """Export complete database in JSON format"""
-    try:
-        # Get all accounts
-        accounts = db.query(Account).all()
-        accounts_data = []
-        for account in accounts:
-            accounts_data.append({
-                "id": account.id,
-                "name": account.name,
-                "balance": account.balance
-            })
-        
-        # Get all transactions
-        transactions = db.query(Transaction).all()
-        transactions_data = []
-        for transaction in transactions:
-            transactions_data.append({
-                "id": transaction.id,
-                "amount": transaction.amount,
-                "description": transaction.description,
-                "transaction_type": transaction.transaction_type,
-                "category": transaction.category,
-                "date": transaction.date.isoformat() if transaction.date else None,
-                "account_id": transaction.account_id
-            })
-        
-        # Create export data
-        export_data = {
-            "export_info": {
-                "exported_at": datetime.now().isoformat(),
-                "version": "1.0.0",
-                "total_accounts": len(accounts_data),
-                "total_transactions": len(transactions_data)
-            },
-            "accounts": accounts_data,
-            "transactions": transactions_data
+async def export_database(
+    format: Literal["json", "ndjson", "csv"] = Query("json", description="json (full document), ndjson or csv (transactions only)"),
+    gzip: bool = Query(False, description="Compress the download with gzip"),
+):
+    """Export the complete database, streamed in JSON, NDJSON or CSV format"""
+    filename = f"financial_dashboard_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
+    media_type = MEDIA_TYPES[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        stream_export(format, compress=gzip),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"'
         }
-        
-        return JSONResponse(
-            content=export_data,
-            headers={
-                "Content-Disposition": f"attachment; filename=financial_dashboard_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            }
+    )
+
+def _prepare_import(body: bytes, export_format: str, mode: str):
+    """Parse an uploaded export and validate its transactions"""
+    accounts_data, transactions_data = parse_export(body, export_format)
+    
+    transactions_rows = []
+    for row in transactions_data:
+        values = TransactionCreate(**row).dict()
+        if mode == "replace":
+            values["id"] = int(row["id"])
+        transactions_rows.append(values)
+    return accounts_data, transactions_rows
+
+@app.post("/import")
+async def import_database(
+    request: Request,
+    format: Literal["json", "ndjson", "csv"] = Query("json", description="Format of the uploaded export"),
+    mode: Literal["merge", "replace"] = Query("merge", description="merge appends transactions; replace restores the export as-is"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Import a file produced by /export (the raw file is the request body)"""
+    try:
+        # Parsing and validation are CPU-bound, keep them off the event loop
+        accounts_data, transactions_rows = await run_in_threadpool(
+            _prepare_import, await request.body(), format, mode
         )
         
-    except Exception as e:
-        return JSONResponse(
-            status_code=500,
-            content={"error": f"Erro ao exportar dados: {str(e)}"}
-        )
+        if mode == "replace":
+            result = await db.run_sync(restore_export, accounts_data, transactions_rows)
+        else:
+            result = await db.run_sync(merge_export, accounts_data, transactions_rows)
+    except ArchivedYearError as e:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=f"Erro ao importar dados: {e}")
+    except (ImportFormatError, ValidationError, KeyError, TypeError, ValueError) as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=f"Erro ao importar dados: {e}")
+    except UnknownAccountError as e:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail=f"Account not found: {e.account_ids}")
+    
+    version = await db.run_sync(bump_data_version)
+    await db.commit()
+    await publish_bulk_change(db, version)
+    return result
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,138 @@
+"""Maintenance commands for the Financial Dashboard database.
+
+Usage:
+    python manage.py rebuild-rollups
+    python manage.py rebuild-daily-balances
+    python manage.py rebuild-search-index
+    python manage.py archive-year 2021 [--vacuum]
+    python manage.py reconcile [--fix]
+"""
+import argparse
+
+from database import SessionLocal, create_tables, engine
+# Register every model before create_tables runs
+from models.account import Account  # noqa: F401
+from models.transaction import Transaction  # noqa: F401
+from models.category import Category  # noqa: F401
+from models.monthly_rollup import MonthlyRollup  # noqa: F401
+from models.daily_balance import DailyBalance  # noqa: F401
+from models.data_version import DataVersion  # noqa: F401
+from models.change_log import ChangeLog  # noqa: F401
+from models.archived_year import ArchivedYear  # noqa: F401
+from models.types import from_cents
+from services.archive import ArchiveError, archive_year
+from services.data_version import bump_data_version
+from services.daily_balances import rebuild_daily_balances
+from services.reconcile import ensure_opening_balances, reconcile_balances
+from services.rollups import rebuild_monthly_rollups
+from services.search import ensure_search_index, rebuild_search_index
+
+
+def rebuild_rollups(args):
+    """Recompute the monthly rollup table from scratch"""
+    db = SessionLocal()
+    try:
+        rows = rebuild_monthly_rollups(db)
+        # Cached summaries were rendered from the old rollups
+        bump_data_version(db)
+        db.commit()
+        print(f"✅ Monthly rollups rebuilt ({rows} rows)")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def rebuild_balances(args):
+    """Recompute the daily balance snapshots from the balances and transactions"""
+    db = SessionLocal()
+    try:
+        rows = rebuild_daily_balances(db)
+        bump_data_version(db)
+        db.commit()
+        print(f"✅ Daily balances rebuilt ({rows} rows)")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def rebuild_search(args):
+    """Re-tokenize every transaction into the full-text index"""
+    with engine.begin() as conn:
+        if not ensure_search_index(conn):
+            print("❌ This SQLite build has no FTS5 support")
+            return
+        rebuild_search_index(conn)
+    print("✅ Full-text search index rebuilt")
+
+
+def archive(args):
+    """Move a closed year's transactions into their own read-only database file"""
+    with engine.connect() as conn:
+        try:
+            moved = archive_year(conn, args.year)
+        except ArchiveError as e:
+            print(f"❌ {e}")
+            return
+    print(f"✅ {moved} transactions of {args.year} archived")
+    if args.vacuum:
+        # The deleted rows' pages are only reused until the file is rewritten
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+        print("✅ Hot database vacuumed")
+
+
+def reconcile(args):
+    """Check every account's balance against its opening balance plus its transactions"""
+    with engine.begin() as conn:
+        ensure_opening_balances(conn)
+    # Closing the connection ends the read transaction of a plain check
+    with engine.connect() as conn:
+        drifts = reconcile_balances(conn, args.fix)
+        if args.fix and drifts:
+            bump_data_version(conn)
+            conn.commit()
+    for drift in drifts:
+        print(
+            f"{'✅' if args.fix else '❌'} Account {drift.account_id} ({drift.name}): "
+            f"stored {from_cents(drift.stored):.2f}, expected {from_cents(drift.expected):.2f} "
+            f"(drift {drift.drift:+.2f}){', fixed' if args.fix else ''}"
+        )
+    if not drifts:
+        print("✅ Every account balance matches its opening balance and transactions")
+    elif not args.fix:
+        print(f"❌ {len(drifts)} account(s) drifted, run with --fix to correct them")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Financial Dashboard maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    rebuild = subparsers.add_parser("rebuild-rollups", help="Recompute monthly rollups from transactions")
+    rebuild.set_defaults(handler=rebuild_rollups)
+    
+    balances = subparsers.add_parser("rebuild-daily-balances", help="Recompute daily closing balance snapshots")
+    balances.set_defaults(handler=rebuild_balances)
+    
+    search = subparsers.add_parser("rebuild-search-index", help="Rebuild the FTS5 index of transaction descriptions")
+    search.set_defaults(handler=rebuild_search)
+    
+    archiving = subparsers.add_parser("archive-year", help="Move a closed year's transactions to a read-only archive file")
+    archiving.add_argument("year", type=int, help="Year to archive; older years must be archived first")
+    archiving.add_argument("--vacuum", action="store_true", help="Rewrite the hot database afterwards to reclaim the space")
+    archiving.set_defaults(handler=archive)
+    
+    reconciling = subparsers.add_parser("reconcile", help="Check account balances against their opening balance and transactions")
+    reconciling.add_argument("--fix", action="store_true", help="Set drifted balances to their transactions' total")
+    reconciling.set_defaults(handler=reconcile)
+    
+    args = parser.parse_args()
+    create_tables()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
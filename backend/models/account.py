@@ -1,13 +1,17 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String
 from sqlalchemy.orm import relationship
 from database import Base
+from models.types import Money
 
 class Account(Base):
     __tablename__ = "accounts"
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
-    balance = Column(Float, default=0.0)
+    balance = Column(Money, default=0.0)
+    # The part of the balance no transaction explains: the balance the account
+    # was opened with plus every balance set by hand (see services.reconcile)
+    opening_balance = Column(Money, default=0.0)
     
     # Relationship
     transactions = relationship("Transaction", back_populates="account")
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, DateTime, Integer, String
+from database import Base
+from datetime import datetime
+
+class ArchivedYear(Base):
+    """A closed year whose transactions moved to their own read-only database file"""
+    __tablename__ = "archived_years"
+    
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    # File name inside DATABASE_DIR
+    file = Column(String, nullable=False)
+    transaction_count = Column(Integer, nullable=False, default=0)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<ArchivedYear(year={self.year}, file='{self.file}', transactions={self.transaction_count})>"
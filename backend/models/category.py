@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String
+from database import Base
+
+class Category(Base):
+    """Lookup table behind the integer category keys of transactions and rollups"""
+    __tablename__ = "categories"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+    
+    def __repr__(self):
+        return f"<Category(id={self.id}, name='{self.name}')>"
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String
+from database import Base
+
+class ChangeLog(Base):
+    """One row per changed transaction or account, in commit order"""
+    __tablename__ = "change_log"
+    # AUTOINCREMENT: sequence numbers are never reused, even after pruning
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer)
+    operation = Column(String, nullable=False)
+    
+    def __repr__(self):
+        return f"<ChangeLog(seq={self.seq}, {self.operation} {self.entity} {self.entity_id})>"
@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Date, Integer, ForeignKey
+from database import Base
+from models.types import Money
+
+class DailyBalance(Base):
+    """Closing balance of an account on every day it has transactions"""
+    __tablename__ = "daily_balances"
+    
+    account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    closing_balance = Column(Money, nullable=False, default=0.0)
+    # Movement of the day, so the balance before it is closing - net_change
+    net_change = Column(Money, nullable=False, default=0.0)
+    transaction_count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return (
+            f"<DailyBalance(account_id={self.account_id}, {self.day}, "
+            f"closing={self.closing_balance}, net={self.net_change}, count={self.transaction_count})>"
+        )
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String
+from database import Base
+
+class DataVersion(Base):
+    """Single-row counter bumped by every write, used to validate cached responses"""
+    __tablename__ = "data_version"
+    
+    id = Column(Integer, primary_key=True)
+    # Random per-database token, so a recreated database never reuses old ETags
+    epoch = Column(String, nullable=False)
+    version = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<DataVersion(epoch='{self.epoch}', version={self.version})>"
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, ForeignKey
+from database import Base
+from models.types import CategoryName, Money, TransactionType
+
+class MonthlyRollup(Base):
+    """Per-month totals, maintained alongside every transaction write"""
+    __tablename__ = "monthly_rollups"
+    
+    account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    transaction_type = Column(TransactionType, primary_key=True)
+    # Transactions without a category are counted under the "" category
+    category = Column("category_id", CategoryName, ForeignKey("categories.id"), key="category", primary_key=True)
+    total_amount = Column(Money, nullable=False, default=0.0)
+    transaction_count = Column(Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return (
+            f"<MonthlyRollup(account_id={self.account_id}, {self.year}-{self.month:02d}, "
+            f"{self.transaction_type}/{self.category}, total={self.total_amount}, count={self.transaction_count})>"
+        )
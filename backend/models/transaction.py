@@ -1,21 +1,37 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database import Base
+from models.types import CategoryName, Money, TransactionType
 from datetime import datetime
 
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (
+        # Backs the (date DESC, id DESC) ordering used by keyset pagination
+        Index("ix_transactions_date_id", "date", "id"),
+        # Date-range filters, alone or combined with an account or a type
+        Index("ix_transactions_account_date", "account_id", "date"),
+        Index("ix_transactions_date_type", "date", "transaction_type"),
+        # AUTOINCREMENT: ids moved to a year archive are never handed out again
+        {"sqlite_autoincrement": True},
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     date = Column(DateTime, default=datetime.utcnow)
     description = Column(String, index=True)
-    transaction_type = Column(String)  # "entrada" ou "saida"
-    category = Column(String)
-    amount = Column(Float)
+    transaction_type = Column(TransactionType)  # "entrada" ou "saida", stored as a code
+    # Named by its API value in Python, an integer key into categories in SQLite
+    category = Column("category_id", CategoryName, ForeignKey("categories.id"), key="category")
+    amount = Column(Money)
     account_id = Column(Integer, ForeignKey("accounts.id"))
     
     # Relationship
     account = relationship("Account", back_populates="transactions")
     
     def __repr__(self):
-        return f"<Transaction(id={self.id}, description='{self.description}', amount={self.amount})>" 
\ No newline at end of file
+        return f"<Transaction(id={self.id}, description='{self.description}', amount={self.amount})>"
+
+
+# Every column labelled with its attribute name, for Core selects and
+# RETURNING clauses whose rows are read as row.category
+TRANSACTION_COLUMNS = tuple(column.label(column.key) for column in Transaction.__table__.c)
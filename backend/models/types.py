@@ -0,0 +1,152 @@
+from sqlalchemy import Integer, SmallInteger, text, type_coerce
+from sqlalchemy.types import TypeDecorator
+
+
+def to_cents(amount) -> int:
+    """Convert an amount in reais to integer cents"""
+    return int(round(amount * 100))
+
+
+def from_cents(cents) -> float:
+    """Convert integer cents back to reais"""
+    return cents / 100
+
+
+class Money(TypeDecorator):
+    """Monetary amount stored as an INTEGER number of cents.
+
+    Python (and the API) keep seeing floats in reais; SQLite only ever holds
+    exact integers, so SUM and the other aggregates are exact. SQL functions
+    such as ``func.sum`` inherit this type, so their results convert back to
+    reais on the way out.
+    """
+    impl = Integer
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return None if value is None else to_cents(value)
+    
+    def process_result_value(self, value, dialect):
+        return None if value is None else from_cents(value)
+
+
+def cents(expression):
+    """Read a Money expression as raw integer cents, for exact arithmetic in Python"""
+    return type_coerce(expression, Integer)
+
+
+# Transaction types are stored as these small integer codes (0 matches nothing)
+TRANSACTION_TYPES = ("entrada", "saida")
+TYPE_CODES = {name: code for code, name in enumerate(TRANSACTION_TYPES, start=1)}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+
+class TransactionType(TypeDecorator):
+    """Transaction type stored as a small integer code, read back as its name"""
+    impl = SmallInteger
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return None if value is None else TYPE_CODES.get(value, 0)
+    
+    def process_result_value(self, value, dialect):
+        return TYPE_NAMES.get(value)
+    
+    def result_processor(self, dialect, coltype):
+        # Decoded once per row of every listing: a dict lookup without a Python frame
+        return TYPE_NAMES.get
+
+
+class CategoryCodes:
+    """Process-wide copy of the categories table: name <-> id.
+
+    Loaded by create_tables and kept current by the writers, which register the
+    categories they create (see services.categories). Encoding and decoding
+    never touch the database: they run inside async requests, on the event
+    loop. A key that is missing, such as a category added by another
+    process, marks the map stale and the next request reloads it before it
+    runs (``refresh``). Keys still missing after that are remembered, so
+    asking for them again costs nothing.
+    """
+    
+    def __init__(self):
+        self.ids = {}
+        self.names = {}
+        self.stale = False
+        # (kind, key) pairs the last reload did not find
+        self.unknown = set()
+    
+    def add(self, category_id: int, name: str):
+        # An id handed out again after a rollback replaces the stale pair
+        self.names.pop(self.ids.pop(name, None), None)
+        self.ids.pop(self.names.pop(category_id, None), None)
+        self.ids[name] = category_id
+        self.names[category_id] = name
+        self.unknown.discard(("name", name))
+        self.unknown.discard(("id", category_id))
+    
+    def forget(self, names):
+        for name in names:
+            self.names.pop(self.ids.pop(name, None), None)
+    
+    def load(self, rows):
+        # Updated in place: result processors hold on to these dicts
+        ids = {name: category_id for category_id, name in rows}
+        self.ids.clear()
+        self.ids.update(ids)
+        self.names.clear()
+        self.names.update((category_id, name) for name, category_id in ids.items())
+        self.unknown = {
+            (kind, key) for kind, key in self.unknown if key not in (self.ids if kind == "name" else self.names)
+        }
+    
+    async def refresh(self, conn, force: bool = False):
+        """Reload from an async connection or session if a lookup missed since the last load"""
+        if not (self.stale or force):
+            return
+        self.stale = False
+        self.load((await conn.execute(text("SELECT id, name FROM categories"))).all())
+    
+    def _miss(self, kind: str, key):
+        if (kind, key) not in self.unknown:
+            self.unknown.add((kind, key))
+            self.stale = True
+    
+    def id(self, name: str) -> int:
+        """Id of ``name``, or 0 (which matches nothing) when it does not exist"""
+        category_id = self.ids.get(name)
+        if category_id is None:
+            self._miss("name", name)
+            return 0
+        return category_id
+    
+    def name(self, category_id: int):
+        name = self.names.get(category_id)
+        if name is None:
+            self._miss("id", category_id)
+        return name
+
+
+category_codes = CategoryCodes()
+
+
+class CategoryName(TypeDecorator):
+    """Category stored as a categories.id foreign key, read back as its name"""
+    impl = Integer
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        return None if value is None else category_codes.id(value)
+    
+    def process_result_value(self, value, dialect):
+        return None if value is None else category_codes.name(value)
+    
+    def result_processor(self, dialect, coltype):
+        names = category_codes.names
+        
+        def process(value):
+            try:
+                return names[value]
+            except KeyError:
+                return None if value is None else category_codes.name(value)
+        return process
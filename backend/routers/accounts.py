@@ -1,14 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 
-from database import get_db
+from database import get_db, get_read_db
 from models.account import Account
-from models.transaction import Transaction
+from models.daily_balance import DailyBalance
+from models.types import from_cents, to_cents
+from services.daily_balances import balance_as_of, shift_daily_balances
+from services.change_log import ACCOUNT, INSERT, UPDATE, record_changes
+from services.data_version import bump_data_version
+from services.ledger import set_balance
+from services.events import publish_account
+from services.metrics import TimedRoute
+from services import columnar
 
-router = APIRouter(prefix="/accounts", tags=["accounts"])
+router = APIRouter(prefix="/accounts", tags=["accounts"], route_class=TimedRoute)
 
 # Pydantic schemas
 class AccountCreate(BaseModel):
@@ -30,25 +39,35 @@ class AccountBalanceHistory(BaseModel):
     date: str
     balance: float
 
+class AccountBalanceAsOf(BaseModel):
+    account_id: int
+    as_of: date
+    balance: float
+
 @router.get("/", response_model=List[AccountResponse])
-async def get_accounts(db: Session = Depends(get_db)):
+async def get_accounts(db: AsyncSession = Depends(get_read_db)):
     """Get all accounts"""
-    accounts = db.query(Account).all()
+    accounts = (await db.scalars(select(Account))).all()
     return accounts
 
 @router.post("/", response_model=AccountResponse)
-async def create_account(account: AccountCreate, db: Session = Depends(get_db)):
+async def create_account(account: AccountCreate, db: AsyncSession = Depends(get_db)):
     """Create a new account"""
-    db_account = Account(**account.dict())
+    # Transactions explain none of the balance an account opens with
+    db_account = Account(**account.dict(), opening_balance=account.balance)
     db.add(db_account)
-    db.commit()
-    db.refresh(db_account)
+    await db.flush()
+    await db.run_sync(record_changes, [(ACCOUNT, db_account.id, INSERT)])
+    version = await db.run_sync(bump_data_version)
+    await columnar.commit(db, version, lambda store: store.set_balance(db_account.id, db_account.balance))
+    await db.refresh(db_account)
+    publish_account(version, db_account)
     return db_account
 
 @router.get("/balance", response_model=dict)
-async def get_accounts_balance(db: Session = Depends(get_db)):
+async def get_accounts_balance(db: AsyncSession = Depends(get_read_db)):
     """Get current balance for all accounts"""
-    accounts = db.query(Account).all()
+    accounts = (await db.scalars(select(Account))).all()
     balance_data = {}
     
     for account in accounts:
@@ -60,84 +79,160 @@ async def get_accounts_balance(db: Session = Depends(get_db)):
     
     return balance_data
 
-@router.get("/{account_id}/balance-history", response_model=List[AccountBalanceHistory])
-async def get_account_balance_history(
-    account_id: int, 
+def _bucket_expression(resolution: str):
+    """SQL expression mapping a snapshot day to the start of its bucket"""
+    if resolution == "week":
+        # Weeks start on Monday: jump to the next Sunday, then back six days
+        return func.date(DailyBalance.day, "weekday 0", "-6 days")
+    if resolution == "month":
+        return func.strftime("%Y-%m-01", DailyBalance.day)
+    return func.date(DailyBalance.day)
+
+@router.get("/balance-history", response_model=Dict[str, List[AccountBalanceHistory]])
+async def get_accounts_balance_history(
+    account_ids: List[int] = Query(..., description="Accounts to include (repeatable)"),
     days: int = 30,
-    db: Session = Depends(get_db)
+    resolution: Literal["day", "week", "month"] = Query("day", description="Bucket size of the series"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get balance history for a specific account"""
-    account = db.query(Account).filter(Account.id == account_id).first()
-    if not account:
+    """Get bucketed balance history for several accounts in one request.
+
+    Points come from the daily_balances snapshots: each series starts with
+    the balance at the beginning of the window and then has the closing
+    balance of every bucket with activity, keyed by the bucket's first day.
+    """
+    start_day = date.today() - timedelta(days=days)
+    store = await columnar.engine.current()
+    if store is not None:
+        if not set(account_ids) <= store.balances.keys():
+            raise HTTPException(status_code=404, detail="Account not found")
+        return store.balance_history(sorted(set(account_ids)), start_day, resolution)
+    
+    accounts = (await db.scalars(select(Account).where(Account.id.in_(account_ids)))).all()
+    if len(accounts) != len(set(account_ids)):
         raise HTTPException(status_code=404, detail="Account not found")
     
-    # Get transactions for the last N days
-    start_date = datetime.now() - timedelta(days=days)
-    transactions = db.query(Transaction).filter(
-        Transaction.account_id == account_id,
-        Transaction.date >= start_date
-    ).order_by(Transaction.date).all()
+    bucket = _bucket_expression(resolution).label("bucket")
+    snapshots = select(
+        DailyBalance.account_id,
+        bucket,
+        DailyBalance.closing_balance,
+        DailyBalance.net_change,
+    ).where(
+        DailyBalance.account_id.in_(account_ids),
+        DailyBalance.day >= start_day,
+    ).order_by(DailyBalance.account_id, DailyBalance.day)
     
-    # Calculate balance history
-    balance_history = []
-    current_balance = account.balance
+    # Without activity in the window the balance never moved
+    start_label = start_day.isoformat()
+    history = {
+        str(account.id): [{"date": start_label, "balance": account.balance}]
+        for account in accounts
+    }
     
-    # Calculate initial balance (balance before the start_date)
-    for transaction in reversed(transactions):
-        if transaction.transaction_type == "entrada":
-            current_balance -= transaction.amount
+    for row in await db.execute(snapshots):
+        points = history[str(row.account_id)]
+        if len(points) == 1:
+            points[0]["balance"] = from_cents(to_cents(row.closing_balance) - to_cents(row.net_change))
+        # The first week/month bucket may begin before the window does
+        label = max(row.bucket, start_label)
+        if points[-1]["date"] == label and len(points) > 1:
+            points[-1]["balance"] = row.closing_balance
         else:
-            current_balance += transaction.amount
+            points.append({"date": label, "balance": row.closing_balance})
+    
+    return history
+
+@router.get("/{account_id}/balance", response_model=AccountBalanceAsOf)
+async def get_account_balance_as_of(
+    account_id: int,
+    as_of: Optional[date] = Query(None, description="Day whose closing balance to return (default: today)"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get an account's closing balance on a given day from its snapshots"""
+    day = as_of or date.today()
+    balance = await db.run_sync(balance_as_of, account_id, day)
+    if balance is None:
+        raise HTTPException(status_code=404, detail="Account not found")
+    return {"account_id": account_id, "as_of": day, "balance": balance}
+
+@router.get("/{account_id}/balance-history", response_model=List[AccountBalanceHistory])
+async def get_account_balance_history(
+    account_id: int, 
+    days: int = 30,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get the daily closing balances of an account"""
+    start_day = date.today() - timedelta(days=days)
+    store = await columnar.engine.current()
+    if store is not None:
+        if account_id not in store.balances:
+            raise HTTPException(status_code=404, detail="Account not found")
+        return store.account_history(account_id, start_day)
     
-    # Build history forward
-    balance_history.append({
-        "date": start_date.strftime("%Y-%m-%d"),
-        "balance": current_balance
-    })
+    account = await db.get(Account, account_id)
+    if not account:
+        raise HTTPException(status_code=404, detail="Account not found")
     
-    for transaction in transactions:
-        if transaction.transaction_type == "entrada":
-            current_balance += transaction.amount
-        else:
-            current_balance -= transaction.amount
-            
-        balance_history.append({
-            "date": transaction.date.strftime("%Y-%m-%d"),
-            "balance": current_balance
-        })
+    snapshots = (await db.scalars(
+        select(DailyBalance).where(
+            DailyBalance.account_id == account_id,
+            DailyBalance.day >= start_day
+        ).order_by(DailyBalance.day)
+    )).all()
     
+    # The window opens at the first snapshot's opening balance, or at the
+    # current balance when nothing happened since
+    opening = account.balance
+    if snapshots:
+        opening = from_cents(to_cents(snapshots[0].closing_balance) - to_cents(snapshots[0].net_change))
+    balance_history = [{"date": start_day.isoformat(), "balance": opening}]
+    balance_history.extend(
+        {"date": snapshot.day.isoformat(), "balance": snapshot.closing_balance}
+        for snapshot in snapshots
+    )
     return balance_history
 
 @router.put("/{account_id}", response_model=AccountResponse)
 async def update_account(
     account_id: int, 
     account_update: AccountCreate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update an account"""
-    account = db.query(Account).filter(Account.id == account_id).first()
-    if not account:
+    # Read and written under the write lock: a transaction committing meanwhile is not lost
+    delta = await db.run_sync(set_balance, account_id, account_update.balance)
+    if delta is None:
         raise HTTPException(status_code=404, detail="Account not found")
+    if delta:
+        # Setting the balance by hand moves the account's whole history with it
+        await db.run_sync(shift_daily_balances, account_id, delta)
     
+    account = await db.get(Account, account_id)
     account.name = account_update.name
-    account.balance = account_update.balance
-    
-    db.commit()
-    db.refresh(account)
+    await db.run_sync(record_changes, [(ACCOUNT, account_id, UPDATE)])
+    version = await db.run_sync(bump_data_version)
+    await columnar.commit(db, version, lambda store: store.set_balance(account_id, account_update.balance))
+    await db.refresh(account)
+    publish_account(version, account)
     return account
 
 @router.patch("/{account_id}/name", response_model=AccountResponse)
 async def update_account_name(
     account_id: int, 
     account_update: AccountNameUpdate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update an account's name"""
-    account = db.query(Account).filter(Account.id == account_id).first()
+    account = await db.get(Account, account_id)
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
     
     account.name = account_update.name
-    db.commit()
-    db.refresh(account)
+    await db.run_sync(record_changes, [(ACCOUNT, account_id, UPDATE)])
+    version = await db.run_sync(bump_data_version)
+    # Names are not part of the store: only its version moves
+    await columnar.commit(db, version)
+    await db.refresh(account)
+    publish_account(version, account)
     return account 
\ No newline at end of file
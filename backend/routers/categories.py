@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from pydantic import BaseModel
+
+from database import get_read_db
+from services.categories import list_categories
+from services.metrics import TimedRoute
+
+router = APIRouter(prefix="/categories", tags=["categories"], route_class=TimedRoute)
+
+# Pydantic schemas
+class CategoryResponse(BaseModel):
+    id: int
+    name: str
+    transaction_types: List[str]
+
+@router.get("/", response_model=List[CategoryResponse])
+async def get_categories(db: AsyncSession = Depends(get_read_db)):
+    """Get every category, with the transaction types it has been used with"""
+    return await db.run_sync(list_categories)
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from pydantic import BaseModel
+
+from database import get_read_db
+from routers.accounts import AccountResponse
+from routers.transactions import TransactionResponse
+from services.change_log import CHANGES_PAGE_SIZE, changes_since
+from services.metrics import TimedRoute
+from services.serialization import negotiated_response
+
+router = APIRouter(prefix="/changes", tags=["changes"], route_class=TimedRoute)
+
+# Pydantic schemas
+class ChangesResponse(BaseModel):
+    since: int
+    seq: int
+    has_more: bool
+    reset: bool
+    transactions: List[TransactionResponse]
+    deleted_transactions: List[int]
+    accounts: List[AccountResponse]
+
+@router.get("", response_model=ChangesResponse)
+async def get_changes(
+    request: Request,
+    since: int = Query(0, ge=0, description="Last seq the client has applied (0 for none)"),
+    limit: int = Query(CHANGES_PAGE_SIZE, ge=1, le=10000, description="Maximum log entries per page"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Transactions and accounts changed after ``since``, with their current values.
+
+    Pass the returned ``seq`` as ``since`` on the next call. When ``reset``
+    is true the client must reload the full lists first.
+    """
+    changes = await db.run_sync(changes_since, since, limit)
+    return negotiated_response(request, changes)
@@ -1,21 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
-from datetime import datetime, date
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, func, select, tuple_
+from typing import List, Literal, Optional
+from datetime import datetime, date, timedelta
 from pydantic import BaseModel
+from types import SimpleNamespace
+import base64
+import json
 
-from database import get_db
+from database import get_db, get_read_db
 from models.transaction import Transaction
-from models.account import Account
+from models.monthly_rollup import MonthlyRollup
+from models.types import Money, cents, from_cents, to_cents
+from services.categories import category_key
+from services.data_version import bump_data_version
+from services.events import publish_bulk_change, publish_transactions
+from services.metrics import TimedRoute
+from services import archive
+from services import columnar
+from services import ledger
+from services.ledger import ArchivedYearError, TransactionNotFoundError, UnknownAccountError, bulk_insert_transactions
+from services import search as search_index
+from services.serialization import negotiated_response, rows_to_dicts
+from services.write_batcher import batcher
 
-router = APIRouter(prefix="/transactions", tags=["transactions"])
+router = APIRouter(prefix="/transactions", tags=["transactions"], route_class=TimedRoute)
 
 # Pydantic schemas
 class TransactionCreate(BaseModel):
     date: datetime
     description: str
-    transaction_type: str
+    transaction_type: Literal["entrada", "saida"]
     category: str
     amount: float
     account_id: int
@@ -32,152 +47,544 @@ class TransactionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Column order of list responses, selected as plain rows
+RESPONSE_FIELDS = tuple(TransactionResponse.model_fields)
+RESPONSE_COLUMNS = tuple(getattr(Transaction, field).label(field) for field in RESPONSE_FIELDS)
+
+def _encode_cursor(transaction: Transaction) -> str:
+    """Build an opaque pagination cursor from a transaction's (date, id)"""
+    raw = json.dumps([transaction.date.isoformat(), transaction.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    """Decode a cursor produced by _encode_cursor into (date, id)"""
+    try:
+        raw_date, transaction_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(raw_date), int(transaction_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _month_range(year: int, month: int):
+    """Half-open [start, end) datetime range covering one calendar month"""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+def _year_range(year: int):
+    """Half-open [start, end) datetime range covering one calendar year"""
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+def _check_month(month: Optional[int]):
+    if month and not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="Month must be between 1 and 12")
+
+def _date_bounds(
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    """Half-open [start, end) the period filters confine dates to; None is unbounded"""
+    start = end = None
+    if year and month:
+        start, end = _month_range(year, month)
+    elif year:
+        start, end = _year_range(year)
+    if start_date:
+        day_start = datetime.combine(start_date, datetime.min.time())
+        start = day_start if start is None else max(start, day_start)
+    if end_date:
+        day_end = datetime.combine(end_date + timedelta(days=1), datetime.min.time())
+        end = day_end if end is None else min(end, day_end)
+    return start, end
+
+def _newest_first(row):
+    # Undated rows come last, where SQLite's DESC order puts NULLs
+    return (row.date is not None, row.date or datetime.min, row.id)
+
+async def _partitioned_page(db: AsyncSession, query, schemas, skip: int, limit: int, by_rank: bool):
+    """One page of ``query`` read from several archive partitions.
+
+    Partitions hold whole years, newest first, so in date order the page is
+    cut from their concatenation: the hot dated rows, each archive, then the
+    undated rows, which only the hot table holds. Each part is asked for the
+    rest of the page at the remaining offset, and counted only when the
+    offset skips it entirely.
+
+    Search pages are merged instead: each partition returns its own first
+    ``skip + limit`` rows with their ``rank``, scored within its own index.
+    """
+    if by_rank:
+        rows = []
+        for schema in schemas:
+            rows.extend((await db.execute(archive.on_partition(query.limit(skip + limit), schema))).all())
+        rows.sort(key=_newest_first, reverse=True)
+        # Stable: equally ranked rows stay newest first
+        rows.sort(key=lambda row: row.rank)
+        return rows[skip:skip + limit]
+
+    rows = []
+    parts = [(schema, Transaction.date.isnot(None)) for schema in schemas] + [(None, Transaction.date.is_(None))]
+    for schema, dated in parts:
+        part = query.filter(dated)
+        found = (await db.execute(archive.on_partition(part.offset(skip).limit(limit - len(rows)), schema))).all()
+        rows.extend(found)
+        if len(rows) == limit:
+            break
+        if found:
+            skip = 0
+        elif skip:
+            counted = select(func.count()).select_from(part.order_by(None).subquery())
+            skip = max(0, skip - await db.scalar(archive.on_partition(counted, schema)))
+    return rows
+
+def _apply_filters(
+    query,
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    transaction_type: Optional[str] = None,
+    category: Optional[str] = None,
+    account_id: Optional[int] = None,
+    description: Optional[str] = None,
+    account_ids: Optional[List[int]] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    search: Optional[str] = None,
+):
+    """Apply the shared transaction filters to a query.
+
+    Period filters are expressed as half-open ranges on ``Transaction.date``
+    so SQLite can answer them with an index range scan. ``end_date`` is
+    inclusive: the whole day is part of the range.
+    """
+    _check_month(month)
+    
+    if year and month:
+        month_start, month_end = _month_range(year, month)
+        query = query.filter(Transaction.date >= month_start, Transaction.date < month_end)
+    elif year:
+        year_start, year_end = _year_range(year)
+        query = query.filter(Transaction.date >= year_start, Transaction.date < year_end)
+    elif month:
+        # A month without a year spans every year, so it cannot be a single range
+        query = query.filter(func.strftime('%m', Transaction.date) == f"{month:02d}")
+    
+    if start_date:
+        query = query.filter(Transaction.date >= datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        query = query.filter(Transaction.date < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    if transaction_type:
+        query = query.filter(Transaction.transaction_type == transaction_type)
+    if category:
+        query = query.filter(Transaction.category == category_key(category))
+    if account_id:
+        query = query.filter(Transaction.account_id == account_id)
+    if description:
+        query = query.filter(Transaction.description.ilike(f"%{description}%"))
+    if account_ids:
+        query = query.filter(Transaction.account_id.in_(account_ids))
+    if min_amount is not None:
+        query = query.filter(Transaction.amount >= min_amount)
+    if max_amount is not None:
+        query = query.filter(Transaction.amount <= max_amount)
+    if search and search.split():
+        query = query.filter(_search_condition(search))
+    return query
+
+def _search_condition(search: str):
+    """Full-text match through the FTS5 index, or word-by-word LIKE without it"""
+    if search_index.fts_enabled:
+        return Transaction.id.in_(select(search_index.search_subquery(search).c.rowid))
+    return and_(*[Transaction.description.ilike(f"%{word}%") for word in search.split()])
+
 @router.get("/", response_model=List[TransactionResponse])
 async def get_transactions(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
     month: Optional[int] = Query(None, description="Filter by month (1-12)"),
     year: Optional[int] = Query(None, description="Filter by year"),
+    start_date: Optional[date] = Query(None, description="Only transactions on or after this date"),
+    end_date: Optional[date] = Query(None, description="Only transactions on or before this date"),
     transaction_type: Optional[str] = Query(None, description="Filter by type (entrada/saida)"),
     category: Optional[str] = Query(None, description="Filter by category"),
     account_id: Optional[int] = Query(None, description="Filter by account"),
     description: Optional[str] = Query(None, description="Filter by description (partial match)"),
-    db: Session = Depends(get_db)
+    search: Optional[str] = Query(None, description="Full-text search on description and category (word prefixes, best matches first)"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get transactions with optional filters"""
-    query = db.query(Transaction)
+    """Get transactions with optional filters.
+
+    Pages can be fetched either with ``skip``/``limit`` or, for deep pages, by
+    passing back the ``X-Next-Cursor`` header as ``cursor``. Cursor pages seek
+    straight to their position through the (date, id) index, so their cost
+    does not grow with depth; ``skip`` is ignored when a cursor is given.
+
+    ``search`` goes through the FTS5 index and orders results by relevance;
+    it is paged with ``skip``/``limit`` only.
     
-    if month:
-        query = query.filter(func.extract('month', Transaction.date) == month)
-    if year:
-        query = query.filter(func.extract('year', Transaction.date) == year)
-    if transaction_type:
-        query = query.filter(Transaction.transaction_type == transaction_type)
-    if category:
-        query = query.filter(Transaction.category == category)
-    if account_id:
-        query = query.filter(Transaction.account_id == account_id)
-    if description:
-        query = query.filter(Transaction.description.ilike(f"%{description}%"))
+    Archived years (see ``services.archive``) are only read when the period
+    filters, or the cursor, reach back into them.
+
+    Rows are selected as plain tuples and encoded straight to JSON (or
+    MessagePack, see ``negotiated_response``) without building a model per
+    row; ``response_model`` only documents the shape.
+    """
+    query = _apply_filters(
+        select(*RESPONSE_COLUMNS),
+        month=month,
+        year=year,
+        start_date=start_date,
+        end_date=end_date,
+        transaction_type=transaction_type,
+        category=category,
+        account_id=account_id,
+        description=description,
+    )
+    
+    ranked = bool(search and search.split())
+    if ranked and cursor:
+        raise HTTPException(status_code=400, detail="Cursor pagination cannot be combined with search")
+    
+    by_rank = ranked and search_index.fts_enabled
+    if by_rank:
+        matches = search_index.search_subquery(search)
+        # rank trails the response columns, only merging pages reads it
+        query = query.add_columns(matches.c.rank).join(matches, matches.c.rowid == Transaction.id).order_by(matches.c.rank)
+    elif ranked:
+        query = query.filter(_search_condition(search))
+    
+    query = query.order_by(Transaction.date.desc(), Transaction.id.desc())
+    start, end = _date_bounds(month, year, start_date, end_date)
+    if cursor:
+        cursor_date, cursor_id = _decode_cursor(cursor)
+        query = query.filter(tuple_(Transaction.date, Transaction.id) < (cursor_date, cursor_id))
+        # Nothing after the cursor is dated later than it
+        after_cursor = cursor_date + timedelta(microseconds=1)
+        end = after_cursor if end is None else min(end, after_cursor)
+        skip = 0
+    
+    # Archived years are only read when the period reaches them
+    schemas = archive.partitions(await db.connection(), start, end)
+    if len(schemas) > 1:
+        rows = await _partitioned_page(db, query, schemas, skip, limit, by_rank)
+    elif cursor:
+        rows = (await db.execute(query.limit(limit))).all()
+    else:
+        rows = (await db.execute(query.offset(skip).limit(limit))).all()
     
-    transactions = query.order_by(Transaction.date.desc()).offset(skip).limit(limit).all()
-    return transactions
+    # A full page means there may be more rows after the last one
+    headers = {}
+    if not ranked and rows and len(rows) == limit and rows[-1].date is not None:
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1])
+    return negotiated_response(request, rows_to_dicts(rows, RESPONSE_FIELDS), headers=headers)
+
+async def _submit_write(kind: str, *args):
+    """Hand a single write to the group-commit writer and wait for its row"""
+    try:
+        return await batcher.submit(kind, *args)
+    except TransactionNotFoundError:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    except UnknownAccountError:
+        raise HTTPException(status_code=404, detail="Account not found")
+    except ArchivedYearError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 @router.post("/", response_model=TransactionResponse)
-async def create_transaction(transaction: TransactionCreate, db: Session = Depends(get_db)):
+async def create_transaction(transaction: TransactionCreate, db: AsyncSession = Depends(get_db)):
     """Create a new transaction"""
-    # Verify account exists
-    account = db.query(Account).filter(Account.id == transaction.account_id).first()
-    if not account:
+    if batcher.running:
+        return await _submit_write("create", transaction.dict())
+    try:
+        db_transaction = await db.run_sync(ledger.create_transaction, transaction.dict())
+    except UnknownAccountError:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Account not found")
+    except ArchivedYearError as e:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     
-    db_transaction = Transaction(**transaction.dict())
-    db.add(db_transaction)
+    version = await db.run_sync(bump_data_version)
+    await columnar.commit(db, version, lambda store: store.insert(db_transaction))
+    await publish_transactions(db, version, [("created", db_transaction)])
+    return db_transaction
+
+@router.post("/bulk", response_model=dict)
+async def create_transactions_bulk(transactions: List[TransactionCreate], db: AsyncSession = Depends(get_db)):
+    """Create many transactions in one atomic request.
+
+    Rows are inserted in executemany batches and each account balance is
+    updated once with the sum of its rows, then everything commits together.
+    """
+    try:
+        result = await db.run_sync(bulk_insert_transactions, [transaction.dict() for transaction in transactions])
+    except UnknownAccountError as e:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail=f"Account not found: {e.account_ids}")
+    except ArchivedYearError as e:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     
-    # Update account balance
-    if transaction.transaction_type == "entrada":
-        account.balance += transaction.amount
-    else:
-        account.balance -= transaction.amount
+    version = await db.run_sync(bump_data_version)
+    await db.commit()
+    await publish_bulk_change(db, version)
+    return result
+
+def _summarize_rollups(rows, period: str) -> dict:
+    """Fold (period, type, cents, count) rollup rows into the summary shape"""
+    summary = {}
+    for row in rows:
+        period_data = summary.setdefault(getattr(row, period), {
+            "entrada": 0,
+            "saida": 0,
+            "total": 0,
+            "count": 0
+        })
+        
+        if row.transaction_type == "entrada":
+            period_data["entrada"] += row.amount
+        else:
+            period_data["saida"] += row.amount
+        
+        period_data["count"] += row.count
     
-    db.commit()
-    db.refresh(db_transaction)
-    return db_transaction
+    # Calculate totals, converting the exact cent sums to reais last
+    for period_data in summary.values():
+        period_data["total"] = period_data["entrada"] - period_data["saida"]
+        for key in ("entrada", "saida", "total"):
+            period_data[key] = from_cents(period_data[key])
+    
+    return summary
 
 @router.get("/monthly", response_model=dict)
 async def get_monthly_summary(
     year: int = Query(..., description="Year for summary"),
-    db: Session = Depends(get_db)
+    account_id: Optional[int] = Query(None, description="Filter by account"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get monthly transaction summary"""
-    transactions = db.query(Transaction).filter(
-        db.extract('year', Transaction.date) == year
-    ).all()
-    
-    monthly_summary = {}
-    for transaction in transactions:
-        month = transaction.date.month
-        if month not in monthly_summary:
-            monthly_summary[month] = {
-                "entrada": 0,
-                "saida": 0,
-                "total": 0,
-                "count": 0
-            }
-        
-        if transaction.transaction_type == "entrada":
-            monthly_summary[month]["entrada"] += transaction.amount
-        else:
-            monthly_summary[month]["saida"] += transaction.amount
-            
-        monthly_summary[month]["count"] += 1
+    """Get monthly transaction summary, read from the monthly rollups"""
+    store = await columnar.engine.current()
+    if store is not None:
+        return store.summary("month", year=year, account_id=account_id)
     
-    # Calculate totals
-    for month_data in monthly_summary.values():
-        month_data["total"] = month_data["entrada"] - month_data["saida"]
+    query = select(
+        MonthlyRollup.month,
+        MonthlyRollup.transaction_type,
+        func.sum(cents(MonthlyRollup.total_amount)).label("amount"),
+        func.sum(MonthlyRollup.transaction_count).label("count"),
+    ).filter(MonthlyRollup.year == year)
+    if account_id:
+        query = query.filter(MonthlyRollup.account_id == account_id)
+    rows = await db.execute(query.group_by(MonthlyRollup.month, MonthlyRollup.transaction_type))
     
-    return monthly_summary 
+    return _summarize_rollups(rows, "month")
 
-@router.delete("/{transaction_id}", response_model=TransactionResponse)
-async def delete_transaction(transaction_id: int, db: Session = Depends(get_db)):
-    """Delete a transaction"""
-    # Get transaction
-    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
-    if not transaction:
-        raise HTTPException(status_code=404, detail="Transaction not found")
+@router.get("/yearly", response_model=dict)
+async def get_yearly_summary(
+    account_id: Optional[int] = Query(None, description="Filter by account"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get yearly transaction summary, read from the monthly rollups"""
+    store = await columnar.engine.current()
+    if store is not None:
+        return store.summary("year", account_id=account_id)
     
-    # Get account to update balance
-    account = db.query(Account).filter(Account.id == transaction.account_id).first()
-    if not account:
-        raise HTTPException(status_code=404, detail="Account not found")
+    query = select(
+        MonthlyRollup.year,
+        MonthlyRollup.transaction_type,
+        func.sum(cents(MonthlyRollup.total_amount)).label("amount"),
+        func.sum(MonthlyRollup.transaction_count).label("count"),
+    )
+    if account_id:
+        query = query.filter(MonthlyRollup.account_id == account_id)
+    rows = await db.execute(query.group_by(MonthlyRollup.year, MonthlyRollup.transaction_type))
     
-    # Update account balance
-    if transaction.transaction_type == "entrada":
-        account.balance -= transaction.amount
-    else:
-        account.balance += transaction.amount
+    return _summarize_rollups(rows, "year")
+
+def _aggregate_columns():
+    """Aggregate columns shared by every /stats breakdown"""
+    return (
+        func.coalesce(func.sum(Transaction.amount), 0.0).label("total"),
+        func.count(Transaction.id).label("count"),
+        func.min(Transaction.amount).label("min"),
+        func.max(Transaction.amount).label("max"),
+        func.avg(Transaction.amount, type_=Money).label("avg"),
+    )
+
+def _merge_aggregates(rows, keys):
+    """Combine per-partition rows of ``_aggregate_columns`` that share ``keys``.
+
+    Rows come back ordered by their keys, undated (NULL) keys first as in SQL.
+    """
+    merged = {}
+    for row in rows:
+        entry = merged.setdefault(tuple(getattr(row, key) for key in keys), {"cents": 0, "count": 0, "min": None, "max": None})
+        entry["cents"] += to_cents(row.total)
+        entry["count"] += row.count
+        if row.min is not None:
+            entry["min"] = row.min if entry["min"] is None else min(entry["min"], row.min)
+            entry["max"] = row.max if entry["max"] is None else max(entry["max"], row.max)
+    return [
+        SimpleNamespace(
+            **dict(zip(keys, values)),
+            total=from_cents(entry["cents"]),
+            count=entry["count"],
+            min=entry["min"],
+            max=entry["max"],
+            avg=from_cents(entry["cents"] / entry["count"]) if entry["count"] else None,
+        )
+        for values, entry in sorted(merged.items(), key=lambda item: [(value is not None, value) for value in item[0]])
+    ]
+
+def _aggregate_dict(row) -> dict:
+    return {
+        "total": row.total,
+        "count": row.count,
+        "min": row.min,
+        "max": row.max,
+        "avg": row.avg,
+    }
+
+@router.get("/stats", response_model=dict)
+async def get_transaction_stats(
+    start_date: Optional[date] = Query(None, description="Only transactions on or after this date"),
+    end_date: Optional[date] = Query(None, description="Only transactions on or before this date"),
+    month: Optional[int] = Query(None, description="Filter by month (1-12)"),
+    year: Optional[int] = Query(None, description="Filter by year"),
+    account_ids: Optional[List[int]] = Query(None, description="Restrict to these accounts (repeatable)"),
+    min_amount: Optional[float] = Query(None, description="Minimum transaction amount"),
+    max_amount: Optional[float] = Query(None, description="Maximum transaction amount"),
+    transaction_type: Optional[str] = Query(None, description="Filter by type (entrada/saida)"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    search: Optional[str] = Query(None, description="Full-text search on description and category"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Aggregate statistics computed in SQL.
+
+    Returns totals per type, plus per-category, per-account and per-month
+    breakdowns, for the transactions matching the same filters as the list
+    endpoint. Nothing is loaded row by row into Python. Without ``search``
+    the columnar engine answers it from memory when it is on and current.
+    """
+    filters = dict(
+        month=month,
+        year=year,
+        start_date=start_date,
+        end_date=end_date,
+        transaction_type=transaction_type,
+        category=category,
+        account_ids=account_ids,
+        min_amount=min_amount,
+        max_amount=max_amount,
+    )
+    _check_month(month)
+    if not (search and search.split()):
+        store = await columnar.engine.current()
+        if store is not None:
+            return store.stats(**filters)
+    filters["search"] = search
+    schemas = archive.partitions(await db.connection(), *_date_bounds(month, year, start_date, end_date))
     
-    # Delete transaction
-    db.delete(transaction)
-    db.commit()
+    async def aggregate(statement, *keys):
+        """Rows of a grouped aggregate, combined across partitions when there are several"""
+        if len(schemas) == 1:
+            return (await db.execute(statement)).all()
+        rows = []
+        for schema in schemas:
+            rows.extend((await db.execute(archive.on_partition(statement, schema))).all())
+        return _merge_aggregates(rows, keys)
     
-    return transaction 
+    # Totals per transaction type
+    totals = {}
+    by_type = _apply_filters(
+        select(Transaction.transaction_type, *_aggregate_columns()), **filters
+    ).group_by(Transaction.transaction_type)
+    for row in await aggregate(by_type, "transaction_type"):
+        totals[row.transaction_type] = _aggregate_dict(row)
+    
+    income = totals.get("entrada", {}).get("total", 0.0)
+    expenses = totals.get("saida", {}).get("total", 0.0)
+    net = from_cents(to_cents(income) - to_cents(expenses))
+    
+    # Per-category breakdown, largest first
+    by_category = _apply_filters(
+        select(Transaction.category, Transaction.transaction_type, *_aggregate_columns()), **filters
+    ).group_by(Transaction.category, Transaction.transaction_type).order_by(func.sum(Transaction.amount).desc())
+    categories = [
+        {"category": row.category, "transaction_type": row.transaction_type, **_aggregate_dict(row)}
+        for row in sorted(await aggregate(by_category, "category", "transaction_type"), key=lambda row: row.total, reverse=True)
+    ]
+    
+    # Per-account and per-month breakdowns, split by type
+    async def _split_by_type(key_column, key_name):
+        rows = _apply_filters(
+            select(key_column.label("key"), Transaction.transaction_type, *_aggregate_columns()), **filters
+        ).group_by(key_column, Transaction.transaction_type).order_by(key_column)
+        
+        grouped = {}
+        for row in await aggregate(rows, "key", "transaction_type"):
+            entry = grouped.setdefault(row.key, {key_name: row.key, "entrada": 0.0, "saida": 0.0, "count": 0})
+            entry[row.transaction_type] = row.total
+            entry["count"] += row.count
+        for entry in grouped.values():
+            entry["net"] = from_cents(to_cents(entry["entrada"]) - to_cents(entry["saida"]))
+        return list(grouped.values())
+    
+    return {
+        "totals": {
+            "entrada": income,
+            "saida": expenses,
+            "net": net,
+            "count": sum(t["count"] for t in totals.values()),
+        },
+        "by_type": totals,
+        "by_category": categories,
+        "by_account": await _split_by_type(Transaction.account_id, "account_id"),
+        "by_month": await _split_by_type(func.strftime('%Y-%m', Transaction.date), "month"),
+    }
+
+@router.delete("/{transaction_id}", response_model=TransactionResponse)
+async def delete_transaction(transaction_id: int, db: AsyncSession = Depends(get_db)):
+    """Delete a transaction"""
+    if batcher.running:
+        return await _submit_write("delete", transaction_id)
+    try:
+        transaction = await db.run_sync(ledger.delete_transaction, transaction_id)
+    except TransactionNotFoundError:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    except ArchivedYearError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    version = await db.run_sync(bump_data_version)
+    await columnar.commit(db, version, lambda store: store.delete(transaction))
+    await publish_transactions(db, version, [("deleted", transaction)])
+    return transaction
 
 @router.put("/{transaction_id}", response_model=TransactionResponse)
 async def update_transaction(
     transaction_id: int, 
     transaction_update: TransactionCreate, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Update a transaction"""
-    # Get transaction
-    transaction = db.query(Transaction).filter(Transaction.id == transaction_id).first()
-    if not transaction:
+    if batcher.running:
+        return await _submit_write("update", transaction_id, transaction_update.dict())
+    try:
+        transaction = await db.run_sync(ledger.update_transaction, transaction_id, transaction_update.dict())
+    except TransactionNotFoundError:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Transaction not found")
-    
-    # Get account to update balance
-    old_account = db.query(Account).filter(Account.id == transaction.account_id).first()
-    new_account = db.query(Account).filter(Account.id == transaction_update.account_id).first()
-    
-    if not old_account or not new_account:
+    except UnknownAccountError:
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Account not found")
+    except ArchivedYearError as e:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
     
-    # Revert old transaction effect on old account
-    if transaction.transaction_type == "entrada":
-        old_account.balance -= transaction.amount
-    else:
-        old_account.balance += transaction.amount
-    
-    # Apply new transaction effect on new account
-    if transaction_update.transaction_type == "entrada":
-        new_account.balance += transaction_update.amount
-    else:
-        new_account.balance -= transaction_update.amount
-    
-    # Update transaction
-    for field, value in transaction_update.dict().items():
-        setattr(transaction, field, value)
-    
-    db.commit()
-    db.refresh(transaction)
-    return transaction 
\ No newline at end of file
+    version = await db.run_sync(bump_data_version)
+    await columnar.commit(db, version, lambda store: store.update(transaction))
+    await publish_transactions(db, version, [("updated", transaction)])
+    return transaction
\ No newline at end of file
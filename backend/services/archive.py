@@ -0,0 +1,188 @@
+"""Year-partitioned archive of historical transactions.
+
+``manage.py archive-year YEAR`` moves the transactions of a closed year out
+of the hot ``transactions`` table into a SQLite file of their own in
+DATABASE_DIR, with the same columns and indexes and a contentless FTS
+index. The hot table, its indexes and its FTS index then only hold the open
+years, and stay small however long the history grows.
+
+Every pooled connection attaches the registered archives read-only as
+``archive_<year>`` when it is checked out (see database.py). Readers ask
+``partitions`` which of them a date range touches, run the same statement
+on each through ``on_partition`` and combine the rows. Monthly rollups and
+daily balances keep every year in the hot database, so summaries and
+balance history never open an archive at all.
+
+Archives never change: writes dated in an archived year are refused
+(``ledger.ArchivedYearError``), and years are archived oldest first, so the
+hot table holds exactly the dates after the last archived year. SQLite
+attaches at most ``ATTACH_LIMIT`` databases to a connection, which bounds
+the number of archived years.
+"""
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, Index, MetaData, Table, and_, delete, except_, func, insert, select
+from sqlalchemy.orm import Session
+
+from database import ARCHIVES_KEY, archive_path, archive_schema, migrate_autoincrement
+from models.archived_year import ArchivedYear
+from models.transaction import Transaction
+from services import search
+from services.change_log import record_reset
+from services.data_version import bump_data_version
+
+# SQLite's default SQLITE_MAX_ATTACHED
+ATTACH_LIMIT = 10
+BUILD_SCHEMA = "archive_build"
+
+
+class ArchiveError(ValueError):
+    """Raised when a year cannot be archived"""
+
+
+def partitions(conn, start: Optional[datetime] = None, end: Optional[datetime] = None) -> list:
+    """Schemas holding the transactions dated in ``[start, end)``.
+
+    ``None`` (the hot tables) always comes first, then the attached archives
+    that overlap the range, newest first. ``conn`` is the (sync or async)
+    connection the statements will run on.
+    """
+    schemas = [None]
+    for year in sorted(conn.info.get(ARCHIVES_KEY, {}), reverse=True):
+        if (start is None or start < datetime(year + 1, 1, 1)) and (end is None or end > datetime(year, 1, 1)):
+            schemas.append(archive_schema(year))
+    return schemas
+
+
+def registered_partitions(db) -> list:
+    """Every partition, limited to the years ``archived_years`` lists in the caller's transaction.
+
+    The attachments reflect the archives as of the connection's checkout, so
+    a transaction that unregistered years (a replace import) would still
+    read them through ``partitions``.
+    """
+    connection = db.connection() if isinstance(db, Session) else db
+    registered = set(db.scalars(select(ArchivedYear.year)))
+    attached = connection.info.get(ARCHIVES_KEY, {})
+    return [None] + [archive_schema(year) for year in sorted(attached, reverse=True) if year in registered]
+
+
+def on_partition(statement, schema: Optional[str]):
+    """``statement`` with its tables read from partition ``schema``"""
+    if schema is None:
+        return statement
+    return statement.execution_options(schema_translate_map={None: schema})
+
+
+def hot_start(db: Session) -> Optional[datetime]:
+    """First date kept in the hot table, None when nothing is archived.
+
+    Read inside the caller's transaction, unlike the attachments, which
+    reflect the archives as of the connection's checkout.
+    """
+    year = db.scalar(select(func.max(ArchivedYear.year)))
+    return None if year is None else datetime(year + 1, 1, 1)
+
+
+def archived_year_of(db, transaction_id: int) -> Optional[int]:
+    """Year of the attached archive holding ``transaction_id``, if any"""
+    connection = db.connection() if isinstance(db, Session) else db
+    statement = select(Transaction.id).where(Transaction.id == transaction_id)
+    for year in connection.info.get(ARCHIVES_KEY, {}):
+        if connection.execute(on_partition(statement, archive_schema(year))).first() is not None:
+            return year
+    return None
+
+
+def _archive_table(schema: str) -> Table:
+    """Copy of the transactions table, without foreign keys, in ``schema``"""
+    source = Transaction.__table__
+    archive = Table(
+        source.name,
+        MetaData(schema=schema),
+        *[Column(column.name, column.type, key=column.key, primary_key=column.primary_key) for column in source.columns],
+    )
+    for index in source.indexes:
+        Index(index.name, *[archive.c[column.key] for column in index.columns])
+    return archive
+
+
+def archive_year(conn, year: int, today: Optional[datetime] = None) -> int:
+    """Move the transactions of ``year`` into a new archive file; returns how many moved.
+
+    ``conn`` is a sync Connection with no transaction in progress. The file
+    is written and committed first. Then a single transaction on the hot
+    database checks that the year's rows still match the archive, deletes
+    them and registers the archive, so a row can never leave the hot table
+    without being in the archive. A run that fails leaves no trace; one
+    that is killed leaves at most an unregistered file.
+    """
+    today = today or datetime.now()
+    hot = Transaction.__table__
+    start, end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    in_year = and_(hot.c.date >= start, hot.c.date < end)
+
+    if year >= today.year:
+        raise ArchiveError(f"{year} is not closed yet, only past years can be archived")
+    archived = set(conn.scalars(select(ArchivedYear.year)))
+    if year in archived:
+        raise ArchiveError(f"{year} is already archived")
+    if len(archived) >= ATTACH_LIMIT:
+        raise ArchiveError(f"SQLite attaches at most {ATTACH_LIMIT} databases, {len(archived)} years are already archived")
+    oldest = conn.scalar(select(func.min(hot.c.date)).where(hot.c.date < start))
+    if oldest is not None:
+        raise ArchiveError(f"Years are archived oldest first, archive {oldest.year} before {year}")
+    if not conn.scalar(select(func.count()).select_from(hot).where(in_year)):
+        raise ArchiveError(f"There are no transactions in {year}")
+
+    migrate_autoincrement(conn)
+    # Puts back the FTS triggers a rebuild dropped, and tells whether FTS5 is there
+    search.ensure_search_index(conn)
+    conn.commit()
+
+    file = f"transactions_{year}_{today:%Y%m%d%H%M%S}.db"
+    path = archive_path(file)
+    conn.exec_driver_sql(f"ATTACH DATABASE ? AS {BUILD_SCHEMA}", (path,))
+    try:
+        # Opened read-only later on, which a WAL database would not allow without its -shm file
+        conn.exec_driver_sql(f"PRAGMA {BUILD_SCHEMA}.journal_mode = DELETE")
+        archive = _archive_table(BUILD_SCHEMA)
+        archive.create(conn, checkfirst=False)
+        conn.execute(
+            insert(archive).from_select(
+                list(archive.c),
+                select(*hot.c).where(in_year).order_by(hot.c.date, hot.c.id),
+            )
+        )
+        if search.fts_enabled:
+            search.create_archive_search_index(conn, BUILD_SCHEMA)
+        conn.commit()
+
+        # The write lock is held from the check to the delete, so no write can slip in between
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        # The year as the archive has it, compared both ways with the hot rows
+        archived_rows = select(*archive.c)
+        hot_rows = select(*hot.c).where(in_year)
+        differing = conn.scalar(
+            select(func.count()).select_from(except_(hot_rows, archived_rows).subquery())
+        ) + conn.scalar(
+            select(func.count()).select_from(except_(archived_rows, hot_rows).subquery())
+        )
+        if differing:
+            raise ArchiveError(f"Transactions of {year} changed while they were archived, run it again")
+
+        moved = conn.execute(delete(hot).where(in_year)).rowcount
+        conn.execute(insert(ArchivedYear.__table__).values(year=year, file=file, transaction_count=moved, archived_at=today))
+        bump_data_version(conn)
+        # Clients holding rows of this year by id must reload them
+        record_reset(conn)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        conn.exec_driver_sql(f"DETACH DATABASE {BUILD_SCHEMA}")
+        os.remove(path)
+        raise
+    conn.exec_driver_sql(f"DETACH DATABASE {BUILD_SCHEMA}")
+    return moved
@@ -0,0 +1,83 @@
+"""Category dictionary: names in the API, integer keys in SQLite.
+
+``ensure_categories`` runs before a write binds category names. It inserts
+the names the table does not have yet and registers their ids in
+``category_codes``, the in-process map the CategoryName column type encodes
+with. Ids registered by a session that then rolls back are forgotten again,
+since SQLite may hand them out to another name later.
+"""
+from sqlalchemy import Column, Integer, MetaData, String, Table, bindparam, event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models.category import Category
+from models.monthly_rollup import MonthlyRollup
+from models.types import TRANSACTION_TYPES, category_codes
+
+PENDING_KEY = "new_categories"
+
+# Always the hot database's: archive partitions read their other tables from their own schema
+_categories = Table("categories", MetaData(schema="main"), Column("id", Integer), Column("name", String))
+
+
+def category_key(name: str):
+    """Id of category ``name`` as a subquery, looked up by SQLite rather than ``category_codes``.
+
+    Filters use it, so a name nobody ever wrote costs no lookup in Python
+    and simply matches nothing.
+    """
+    return select(_categories.c.id).where(_categories.c.name == name).scalar_subquery()
+
+
+def ensure_categories(db: Session, names):
+    """Make sure every name in ``names`` (None aside) has a categories row"""
+    missing = {name for name in names if name is not None and name not in category_codes.ids}
+    if not missing:
+        return
+
+    table = Category.__table__
+    db.execute(
+        sqlite_insert(table).on_conflict_do_nothing(index_elements=["name"]),
+        [{"name": name} for name in missing],
+    )
+    rows = db.execute(
+        select(table.c.id, table.c.name).where(table.c.name.in_(bindparam("names", expanding=True))),
+        {"names": list(missing)},
+    ).all()
+    for category_id, name in rows:
+        category_codes.add(category_id, name)
+    db.info.setdefault(PENDING_KEY, set()).update(missing)
+
+
+@event.listens_for(Session, "after_commit")
+def _keep_new_categories(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_new_categories(session):
+    category_codes.forget(session.info.pop(PENDING_KEY, ()))
+
+
+def list_categories(db: Session) -> list:
+    """Every category with the transaction types it has been used with.
+
+    The types come from the monthly rollups, so this never scans the
+    transactions. The "" category that collects uncategorized rows in the
+    rollups is left out.
+    """
+    used = {}
+    for category, transaction_type in db.execute(
+        select(MonthlyRollup.category, MonthlyRollup.transaction_type).distinct()
+    ):
+        used.setdefault(category, set()).add(transaction_type)
+    
+    categories = db.execute(select(Category.id, Category.name).where(Category.name != "").order_by(Category.name))
+    return [
+        {
+            "id": category_id,
+            "name": name,
+            "transaction_types": [kind for kind in TRANSACTION_TYPES if kind in used.get(name, ())],
+        }
+        for category_id, name in categories
+    ]
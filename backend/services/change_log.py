@@ -0,0 +1,132 @@
+"""Change log behind the delta sync endpoint (GET /changes).
+
+Every write appends, inside its own transaction, one entry per transaction
+or account it touched: ``(entity, entity_id, operation)`` under a sequence
+number that only grows. Entries carry no data; readers get the current rows
+of the entities changed since the sequence they last saw. Writes that
+replace everything (a replace import) log a single ``reset`` instead, which
+tells clients to fetch the full lists again.
+"""
+import os
+
+from sqlalchemy import delete, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from models.account import Account
+from models.change_log import ChangeLog
+from models.transaction import TRANSACTION_COLUMNS, Transaction
+
+TRANSACTION = "transaction"
+ACCOUNT = "account"
+# Entity of reset entries
+EVERYTHING = "all"
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+RESET = "reset"
+
+# Entries kept at startup; clients further behind are told to reset
+CHANGE_LOG_MAX_ROWS = int(os.getenv("CHANGE_LOG_MAX_ROWS", "100000"))
+CHANGES_PAGE_SIZE = 1000
+
+
+def record_changes(db: Session, changes):
+    """Append ``(entity, entity_id, operation)`` entries in the caller's transaction"""
+    changes = list(changes)
+    if changes:
+        db.execute(
+            insert(ChangeLog.__table__),
+            [{"entity": entity, "entity_id": entity_id, "operation": operation} for entity, entity_id, operation in changes],
+        )
+
+
+def record_inserted_transactions(db: Session, after_id):
+    """Log every transaction with an id above ``after_id`` as inserted"""
+    transactions = Transaction.__table__
+    db.execute(
+        insert(ChangeLog.__table__).from_select(
+            ["entity", "entity_id", "operation"],
+            select(literal(TRANSACTION), transactions.c.id, literal(INSERT))
+            .where(transactions.c.id > (after_id or 0))
+            .order_by(transactions.c.id),
+        )
+    )
+
+
+def record_reset(db: Session):
+    """Log that everything changed at once"""
+    record_changes(db, [(EVERYTHING, None, RESET)])
+
+
+def ensure_change_log(conn):
+    """Start an empty log with a reset, and trim one that grew too long.
+
+    Data written before the log existed is only reachable through a full
+    fetch, which the initial reset asks clients for.
+    """
+    latest = conn.scalar(select(func.max(ChangeLog.seq)))
+    if latest is None:
+        record_reset(conn)
+    elif CHANGE_LOG_MAX_ROWS > 0:
+        conn.execute(delete(ChangeLog).where(ChangeLog.seq <= latest - CHANGE_LOG_MAX_ROWS))
+
+
+def changes_since(db: Session, since: int, limit: int = CHANGES_PAGE_SIZE) -> dict:
+    """Changes committed after sequence ``since``, at most ``limit`` entries.
+
+    Entities changed several times appear once, with their current values.
+    ``seq`` is what to pass as ``since`` next time; ``has_more`` says that
+    another page follows. ``reset`` means the log cannot bring the client
+    up to date (a bulk replacement, or entries already pruned): it should
+    fetch everything again and continue from ``seq``.
+    """
+    log = ChangeLog.__table__
+    latest = db.scalar(select(func.max(log.c.seq))) or 0
+    oldest = db.scalar(select(func.min(log.c.seq))) or latest
+    response = {
+        "since": since,
+        "seq": latest,
+        "has_more": False,
+        "reset": False,
+        "transactions": [],
+        "deleted_transactions": [],
+        "accounts": [],
+    }
+    if since >= latest:
+        # A client ahead of the log saw another database
+        response["reset"] = since > latest
+        return response
+
+    reset = db.scalar(select(log.c.seq).where(log.c.seq > since, log.c.operation == RESET).limit(1))
+    if since < oldest - 1 or reset is not None:
+        response["reset"] = True
+        return response
+
+    entries = db.execute(
+        select(log.c.seq, log.c.entity, log.c.entity_id, log.c.operation)
+        .where(log.c.seq > since)
+        .order_by(log.c.seq)
+        .limit(limit)
+    ).all()
+    response["seq"] = entries[-1].seq
+    response["has_more"] = entries[-1].seq < latest
+
+    changed = {TRANSACTION: set(), ACCOUNT: set()}
+    for entry in entries:
+        changed[entry.entity].add(entry.entity_id)
+
+    # Current values; whatever no longer exists was deleted, possibly by a later page
+    if changed[TRANSACTION]:
+        rows = db.execute(
+            select(*TRANSACTION_COLUMNS).where(Transaction.__table__.c.id.in_(changed[TRANSACTION])).order_by(Transaction.__table__.c.id)
+        ).all()
+        response["transactions"] = [row._asdict() for row in rows]
+        response["deleted_transactions"] = sorted(changed[TRANSACTION] - {row.id for row in rows})
+    if changed[ACCOUNT]:
+        accounts = Account.__table__
+        rows = db.execute(
+            select(accounts.c.id, accounts.c.name, accounts.c.balance).where(accounts.c.id.in_(changed[ACCOUNT])).order_by(accounts.c.id)
+        ).all()
+        response["accounts"] = [row._asdict() for row in rows]
+    return response
@@ -0,0 +1,760 @@
+"""Optional in-memory columnar copy of the transactions table.
+
+With ``COLUMNAR_ENGINE`` on (and NumPy installed) the ``transactions``
+table is loaded at startup into NumPy arrays: date, month index, amount in
+cents, dictionary-encoded type and category, and account id. Rows are kept
+in date order (new rows go to an unsorted tail until the next compaction),
+so date windows are binary searches. Next to them sit two cubes of
+(period, account, type, category) cells holding count, sum, min and max,
+one per day and one per month: a few thousand cells where the table has
+millions of rows.
+
+Dashboard aggregates (stats, monthly/yearly summaries, balance series) are
+answered with vectorized masks and ``bincount``/``cumsum`` over the cells;
+only amount filters and per-transaction series read the rows.
+
+The store is only used while its data version equals the database's (see
+services.data_version). Write endpoints commit through ``commit``, which
+replays their change on the arrays when it is the very next version, so the
+store follows this process's own writes without reloading. Anything else
+(bulk inserts, imports, other workers, manage.py) leaves the store behind:
+readers fall back to SQL and a background reload catches up. The arrays
+are kept within ``COLUMNAR_MAX_MB``; a table that does not fit stays on SQL.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import timedelta
+
+from database import ARCHIVES_KEY, archive_schema, engine as sync_engine
+from models.types import TYPE_CODES, from_cents, to_cents
+from services.data_version import ROW_ID, read_data_version
+
+try:
+    import numpy as np
+except ImportError:  # optional: everything is answered in SQL without it
+    np = None
+
+logger = logging.getLogger(__name__)
+
+COLUMNAR_ENGINE = os.getenv("COLUMNAR_ENGINE", "false").lower() in ("1", "true", "yes")
+COLUMNAR_MAX_MB = float(os.getenv("COLUMNAR_MAX_MB", "256"))
+LOAD_CHUNK_ROWS = 100_000
+RETRY_SECONDS = 30
+# Spare capacity so single inserts append without reallocating
+GROWTH = 1.25
+
+INCOME = "entrada"
+EXPENSE = "saida"
+
+ROW_COLUMNS = {
+    "ids": "int64",
+    "dates": "datetime64[us]",
+    # Months since 1970-01
+    "months": "int32",
+    "amounts": "int64",
+    "types": "int8",
+    "categories": "int32",
+    "accounts": "int32",
+    # Cells of the row in the daily and the monthly cube
+    "day_cells": "int32",
+    "month_cells": "int32",
+    "alive": "bool",
+}
+CELL_COLUMNS = {
+    # First day of the cell's period
+    "dates": "datetime64[D]",
+    "months": "int32",
+    "types": "int8",
+    "categories": "int32",
+    "accounts": "int32",
+    "counts": "int64",
+    "totals": "int64",
+    "mins": "int64",
+    "maxs": "int64",
+}
+# Sorted ids and the row each one lives at
+ID_COLUMNS = {"ids": "int64", "positions": "int32"}
+ROW_BYTES = sum(np.dtype(dtype).itemsize for dtype in (*ROW_COLUMNS.values(), *ID_COLUMNS.values())) if np else 0
+
+# Sentinels of empty cells, neutral for min/max
+NO_MIN = 2**63 - 1
+NO_MAX = -2**63
+
+
+class StoreUnavailable(Exception):
+    """The table cannot be held in memory; callers stay on SQL"""
+
+
+class Dictionary:
+    """Small integer codes for a low-cardinality string column"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def code(self, value) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def encode(self, values):
+        return np.fromiter((self.code(value) for value in values), dtype=np.int32, count=len(values))
+
+
+class Columns:
+    """Equally long, growable NumPy columns"""
+
+    def __init__(self, dtypes, capacity):
+        self.dtypes = dtypes
+        self.size = 0
+        for name, dtype in dtypes.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    @property
+    def capacity(self) -> int:
+        return len(getattr(self, next(iter(self.dtypes))))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in self.dtypes)
+
+    def __getitem__(self, name):
+        return getattr(self, name)[:self.size]
+
+    def append(self, count, max_bytes=None) -> int:
+        """Reserve ``count`` entries at the end; returns the first index"""
+        start = self.size
+        if start + count > self.capacity:
+            capacity = int((start + count) * GROWTH) + 1
+            if max_bytes is not None and self.nbytes / max(1, self.capacity) * capacity > max_bytes:
+                raise StoreUnavailable("transactions outgrew the memory budget")
+            for name, dtype in self.dtypes.items():
+                grown = np.zeros(capacity, dtype=dtype)
+                grown[:start] = getattr(self, name)[:start]
+                setattr(self, name, grown)
+        self.size = start + count
+        return start
+
+    def mask(self, live, codes, month=None, year=None, start_date=None, end_date=None,
+             transaction_type=None, category=None, account_ids=None):
+        """Entries matching the same filters as the SQL ``_apply_filters``"""
+        selected = live.copy()
+        if year and month:
+            selected &= self["months"] == (year - 1970) * 12 + month - 1
+        elif year:
+            first = (year - 1970) * 12
+            selected &= (self["months"] >= first) & (self["months"] < first + 12)
+        elif month:
+            selected &= self["months"] % 12 == month - 1
+        if start_date:
+            selected &= self["dates"] >= np.datetime64(start_date, "D")
+        if end_date:
+            selected &= self["dates"] < np.datetime64(end_date + timedelta(days=1), "D")
+        if transaction_type:
+            selected &= _equals(self["types"], codes["types"].codes.get(transaction_type))
+        if category:
+            selected &= _equals(self["categories"], codes["categories"].codes.get(category))
+        if account_ids:
+            selected &= _any_equal(self["accounts"], account_ids)
+        return selected
+
+
+class Cube(Columns):
+    """Count, sum, min and max per (period, account, type, category) cell"""
+
+    def __init__(self, unit, capacity=1024):
+        super().__init__(CELL_COLUMNS, capacity)
+        self.unit = unit
+        self.index = {}
+
+    def live(self):
+        return self["counts"] > 0
+
+    def build(self, dates, accounts, types, categories, amounts):
+        """Fill the cube from row columns; returns each row's cell"""
+        periods = dates.astype(f"datetime64[{self.unit}]").astype(np.int64)
+        # Dense mixed-radix key of the four dimensions
+        key = periods - (periods.min() if len(periods) else 0)
+        for column in (accounts, types, categories):
+            key = key * (int(column.max()) + 1 if len(column) else 1) + column
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+
+        cells = len(first)
+        self.append(cells)
+        self.dates[:cells] = periods[first].astype(f"datetime64[{self.unit}]").astype("datetime64[D]")
+        self.months[:cells] = self.dates[:cells].astype("datetime64[M]").astype(np.int64)
+        self.types[:cells] = types[first]
+        self.categories[:cells] = categories[first]
+        self.accounts[:cells] = accounts[first]
+        grouped = _grouped(inverse, cells, np.ones(len(inverse)), amounts, amounts, amounts)
+        self.counts[:cells], self.totals[:cells], self.mins[:cells], self.maxs[:cells] = grouped
+        self.index = {
+            (int(period), int(account), int(type_code), int(category)): cell
+            for cell, (period, account, type_code, category) in enumerate(zip(
+                periods[first], accounts[first], types[first], categories[first]
+            ))
+        }
+        return inverse
+
+    def cell(self, date, account_id, type_code, category_code) -> int:
+        period = np.datetime64(date, self.unit)
+        key = (int(period.astype(np.int64)), account_id, type_code, category_code)
+        cell = self.index.get(key)
+        if cell is None:
+            cell = self.index[key] = self.append(1)
+            self.dates[cell] = period.astype("datetime64[D]")
+            self.months[cell] = period.astype("datetime64[M]").astype(np.int64)
+            self.accounts[cell] = account_id
+            self.types[cell] = type_code
+            self.categories[cell] = category_code
+            self.counts[cell] = self.totals[cell] = 0
+            self.mins[cell], self.maxs[cell] = NO_MIN, NO_MAX
+        return cell
+
+    def add(self, cell, amount):
+        self.counts[cell] += 1
+        self.totals[cell] += amount
+        self.mins[cell] = min(self.mins[cell], amount)
+        self.maxs[cell] = max(self.maxs[cell], amount)
+
+    def remove(self, cell, amount, remaining):
+        """Take one amount out; ``remaining()`` gives the cell's other amounts"""
+        self.counts[cell] -= 1
+        self.totals[cell] -= amount
+        if self.counts[cell] == 0:
+            self.mins[cell], self.maxs[cell] = NO_MIN, NO_MAX
+        elif amount in (self.mins[cell], self.maxs[cell]):
+            # The extreme may have left with the row
+            amounts = remaining()
+            self.mins[cell], self.maxs[cell] = amounts.min(), amounts.max()
+
+
+def _equals(column, code):
+    if code is None:
+        return np.zeros(len(column), dtype=bool)
+    return column == code
+
+
+def _any_equal(column, values):
+    # A few comparisons beat np.isin's sort on large columns
+    values = set(values)
+    if len(values) > 8:
+        return np.isin(column, list(values))
+    selected = np.zeros(len(column), dtype=bool)
+    for value in values:
+        selected |= column == value
+    return selected
+
+
+def follows(previous: str, version: str) -> bool:
+    """True when ``version`` is the bump right after ``previous``"""
+    epoch, _, number = previous.rpartition("-")
+    next_epoch, _, next_number = version.rpartition("-")
+    return bool(epoch) and epoch == next_epoch and int(next_number) == int(number) + 1
+
+
+def _grouped(keys, size, counts, totals, mins, maxs):
+    """Count, sum, min and max per dense integer key"""
+    grouped_counts = np.bincount(keys, weights=counts, minlength=size).astype(np.int64)
+    # float64 sums of integer cents are exact below 2**53
+    grouped_totals = np.bincount(keys, weights=totals, minlength=size).astype(np.int64)
+    grouped_mins = np.full(size, NO_MIN, dtype=np.int64)
+    grouped_maxs = np.full(size, NO_MAX, dtype=np.int64)
+    np.minimum.at(grouped_mins, keys, mins)
+    np.maximum.at(grouped_maxs, keys, maxs)
+    return grouped_counts, grouped_totals, grouped_mins, grouped_maxs
+
+
+def _aggregate(count, total, minimum, maximum) -> dict:
+    """Same shape and rounding as the SQL aggregate columns"""
+    return {
+        "total": from_cents(int(total)),
+        "count": int(count),
+        "min": from_cents(int(minimum)),
+        "max": from_cents(int(maximum)),
+        "avg": from_cents(int(total) / int(count)),
+    }
+
+
+def _month_label(index: int) -> str:
+    return f"{1970 + index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class ColumnStore:
+    """Rows and cubes of the transactions table at one data version"""
+
+    def __init__(self, version, capacity, max_bytes):
+        self.version = version
+        self.max_bytes = max_bytes
+        self.rows = Columns(ROW_COLUMNS, capacity)
+        self.ids = Columns(ID_COLUMNS, capacity)
+        self.days = Cube("D")
+        self.months = Cube("M")
+        # Rows before this position are sorted by date, the rest is the tail
+        self.sorted_end = 0
+        self.tombstones = 0
+        self.codes = {"types": Dictionary(), "categories": Dictionary()}
+        # Current account balances in cents, the end point of every series
+        self.balances = {}
+
+    @property
+    def size(self) -> int:
+        return self.rows.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.ids.nbytes + self.days.nbytes + self.months.nbytes
+
+    @classmethod
+    def load(cls, max_bytes):
+        """Read the whole table inside one snapshot of the database"""
+        with sync_engine.connect() as conn:
+            cursor = conn.connection.cursor()
+            # An explicit transaction keeps the version and the rows consistent
+            cursor.execute("BEGIN")
+            try:
+                row = cursor.execute(
+                    "SELECT epoch, version FROM data_version WHERE id = ?", (ROW_ID,)
+                ).fetchone()
+                version = f"{row[0]}-{row[1]}" if row else "0"
+                # Archived years first, oldest to newest, then the hot table: date order
+                sources = [f"{archive_schema(year)}.transactions" for year in sorted(conn.info.get(ARCHIVES_KEY, {}))]
+                sources.append("main.transactions")
+                count = undated = 0
+                for source in sources:
+                    rows, missing = cursor.execute(
+                        f"SELECT count(*), count(*) - count(date) FROM {source}"
+                    ).fetchone()
+                    count += rows
+                    undated += missing
+                if undated:
+                    raise StoreUnavailable(f"{undated} transactions have no date")
+                capacity = max(1024, int(count * GROWTH))
+                if capacity * ROW_BYTES > max_bytes:
+                    raise StoreUnavailable(
+                        f"{count} transactions need {capacity * ROW_BYTES / 2**20:.0f} MB, "
+                        f"over the {max_bytes / 2**20:.0f} MB budget"
+                    )
+
+                store = cls(version, capacity, max_bytes)
+                store.balances = dict(cursor.execute("SELECT id, balance FROM accounts").fetchall())
+                # Types and categories are decoded here, the store keeps its own codes
+                type_names = " ".join(f"WHEN {code} THEN '{name}'" for name, code in TYPE_CODES.items())
+                for source in sources:
+                    cursor.execute(
+                        f"SELECT transactions.id, date, amount, CASE transaction_type {type_names} END, "
+                        "categories.name, account_id "
+                        f"FROM {source} AS transactions LEFT JOIN main.categories ON categories.id = transactions.category_id "
+                        "ORDER BY date, transactions.id"
+                    )
+                    while True:
+                        chunk = cursor.fetchmany(LOAD_CHUNK_ROWS)
+                        if not chunk:
+                            break
+                        store._load_chunk(*zip(*chunk))
+            finally:
+                cursor.execute("ROLLBACK")
+                cursor.close()
+        store._build()
+        return store
+
+    def _load_chunk(self, ids, dates, amounts, types, categories, accounts):
+        rows = self.rows
+        start = rows.append(len(ids))
+        end = rows.size
+        rows.ids[start:end] = ids
+        rows.dates[start:end] = np.array(dates, dtype="datetime64[us]")
+        rows.months[start:end] = rows.dates[start:end].astype("datetime64[M]").astype(np.int64)
+        rows.amounts[start:end] = amounts
+        rows.types[start:end] = self.codes["types"].encode(types)
+        rows.categories[start:end] = self.codes["categories"].encode(categories)
+        rows.accounts[start:end] = accounts
+        rows.alive[start:end] = True
+
+    def _build(self):
+        rows = self.rows
+        dates = rows["dates"]
+        if np.any(dates[1:] < dates[:-1]):
+            # Text dates in another format do not sort chronologically in SQL
+            order = np.argsort(dates, kind="stable")
+            for name in ROW_COLUMNS:
+                column = getattr(rows, name)
+                column[:rows.size] = column[order]
+        self.sorted_end = rows.size
+        dimensions = (
+            rows["dates"],
+            rows["accounts"].astype(np.int64),
+            rows["types"].astype(np.int64),
+            rows["categories"].astype(np.int64),
+            rows["amounts"],
+        )
+        rows.day_cells[:rows.size] = self.days.build(*dimensions)
+        rows.month_cells[:rows.size] = self.months.build(*dimensions)
+        self._index_ids()
+
+    def _index_ids(self):
+        order = np.argsort(self.rows["ids"], kind="stable")
+        self.ids.size = 0
+        self.ids.append(len(order))
+        self.ids.ids[:len(order)] = self.rows["ids"][order]
+        self.ids.positions[:len(order)] = order
+
+    # Write replay: each takes the row the ledger returned from its statement
+
+    def _lookup(self, transaction_id):
+        """Index of ``transaction_id`` in the id index, or None"""
+        ids = self.ids["ids"]
+        index = int(np.searchsorted(ids, transaction_id))
+        if index < len(ids) and ids[index] == transaction_id:
+            return index
+        return None
+
+    def _signed(self, type_code, amount) -> int:
+        return amount if self.codes["types"].values[type_code] == INCOME else -amount
+
+    def _append(self, row) -> int:
+        """Write ``row`` at a new position, counted in its cells and balance"""
+        if row.date is None:
+            raise StoreUnavailable("transaction without a date")
+        rows = self.rows
+        position = rows.append(1, self.max_bytes)
+        date = np.datetime64(row.date, "us")
+        amount = to_cents(row.amount)
+        type_code = self.codes["types"].code(row.transaction_type)
+        category_code = self.codes["categories"].code(row.category)
+
+        rows.ids[position] = row.id
+        rows.dates[position] = date
+        rows.months[position] = date.astype("datetime64[M]").astype(np.int64)
+        rows.amounts[position] = amount
+        rows.types[position] = type_code
+        rows.categories[position] = category_code
+        rows.accounts[position] = row.account_id
+        rows.alive[position] = True
+        for cube, cells in ((self.days, rows.day_cells), (self.months, rows.month_cells)):
+            cells[position] = cube.cell(date, row.account_id, type_code, category_code)
+            cube.add(cells[position], amount)
+        self._move_balance(row.account_id, self._signed(type_code, amount))
+
+        # The sorted run grows while rows keep arriving in date order
+        if self.sorted_end == position and (position == 0 or rows.dates[position - 1] <= date):
+            self.sorted_end += 1
+        return position
+
+    def _remove(self, position):
+        """Take the row at ``position`` out of its cells and balance"""
+        rows = self.rows
+        amount = int(rows.amounts[position])
+        rows.alive[position] = False
+        self.tombstones += 1
+        self._move_balance(int(rows.accounts[position]), -self._signed(rows.types[position], amount))
+        for cube, cells in ((self.days, rows.day_cells), (self.months, rows.month_cells)):
+            cell = int(cells[position])
+            cube.remove(cell, amount, lambda: rows["amounts"][rows["alive"] & (cells[:rows.size] == cell)])
+
+    def _move_balance(self, account_id, delta):
+        self.balances[account_id] = self.balances.get(account_id, 0) + delta
+
+    def _existing(self, row):
+        index = self._lookup(row.id)
+        if index is None or not self.rows.alive[self.ids.positions[index]]:
+            raise StoreUnavailable(f"transaction {row.id} is not in the store")
+        return index
+
+    def insert(self, row):
+        index = self._lookup(row.id)
+        if index is None:
+            if self.ids.size and row.id < self.ids.ids[self.ids.size - 1]:
+                raise StoreUnavailable(f"transaction {row.id} inserted out of id order")
+            index = self.ids.append(1, self.max_bytes)
+            self.ids.ids[index] = row.id
+        elif self.rows.alive[self.ids.positions[index]]:
+            raise StoreUnavailable(f"transaction {row.id} is already in the store")
+        # else SQLite handed a deleted max id out again
+        self.ids.positions[index] = self._append(row)
+        self._maintain()
+
+    def update(self, row):
+        index = self._existing(row)
+        self._remove(self.ids.positions[index])
+        # Moving the row to the tail keeps the sorted run sorted
+        self.ids.positions[index] = self._append(row)
+        self._maintain()
+
+    def delete(self, row):
+        index = self._existing(row)
+        self._remove(self.ids.positions[index])
+        self._maintain()
+
+    def set_balance(self, account_id, balance):
+        self.balances[account_id] = to_cents(balance)
+
+    def _maintain(self):
+        """Compact once dead rows or the unsorted tail slow scans down"""
+        unsorted = self.tombstones + self.size - self.sorted_end
+        if unsorted > 1024 and unsorted * 10 > self.size:
+            self._compact()
+
+    def _compact(self):
+        rows = self.rows
+        alive = np.flatnonzero(rows["alive"])
+        order = alive[np.lexsort((rows["ids"][alive], rows["dates"][alive]))]
+        for name in ROW_COLUMNS:
+            column = getattr(rows, name)
+            column[:len(order)] = column[order]
+        rows.size = self.sorted_end = len(order)
+        self.tombstones = 0
+        self._index_ids()
+
+    def _since(self, start, end=None):
+        """Positions of live rows with ``start <= date`` (``< end``)"""
+        rows = self.rows
+        sorted_dates = rows.dates[:self.sorted_end]
+        first = np.searchsorted(sorted_dates, start, side="left")
+        last = np.searchsorted(sorted_dates, end, side="left") if end is not None else self.sorted_end
+        tail = rows.dates[self.sorted_end:rows.size]
+        in_tail = tail >= start if end is None else (tail >= start) & (tail < end)
+        positions = np.concatenate([np.arange(first, last), self.sorted_end + np.flatnonzero(in_tail)])
+        return positions[rows.alive[positions]]
+
+    # Queries
+
+    def stats(self, min_amount=None, max_amount=None, **filters) -> dict:
+        """The /transactions/stats document"""
+        if min_amount is None and max_amount is None:
+            # Date bounds need days, everything else is answered by months
+            source = self.days if filters.get("start_date") or filters.get("end_date") else self.months
+            selected = source.mask(source.live(), self.codes, **filters)
+            counts, totals = source["counts"][selected], source["totals"][selected]
+            mins, maxs = source["mins"][selected], source["maxs"][selected]
+        else:
+            # Amount filters need the individual rows
+            source = self.rows
+            selected = source.mask(source["alive"], self.codes, **filters)
+            if min_amount is not None:
+                selected &= source["amounts"] >= to_cents(min_amount)
+            if max_amount is not None:
+                selected &= source["amounts"] <= to_cents(max_amount)
+            totals = mins = maxs = source["amounts"][selected]
+            counts = np.ones(len(totals), dtype=np.int64)
+        values = (counts, totals, mins, maxs)
+
+        types = source["types"][selected].astype(np.int64)
+        type_names = self.codes["types"].values
+        type_count = len(type_names)
+
+        grouped = _grouped(types, type_count, *values)
+        by_type = {
+            type_names[code]: _aggregate(*(column[code] for column in grouped))
+            for code in sorted(np.flatnonzero(grouped[0]), key=lambda code: type_names[code])
+        }
+        income = by_type.get(INCOME, {}).get("total", 0.0)
+        expenses = by_type.get(EXPENSE, {}).get("total", 0.0)
+
+        category_names = self.codes["categories"].values
+        keys = source["categories"][selected].astype(np.int64) * type_count + types
+        grouped = _grouped(keys, len(category_names) * type_count, *values)
+        present = np.flatnonzero(grouped[0])
+        by_category = [
+            {
+                "category": category_names[key // type_count],
+                "transaction_type": type_names[key % type_count],
+                **_aggregate(*(column[key] for column in grouped)),
+            }
+            for key in present[np.argsort(-grouped[1][present], kind="stable")]
+        ]
+
+        months = source["months"][selected].astype(np.int64)
+        first_month = int(months.min()) if len(months) else 0
+        return {
+            "totals": {
+                "entrada": income,
+                "saida": expenses,
+                "net": from_cents(to_cents(income) - to_cents(expenses)),
+                "count": int(counts.sum()),
+            },
+            "by_type": by_type,
+            "by_category": by_category,
+            "by_account": self._split_by_type(
+                source["accounts"][selected].astype(np.int64), types, counts, totals, "account_id", int
+            ),
+            "by_month": self._split_by_type(
+                months - first_month, types, counts, totals, "month",
+                lambda key: _month_label(key + first_month),
+            ),
+        }
+
+    def _split_by_type(self, groups, types, counts, totals, key_name, label):
+        type_names = self.codes["types"].values
+        type_count = len(type_names)
+        size = (int(groups.max()) + 1 if len(groups) else 0) * type_count
+        keys = groups * type_count + types
+        grouped_counts = np.bincount(keys, weights=counts, minlength=size).astype(np.int64)
+        grouped_totals = np.bincount(keys, weights=totals, minlength=size).astype(np.int64)
+
+        entries = []
+        for group in np.flatnonzero(grouped_counts.reshape(-1, type_count).any(axis=1)):
+            cells = slice(group * type_count, (group + 1) * type_count)
+            entry = {key_name: label(int(group)), INCOME: 0.0, EXPENSE: 0.0, "count": int(grouped_counts[cells].sum())}
+            for code in np.flatnonzero(grouped_counts[cells]):
+                entry[type_names[code]] = from_cents(int(grouped_totals[cells][code]))
+            entry["net"] = from_cents(to_cents(entry[INCOME]) - to_cents(entry[EXPENSE]))
+            entries.append(entry)
+        return entries
+
+    def summary(self, period, year=None, account_id=None) -> dict:
+        """Monthly (for one year) or yearly income/expense summary"""
+        cube = self.months
+        selected = cube.mask(cube.live(), self.codes, year=year, account_ids=[account_id] if account_id else None)
+        months = cube["months"][selected].astype(np.int64)
+        keys = months % 12 + 1 if period == "month" else months // 12 + 1970
+        income = cube["types"][selected] == self.codes["types"].codes.get(INCOME, -1)
+        totals = cube["totals"][selected]
+
+        size = int(keys.max()) + 1 if len(keys) else 0
+        counts = np.bincount(keys, weights=cube["counts"][selected], minlength=size).astype(np.int64)
+        incomes = np.bincount(keys, weights=np.where(income, totals, 0), minlength=size).astype(np.int64)
+        # Like the rollup summary, every other type counts as an expense
+        expenses = np.bincount(keys, weights=np.where(income, 0, totals), minlength=size).astype(np.int64)
+        return {
+            int(key): {
+                "entrada": from_cents(int(incomes[key])),
+                "saida": from_cents(int(expenses[key])),
+                "total": from_cents(int(incomes[key] - expenses[key])),
+                "count": int(counts[key]),
+            }
+            for key in np.flatnonzero(counts)
+        }
+
+    def _signed_amounts(self, types, amounts):
+        return np.where(types == self.codes["types"].codes.get(INCOME, -1), amounts, -amounts)
+
+    def balance_history(self, account_ids, start, resolution) -> dict:
+        """Bucketed closing balances per account from the ``start`` day on,
+        like /accounts/balance-history"""
+        cube = self.days
+        start_label = start.isoformat()
+        cells = cube.mask(cube.live(), self.codes, account_ids=account_ids) & (cube["dates"] >= np.datetime64(start, "D"))
+        accounts, days = cube["accounts"][cells], cube["dates"][cells]
+        signed = self._signed_amounts(cube["types"][cells], cube["totals"][cells])
+
+        if resolution == "month":
+            buckets = days.astype("datetime64[M]").astype("datetime64[D]")
+        elif resolution == "week":
+            numbers = days.astype(np.int64)
+            # 1970-01-01 was a Thursday: weeks start on the Monday before
+            buckets = (numbers - (numbers + 3) % 7).astype("datetime64[D]")
+        else:
+            buckets = days
+
+        history = {}
+        for account_id in account_ids:
+            own = accounts == account_id
+            labels, inverse = np.unique(buckets[own], return_inverse=True)
+            running = np.cumsum(np.bincount(inverse, weights=signed[own], minlength=len(labels)).astype(np.int64))
+            opening = self.balances[account_id] - (int(running[-1]) if len(running) else 0)
+            points = [{"date": start_label, "balance": from_cents(opening)}]
+            points.extend(
+                {"date": max(str(label), start_label), "balance": from_cents(opening + int(total))}
+                for label, total in zip(labels, running)
+            )
+            history[str(account_id)] = points
+        return history
+
+    def account_history(self, account_id, start) -> list:
+        """Daily closing balances since ``start``, like /accounts/{id}/balance-history"""
+        return self.balance_history([account_id], start, "day")[str(account_id)]
+
+
+class ColumnarEngine:
+    """Owns the current store, its reloads and the replay of local writes"""
+
+    def __init__(self, enabled=COLUMNAR_ENGINE, max_bytes=COLUMNAR_MAX_MB * 2**20):
+        self.enabled = enabled and np is not None
+        if enabled and np is None:
+            logger.warning("COLUMNAR_ENGINE is set but NumPy is not installed; analytics stay on SQL")
+        self.max_bytes = max_bytes
+        self.store = None
+        self.loading = None
+        self.retry_at = 0.0
+        # Versions committed by this process whose replay has not run yet
+        self.in_flight = set()
+
+    def start(self):
+        if self.enabled:
+            self.reload()
+
+    def reload(self):
+        if time.monotonic() < self.retry_at:
+            return
+        if self.loading is None or self.loading.done():
+            self.loading = asyncio.get_running_loop().create_task(self._load())
+
+    async def _load(self):
+        started = time.perf_counter()
+        try:
+            store = await asyncio.to_thread(ColumnStore.load, self.max_bytes)
+        except StoreUnavailable as e:
+            self.store = None
+            self.retry_at = time.monotonic() + RETRY_SECONDS
+            logger.warning("Columnar engine off, analytics stay on SQL: %s", e)
+            return
+        except Exception:
+            self.store = None
+            self.retry_at = time.monotonic() + RETRY_SECONDS
+            logger.exception("Loading the columnar store failed")
+            return
+        self.store = store
+        logger.info("Columnar store loaded: %d transactions, %.1f MB in %.2fs",
+                    store.size, store.nbytes / 2**20, time.perf_counter() - started)
+
+    async def current(self):
+        """The store if it matches the database right now, else None (use SQL)"""
+        if not self.enabled:
+            return None
+        version = await read_data_version()
+        store = self.store
+        if store is not None and store.version == version:
+            return store
+        # A local write between its commit and its replay is no reason to reload
+        if version not in self.in_flight:
+            self.reload()
+        return None
+
+    def apply(self, version, change=None):
+        store = self.store
+        if store is None or not follows(store.version, version):
+            return
+        try:
+            if change is not None:
+                change(store)
+        except StoreUnavailable as e:
+            logger.warning("Columnar store dropped: %s", e)
+            self.store = None
+            return
+        except Exception:
+            # The write is committed already: only the copy is lost, and reloads
+            logger.exception("Replaying a committed write failed, columnar store dropped")
+            self.store = None
+            return
+        store.version = version
+
+
+engine = ColumnarEngine()
+
+
+async def commit(db, version, change=None):
+    """Commit a write session, then replay ``change(store)`` on the arrays.
+
+    ``version`` is what ``bump_data_version`` returned inside the session.
+    """
+    engine.in_flight.add(version)
+    try:
+        await db.commit()
+    finally:
+        engine.in_flight.discard(version)
+    engine.apply(version, change)
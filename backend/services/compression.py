@@ -0,0 +1,119 @@
+"""Brotli/gzip compression of large responses, negotiated by Accept-Encoding.
+
+Bodies smaller than ``COMPRESSION_MIN_BYTES`` are sent as they are, where
+compressing costs more than it saves. Streamed bodies (exports) are
+compressed chunk by chunk as they are produced. Brotli is preferred when the
+optional ``brotli`` package is installed and the client accepts it.
+"""
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # optional: gzip is offered alone without it
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Brotli's default (11) is meant for static files, far too slow per request
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# Already compressed, or not worth it
+SKIPPED_MEDIA_TYPES = ("application/gzip", "application/zip", "image/", "text/event-stream")
+
+
+def choose_encoding(accept_encoding: str):
+    """``"br"``, ``"gzip"`` or None for an Accept-Encoding header"""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        if "q=0" not in params.replace(" ", "").split(";"):
+            accepted.add(coding.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    """Uniform streaming interface over zlib (gzip) and brotli"""
+
+    def __init__(self, encoding):
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self.compress = self.compressor.process
+            self.flush = self.compressor.finish
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self.compress = self.compressor.compress
+            self.flush = self.compressor.flush
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing response bodies for clients that accept it"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "")
+                if "content-encoding" in headers or media_type.startswith(SKIPPED_MEDIA_TYPES):
+                    state["passthrough"] = True
+                    await send(message)
+                else:
+                    # Held back until the first body chunk shows the size
+                    state["start"] = message
+                return
+
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            start = state["start"]
+            if start is not None:
+                state["start"] = None
+                if not more_body and len(body) < self.minimum_size:
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+                headers = MutableHeaders(scope=start)
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                state["compressor"] = _Compressor(encoding)
+                if more_body:
+                    del headers["content-length"]
+                else:
+                    body = state["compressor"].compress(body) + state["compressor"].flush()
+                    headers["content-length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start)
+
+            compressor = state["compressor"]
+            body = compressor.compress(body)
+            if not more_body:
+                body += compressor.flush()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,201 @@
+"""Maintenance of the daily_balances snapshot table.
+
+Each account has one row per day with transactions, holding the closing
+balance of that day. A write on day D changes the closing balance of D and
+of every later day, so deltas are applied with one ranged UPDATE per
+(account, day) key, inside the caller's session like the monthly rollups.
+
+The table is derived from ``accounts.balance`` and the transactions: the
+closing balance of D is the current balance minus everything after D. The
+helpers therefore run after the caller has updated the balances.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import bindparam, case, delete, func, insert, literal_column, select, tuple_, update
+from sqlalchemy.orm import Session
+
+from models.account import Account
+from models.daily_balance import DailyBalance
+from models.transaction import Transaction
+from models.types import Money, from_cents, to_cents
+from services.archive import hot_start
+
+# Past this many (account, day) keys a batch rebuilds its accounts instead
+REBUILD_THRESHOLD = 500
+
+
+def snapshot_key(account_id, when):
+    """Snapshot primary key for a transaction's account and date"""
+    return (account_id, when.date() if isinstance(when, datetime) else when)
+
+
+def signed_cents(transaction_type: str, amount) -> int:
+    cents = to_cents(amount)
+    return cents if transaction_type == "entrada" else -cents
+
+
+def apply_daily_deltas(db: Session, deltas):
+    """Apply ``{(account_id, day): (cents, count)}`` to the snapshots.
+
+    Must run after the accounts' balances already include the deltas.
+    """
+    deltas = {key: value for key, value in deltas.items() if key[1] is not None and (value[0] or value[1])}
+    if not deltas:
+        return
+    if len(deltas) > REBUILD_THRESHOLD:
+        rebuild_daily_balances(db, {account_id for account_id, _ in deltas})
+        return
+
+    table = DailyBalance.__table__
+    account_totals = defaultdict(int)
+    for (account_id, _), (cents, _) in deltas.items():
+        account_totals[account_id] += cents
+    keys = sorted(deltas)
+
+    # Days new to an account start at the balance they inherit: the previous
+    # day's close, or the next day's opening, or the balance before this write
+    account_id, day = bindparam("snapshot_account", type_=DailyBalance.account_id.type), bindparam("snapshot_day", type_=DailyBalance.day.type)
+    previous = select(table.c.closing_balance).where(
+        table.c.account_id == account_id, table.c.day < day
+    ).order_by(table.c.day.desc()).limit(1).scalar_subquery()
+    following = select(table.c.closing_balance - table.c.net_change).where(
+        table.c.account_id == account_id, table.c.day > day
+    ).order_by(table.c.day).limit(1).scalar_subquery()
+    before_write = select(
+        Account.__table__.c.balance - bindparam("account_total", type_=Money)
+    ).where(Account.__table__.c.id == account_id).scalar_subquery()
+    db.execute(
+        insert(table).prefix_with("OR IGNORE").from_select(
+            ["account_id", "day", "closing_balance", "net_change", "transaction_count"],
+            select(account_id, day, func.coalesce(previous, following, before_write), literal_column("0"), literal_column("0")),
+        ),
+        [
+            {"snapshot_account": account, "snapshot_day": when, "account_total": from_cents(account_totals[account])}
+            for account, when in keys
+        ],
+    )
+
+    # Then each key moves its own day and ripples into every later one
+    own_day = table.c.day == bindparam("snapshot_day", type_=DailyBalance.day.type)
+    db.execute(
+        update(table)
+        .where(
+            table.c.account_id == bindparam("snapshot_account"),
+            table.c.day >= bindparam("snapshot_day", type_=DailyBalance.day.type),
+        )
+        .values(
+            closing_balance=table.c.closing_balance + bindparam("delta", type_=Money),
+            net_change=table.c.net_change + case((own_day, bindparam("delta", type_=Money)), else_=0),
+            transaction_count=table.c.transaction_count + case((own_day, bindparam("count")), else_=0),
+        ),
+        [
+            {"snapshot_account": account, "snapshot_day": when, "delta": from_cents(deltas[(account, when)][0]), "count": deltas[(account, when)][1]}
+            for account, when in keys
+        ],
+    )
+
+    # Days left without transactions carry no information
+    removed = [key for key, (_, count) in deltas.items() if count < 0]
+    if removed:
+        db.execute(
+            delete(table).where(
+                tuple_(table.c.account_id, table.c.day).in_(removed),
+                table.c.transaction_count <= 0,
+            )
+        )
+
+
+def add_to_daily_balances(db: Session, transaction, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) one transaction from the snapshots"""
+    key = snapshot_key(transaction.account_id, transaction.date)
+    apply_daily_deltas(db, {key: (sign * signed_cents(transaction.transaction_type, transaction.amount), sign)})
+
+
+def shift_daily_balances(db: Session, account_id: int, delta: float):
+    """Move an account's whole history, after its balance was set by hand"""
+    table = DailyBalance.__table__
+    db.execute(
+        update(table)
+        .where(table.c.account_id == account_id)
+        .values(closing_balance=table.c.closing_balance + delta)
+    )
+
+
+def rebuild_daily_balances(db: Session, account_ids=None) -> int:
+    """Recompute the snapshots (of ``account_ids``, default all) from scratch.
+
+    Days of archived years are kept as they are: the hot table holds every
+    later transaction, which is all a later closing balance depends on.
+    Returns the number of snapshot rows written. The caller commits.
+    """
+    day = func.date(Transaction.date).label("day")
+    signed = case((Transaction.transaction_type == "entrada", Transaction.amount), else_=-Transaction.amount)
+    daily = select(
+        Transaction.account_id,
+        day,
+        func.sum(signed).label("net"),
+        func.count(Transaction.id).label("count"),
+    ).where(Transaction.date.is_not(None)).group_by(Transaction.account_id, day)
+    if account_ids is not None:
+        daily = daily.where(Transaction.account_id.in_(account_ids))
+    daily = daily.subquery()
+
+    # Closing of a day = current balance - everything after that day
+    running = func.sum(daily.c.net).over(partition_by=daily.c.account_id, order_by=daily.c.day)
+    total = func.sum(daily.c.net).over(partition_by=daily.c.account_id)
+    rows = select(
+        daily.c.account_id,
+        daily.c.day,
+        Account.balance - total + running,
+        daily.c.net,
+        daily.c.count,
+    ).join(Account, Account.id == daily.c.account_id)
+
+    table = DailyBalance.__table__
+    clear = delete(table)
+    if account_ids is not None:
+        clear = clear.where(table.c.account_id.in_(account_ids))
+    start = hot_start(db)
+    if start is not None:
+        clear = clear.where(table.c.day >= start.date())
+    db.execute(clear)
+    result = db.execute(
+        insert(table).from_select(
+            ["account_id", "day", "closing_balance", "net_change", "transaction_count"], rows
+        )
+    )
+    return result.rowcount
+
+
+def daily_balances_need_rebuild(db: Session) -> bool:
+    """True when transactions exist but no snapshots have been built yet"""
+    has_snapshots = db.scalar(select(DailyBalance.account_id).limit(1)) is not None
+    has_transactions = db.scalar(select(Transaction.id).limit(1)) is not None
+    return has_transactions and not has_snapshots
+
+
+def balance_as_of(db: Session, account_id: int, day: date):
+    """Closing balance of ``day``; None for an unknown account.
+
+    The latest snapshot on or before ``day`` answers it. Days before the
+    first snapshot have the opening balance of the next one, and accounts
+    without transactions always had their current balance.
+    """
+    closing = db.scalar(
+        select(DailyBalance.closing_balance)
+        .where(DailyBalance.account_id == account_id, DailyBalance.day <= day)
+        .order_by(DailyBalance.day.desc())
+        .limit(1)
+    )
+    if closing is not None:
+        return closing
+    opening = db.scalar(
+        select(DailyBalance.closing_balance - DailyBalance.net_change)
+        .where(DailyBalance.account_id == account_id, DailyBalance.day > day)
+        .order_by(DailyBalance.day)
+        .limit(1)
+    )
+    if opening is not None:
+        return opening
+    return db.scalar(select(Account.balance).where(Account.id == account_id))
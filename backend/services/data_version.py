@@ -0,0 +1,49 @@
+"""Database-wide data version.
+
+Every write endpoint calls ``bump_data_version`` inside its own session, so
+the new version commits atomically with the data it describes. Readers that
+fetch the version *before* querying therefore never see data older than the
+version they hold, which is what makes it safe as a cache validator.
+"""
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from database import async_read_engine
+from models.data_version import DataVersion
+
+ROW_ID = 1
+
+
+def _new_row():
+    return sqlite_insert(DataVersion).values(id=ROW_ID, epoch=uuid.uuid4().hex[:12], version=0)
+
+
+def ensure_data_version(conn):
+    """Create the version row if the database does not have one yet"""
+    conn.execute(_new_row().on_conflict_do_nothing(index_elements=["id"]))
+
+
+def bump_data_version(db: Session) -> str:
+    """Advance the data version inside the caller's transaction; returns the new token"""
+    statement = _new_row()
+    row = db.execute(
+        statement.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"version": DataVersion.version + 1},
+        ).returning(DataVersion.epoch, DataVersion.version)
+    ).one()
+    return f"{row.epoch}-{row.version}"
+
+
+async def read_data_version() -> str:
+    """Current ``epoch-version`` token, read from the database"""
+    async with async_read_engine.connect() as conn:
+        row = (await conn.execute(
+            select(DataVersion.epoch, DataVersion.version).where(DataVersion.id == ROW_ID)
+        )).first()
+    if row is None:
+        return "0"
+    return f"{row.epoch}-{row.version}"
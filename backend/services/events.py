@@ -0,0 +1,153 @@
+"""Live change notifications: in-process pub/sub streamed as server-sent events.
+
+Write paths publish after their commit. An event is encoded once into an SSE
+frame and the same bytes are queued for every subscriber, so a change costs
+one fan-out however many dashboards listen, and nothing at all when none do.
+Each subscriber has a bounded queue: one that falls ``EVENTS_QUEUE_SIZE``
+events behind is disconnected instead of buffering without limit. Browsers'
+EventSource reconnects by itself and sends the last id it saw; when that is
+not the current data version, the stream opens with a ``resync`` event.
+
+Event types (the SSE id is the data version after the change):
+
+* ``ready``: first event of an up-to-date stream,
+* ``resync``: the client missed changes and should reload (or call /changes),
+* ``transaction``: ``{"op": "created"|"updated"|"deleted", "transaction": {...}}``,
+* ``account``: an account's ``{"id", "name", "balance"}`` after an account write,
+* ``balances``: ``{"<account_id>": balance}`` of every account after a write,
+* ``changes``: bulk writes and imports; clients fetch /changes or reload.
+
+Only writes made by this process are seen. With several workers, clients
+should also sync through /changes when they regain focus or reconnect.
+"""
+import asyncio
+import os
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models.account import Account
+from services.data_version import read_data_version
+from services.metrics import EVENT_SUBSCRIBERS_DROPPED, EVENTS_PUBLISHED
+from services.serialization import dumps
+
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+# Comment lines keep proxies from closing idle streams and reveal dead clients
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+# Streams end after this long and the client reconnects; this also bounds how
+# long a graceful server shutdown waits for open streams
+EVENTS_STREAM_SECONDS = float(os.getenv("EVENTS_STREAM_SECONDS", "300"))
+# Delay browsers wait before reconnecting
+RECONNECT_MS = 3000
+
+HEARTBEAT = b": keep-alive\n\n"
+
+# ``op`` of transaction events for each ledger write
+TRANSACTION_OPS = {"create": "created", "update": "updated", "delete": "deleted"}
+
+
+def encode_event(event: str, data, event_id=None) -> bytes:
+    """One SSE frame; the compact JSON never contains a newline"""
+    frame = b""
+    if event_id is not None:
+        frame += b"id: " + str(event_id).encode() + b"\n"
+    return frame + b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+class EventBroker:
+    """Bounded per-subscriber queues of encoded frames"""
+
+    def __init__(self, queue_size=EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = set()
+
+    @property
+    def active(self) -> bool:
+        return bool(self.subscribers)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event: str, data, event_id=None):
+        if not self.subscribers:
+            return
+        EVENTS_PUBLISHED.inc((event,))
+        frame = encode_event(event, data, event_id)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._drop(queue)
+
+    def _drop(self, queue):
+        """Cut off a subscriber that stopped keeping up"""
+        self.subscribers.discard(queue)
+        EVENT_SUBSCRIBERS_DROPPED.inc()
+        # Its backlog is of no use any more; make room for the end marker
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+
+broker = EventBroker()
+
+
+def _balances(db: Session) -> dict:
+    return {str(account_id): balance for account_id, balance in db.execute(select(Account.id, Account.balance))}
+
+
+async def publish_transactions(db, version, changes):
+    """Publish committed ``(op, row)`` transaction changes and the new balances"""
+    if not broker.active or not changes:
+        return
+    for op, row in changes:
+        broker.publish("transaction", {"op": op, "transaction": row._asdict()}, version)
+    broker.publish("balances", await db.run_sync(_balances), version)
+
+
+def publish_account(version, account):
+    if broker.active:
+        broker.publish("account", {"id": account.id, "name": account.name, "balance": account.balance}, version)
+
+
+async def publish_balances(db, version):
+    """Publish the balances of every account after a write that only moved balances"""
+    if broker.active:
+        broker.publish("balances", await db.run_sync(_balances), version)
+
+
+async def publish_bulk_change(db, version):
+    """Publish that many rows changed at once, with the new balances"""
+    if broker.active:
+        broker.publish("changes", {}, version)
+        broker.publish("balances", await db.run_sync(_balances), version)
+
+
+async def stream_events(last_event_id=None):
+    """SSE body for one subscriber, until it disconnects or is dropped"""
+    queue = broker.subscribe()
+    try:
+        # Subscribed first, so no change can slip in between
+        version = await read_data_version()
+        opening = "resync" if last_event_id not in (None, version) else "ready"
+        yield b"retry: " + str(RECONNECT_MS).encode() + b"\n" + encode_event(opening, {"version": version}, version)
+        deadline = asyncio.get_running_loop().time() + EVENTS_STREAM_SECONDS
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return
+            try:
+                frame = await asyncio.wait_for(queue.get(), min(EVENTS_HEARTBEAT_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+                continue
+            if frame is None:
+                return
+            yield frame
+    finally:
+        broker.unsubscribe(queue)
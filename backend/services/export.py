@@ -0,0 +1,174 @@
+"""Streaming writers for the /export endpoint.
+
+Rows are streamed from the async engine with Core ``select()`` in chunks
+(``yield_per``) and encoded one at a time, so memory stays flat, the event
+loop is never blocked, and the first bytes leave as soon as the header is
+written, whatever the size of the ledger. JSON pieces are encoded a chunk
+of rows at a time, through orjson when it is installed. Archived years are
+exported from their own files, oldest first, ahead of the hot table.
+"""
+import csv
+import io
+import zlib
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from database import async_read_engine
+from models.account import Account
+from models.transaction import TRANSACTION_COLUMNS, Transaction
+from models.types import category_codes
+from services import archive
+from services.serialization import dumps
+
+EXPORT_VERSION = "1.0.0"
+CHUNK_ROWS = 1000
+FLUSH_BYTES = 64 * 1024
+
+ACCOUNT_FIELDS = ("id", "name", "balance")
+TRANSACTION_FIELDS = ("id", "amount", "description", "transaction_type", "category", "date", "account_id")
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _account_dict(row) -> dict:
+    return {"id": row.id, "name": row.name, "balance": row.balance}
+
+
+def _transaction_dict(row) -> dict:
+    return {
+        "id": row.id,
+        "amount": row.amount,
+        "description": row.description,
+        "transaction_type": row.transaction_type,
+        "category": row.category,
+        "date": row.date.isoformat() if row.date else None,
+        "account_id": row.account_id,
+    }
+
+
+async def _stream_partitions(conn, statement):
+    """Iterate a Core select in chunks of rows instead of fetching everything"""
+    result = await conn.stream(statement.execution_options(yield_per=CHUNK_ROWS))
+    async for partition in result.partitions():
+        yield partition
+
+
+async def _stream_rows(partitions):
+    async for partition in partitions:
+        for row in partition:
+            yield row
+
+
+async def _transaction_partitions(conn):
+    """Chunks of transactions: every archived year, oldest first, then the hot table"""
+    statement = select(*TRANSACTION_COLUMNS).order_by(Transaction.id)
+    for schema in reversed(archive.partitions(conn)):
+        async for partition in _stream_partitions(conn, archive.on_partition(statement, schema)):
+            yield partition
+
+
+async def _json_items(partitions, to_dict):
+    """Comma separated JSON objects, one encoder call per chunk of rows"""
+    separator = b""
+    async for partition in partitions:
+        # The array's brackets are dropped: the caller writes its own
+        yield separator + dumps([to_dict(row) for row in partition])[1:-1]
+        separator = b","
+
+
+async def _export_info(conn) -> dict:
+    count = select(func.count()).select_from(Transaction)
+    return {
+        "exported_at": datetime.now().isoformat(),
+        "version": EXPORT_VERSION,
+        "total_accounts": await conn.scalar(select(func.count()).select_from(Account)),
+        "total_transactions": sum([
+            await conn.scalar(archive.on_partition(count, schema)) for schema in archive.partitions(conn)
+        ]),
+    }
+
+
+async def _json_pieces(conn):
+    """Same document as the original /export, written incrementally"""
+    info = await _export_info(conn)
+    yield b'{"export_info":' + dumps(info) + b',"accounts":['
+    accounts = _stream_partitions(conn, select(Account.__table__).order_by(Account.id))
+    async for piece in _json_items(accounts, _account_dict):
+        yield piece
+    
+    yield b'],"transactions":['
+    async for piece in _json_items(_transaction_partitions(conn), _transaction_dict):
+        yield piece
+    yield b"]}"
+
+
+async def _ndjson_pieces(conn):
+    """One JSON object per line: export_info, then accounts, then transactions"""
+    yield dumps({"export_info": await _export_info(conn)}) + b"\n"
+    async for partition in _stream_partitions(conn, select(Account.__table__).order_by(Account.id)):
+        yield b"".join(dumps({"account": _account_dict(row)}) + b"\n" for row in partition)
+    async for partition in _transaction_partitions(conn):
+        yield b"".join(dumps({"transaction": _transaction_dict(row)}) + b"\n" for row in partition)
+
+
+async def _csv_pieces(conn):
+    """Transactions only, one CSV row each"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(TRANSACTION_FIELDS)
+    async for row in _stream_rows(_transaction_partitions(conn)):
+        values = _transaction_dict(row)
+        writer.writerow([values[field] for field in TRANSACTION_FIELDS])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+WRITERS = {
+    "json": _json_pieces,
+    "ndjson": _ndjson_pieces,
+    "csv": _csv_pieces,
+}
+
+
+async def stream_export(export_format: str = "json", compress: bool = False):
+    """Yield the encoded export in chunks of roughly FLUSH_BYTES.
+
+    The generator owns its connection, because the response body is sent
+    after the request's dependencies have already been cleaned up. It holds
+    a read transaction until the last row, so the export is consistent
+    under concurrent writes; in WAL mode that does not block them.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    pending = []
+    pending_size = 0
+    
+    async with async_read_engine.connect() as conn:
+        # One snapshot for the counts, the balances and every partition's rows;
+        # closing the connection rolls it back
+        await conn.exec_driver_sql("BEGIN")
+        await category_codes.refresh(conn)
+        async for data in WRITERS[export_format](conn):
+            pending.append(data)
+            pending_size += len(data)
+            if pending_size < FLUSH_BYTES:
+                continue
+            
+            chunk = b"".join(pending)
+            pending, pending_size = [], 0
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+    
+    chunk = b"".join(pending)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
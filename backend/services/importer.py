@@ -0,0 +1,108 @@
+"""Loading of files produced by /export back into the database"""
+import csv
+import gzip
+import io
+import json
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+
+from models.account import Account
+from models.archived_year import ArchivedYear
+from models.daily_balance import DailyBalance
+from models.monthly_rollup import MonthlyRollup
+from models.transaction import Transaction
+from services.change_log import ACCOUNT, INSERT, record_changes, record_reset
+from services.daily_balances import rebuild_daily_balances
+from services.reconcile import set_opening_balances
+from services.ledger import bulk_insert_transactions
+from services.rollups import rebuild_monthly_rollups
+
+
+class ImportFormatError(ValueError):
+    """Raised when an uploaded file cannot be parsed as an export"""
+
+
+def parse_export(body: bytes, export_format: str = "json"):
+    """Split an export file into (accounts, transactions) lists of dicts.
+
+    Gzipped uploads are detected by their magic number. CSV exports only
+    carry transactions, so their account list is empty.
+    """
+    if body[:2] == b"\x1f\x8b":
+        body = gzip.decompress(body)
+    
+    try:
+        text = body.decode("utf-8")
+        if export_format == "json":
+            document = json.loads(text)
+            return document.get("accounts", []), document.get("transactions", [])
+        
+        if export_format == "ndjson":
+            accounts, transactions = [], []
+            for line in text.splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "account" in record:
+                    accounts.append(record["account"])
+                elif "transaction" in record:
+                    transactions.append(record["transaction"])
+            return accounts, transactions
+        
+        if export_format == "csv":
+            return [], list(csv.DictReader(io.StringIO(text)))
+    except (UnicodeDecodeError, json.JSONDecodeError, AttributeError, csv.Error) as e:
+        raise ImportFormatError(f"Invalid {export_format} export: {e}")
+    
+    raise ImportFormatError(f"Unsupported format: {export_format}")
+
+
+def merge_export(db: Session, accounts, transactions) -> dict:
+    """Append the exported transactions to the current ledger.
+
+    Accounts unknown to this database are created empty, every transaction
+    gets a fresh id, and balances move by the imported amounts.
+    """
+    existing = set(db.scalars(select(Account.id)))
+    new_accounts = [
+        {"id": account["id"], "name": account["name"], "balance": 0.0}
+        for account in accounts
+        if account["id"] not in existing
+    ]
+    if new_accounts:
+        db.execute(insert(Account.__table__), new_accounts)
+        record_changes(db, [(ACCOUNT, account["id"], INSERT) for account in new_accounts])
+    
+    rows = [{key: value for key, value in row.items() if key != "id"} for row in transactions]
+    result = bulk_insert_transactions(db, rows)
+    return {"mode": "merge", "accounts_created": len(new_accounts), **result}
+
+
+def restore_export(db: Session, accounts, transactions) -> dict:
+    """Replace the whole ledger with the exported one, ids and balances included.
+
+    Archived years are unregistered, since the export holds their rows too:
+    everything is restored into the hot table. Their files stay on disk.
+    """
+    if not accounts:
+        raise ImportFormatError("A replace import needs the accounts section (use json or ndjson)")
+    
+    db.execute(delete(ArchivedYear))
+    db.execute(delete(MonthlyRollup))
+    db.execute(delete(DailyBalance))
+    db.execute(delete(Transaction))
+    db.execute(delete(Account))
+    db.execute(
+        insert(Account.__table__),
+        [{"id": account["id"], "name": account["name"], "balance": account["balance"]} for account in accounts],
+    )
+    
+    # Exported balances already include every transaction
+    result = bulk_insert_transactions(db, transactions, apply_balances=False, update_rollups=False, log_changes=False)
+    rebuild_monthly_rollups(db)
+    # The export has no opening balances: whatever its transactions do not explain
+    set_opening_balances(db)
+    rebuild_daily_balances(db)
+    record_reset(db)
+    return {"mode": "replace", "accounts_created": len(accounts), "inserted": result["inserted"], "balances": {}}
@@ -0,0 +1,329 @@
+"""Write path for transactions.
+
+Balances are only ever changed with ``UPDATE accounts SET balance = balance
++ :delta``, never read into Python and written back, so concurrent writers
+(including other uvicorn workers) cannot lose each other's updates. Single
+writes start with that UPDATE: it takes SQLite's write lock up front and
+doubles as the account existence check, and RETURNING hands back the rows
+without follow-up SELECTs (SQLite 3.35+).
+
+Bulk rows are inserted with executemany in fixed-size batches. Balance
+changes are summed per account and applied with one UPDATE per account, and
+rollup and daily balance deltas are merged per key, so the cost per row is a
+single parameter set. Queued single writes (services.write_batcher) get the
+same treatment through ``apply_write_batch``. Nothing here commits: the
+caller decides the transaction boundary.
+"""
+from collections import defaultdict
+
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from models.account import Account
+from models.transaction import TRANSACTION_COLUMNS, Transaction
+from models.types import from_cents, to_cents
+from services.archive import archived_year_of, hot_start
+from services.categories import ensure_categories
+from services.change_log import ACCOUNT, DELETE, INSERT, TRANSACTION, UPDATE, record_changes, record_inserted_transactions
+from services.daily_balances import add_to_daily_balances, apply_daily_deltas, signed_cents, snapshot_key
+from services.rollups import add_to_rollup, apply_rollup_deltas, rollup_key
+
+BATCH_SIZE = 1000
+
+
+class UnknownAccountError(LookupError):
+    """Raised when rows reference accounts that do not exist"""
+    
+    def __init__(self, account_ids):
+        self.account_ids = sorted(account_ids)
+        super().__init__(f"Unknown account ids: {self.account_ids}")
+
+
+class TransactionNotFoundError(LookupError):
+    """Raised when a transaction id does not exist"""
+    
+    def __init__(self, transaction_id):
+        self.transaction_id = transaction_id
+        super().__init__(f"Unknown transaction id: {transaction_id}")
+
+
+class ArchivedYearError(ValueError):
+    """Raised when a write is dated in a year that was moved to an archive"""
+    
+    def __init__(self, year):
+        self.year = year
+        super().__init__(f"Transactions of {year} are archived and read-only")
+
+
+def _require_open_years(db: Session, dates):
+    """Refuse dates in archived years; the hot table only takes later ones"""
+    start = hot_start(db)
+    if start is None:
+        return
+    for when in dates:
+        if when is not None and when.year < start.year:
+            raise ArchivedYearError(when.year)
+
+
+def _not_found(db: Session, transaction_id: int) -> Exception:
+    """Error for an id the hot table lacks: archived rows cannot be changed"""
+    year = archived_year_of(db, transaction_id)
+    return TransactionNotFoundError(transaction_id) if year is None else ArchivedYearError(year)
+
+
+def signed_amount(transaction_type: str, amount):
+    """Effect of a transaction on its account balance"""
+    return amount if transaction_type == "entrada" else -amount
+
+
+def apply_balance_deltas(db: Session, deltas) -> dict:
+    """Add ``{account_id: delta}`` to the stored balances; returns new balances"""
+    deltas = {account_id: delta for account_id, delta in deltas.items() if delta}
+    if deltas:
+        db.execute(
+            update(Account.__table__)
+            .where(Account.__table__.c.id == bindparam("account_id"))
+            .values(balance=Account.__table__.c.balance + bindparam("delta")),
+            [{"account_id": account_id, "delta": delta} for account_id, delta in deltas.items()],
+        )
+    return dict(db.execute(select(Account.id, Account.balance).where(Account.id.in_(deltas))).all())
+
+
+def add_to_balance(db: Session, account_id: int, delta: float):
+    """Atomically add ``delta`` to one account; returns the new balance or None if missing"""
+    accounts = Account.__table__
+    statement = (
+        update(accounts)
+        .where(accounts.c.id == account_id)
+        .values(balance=accounts.c.balance + delta)
+    )
+    return db.execute(statement.returning(accounts.c.balance)).scalar()
+
+
+def set_balance(db: Session, account_id: int, balance: float):
+    """Set one account's balance by hand; returns the change, or None if missing.
+
+    The change moves the opening balance with it, since no transaction
+    explains it. The balance is read by a no-op UPDATE, which takes the write
+    lock first, so no write can commit between the read and the new value.
+    """
+    accounts = Account.__table__
+    account = accounts.c.id == account_id
+    previous = db.execute(
+        update(accounts).where(account).values(balance=accounts.c.balance).returning(accounts.c.balance)
+    ).scalar()
+    if previous is None:
+        return None
+    delta = from_cents(to_cents(balance) - to_cents(previous))
+    if delta:
+        db.execute(
+            update(accounts)
+            .where(account)
+            .values(balance=balance, opening_balance=func.coalesce(accounts.c.opening_balance, 0) + delta)
+        )
+    return delta
+
+
+def _require_balance_change(db: Session, account_id: int, delta: float):
+    if add_to_balance(db, account_id, delta) is None:
+        raise UnknownAccountError([account_id])
+
+
+def _ensure_row_categories(db: Session, rows):
+    """Register the categories of ``rows``, and "" for the rollups of uncategorized ones"""
+    ensure_categories(db, {row["category"] or "" for row in rows})
+
+
+def create_transaction(db: Session, values: dict):
+    """Insert one transaction and apply it to its balance and rollup; returns the new row"""
+    transactions = Transaction.__table__
+    _require_balance_change(db, values["account_id"], signed_amount(values["transaction_type"], values["amount"]))
+    _require_open_years(db, [values["date"]])
+    _ensure_row_categories(db, [values])
+    row = db.execute(insert(transactions).values(**values).returning(*TRANSACTION_COLUMNS)).one()
+    add_to_rollup(db, row)
+    add_to_daily_balances(db, row)
+    record_changes(db, [(TRANSACTION, row.id, INSERT), (ACCOUNT, row.account_id, UPDATE)])
+    return row
+
+
+def update_transaction(db: Session, transaction_id: int, values: dict):
+    """Replace a transaction's values, moving its effect between balances and rollups"""
+    transactions = Transaction.__table__
+    _require_balance_change(db, values["account_id"], signed_amount(values["transaction_type"], values["amount"]))
+    _require_open_years(db, [values["date"]])
+    
+    old = db.execute(select(*TRANSACTION_COLUMNS).where(transactions.c.id == transaction_id)).first()
+    if old is None:
+        raise _not_found(db, transaction_id)
+    
+    _ensure_row_categories(db, [values])
+    row = db.execute(
+        update(transactions)
+        .where(transactions.c.id == transaction_id)
+        .values(**values)
+        .returning(*TRANSACTION_COLUMNS)
+    ).one()
+    add_to_balance(db, old.account_id, -signed_amount(old.transaction_type, old.amount))
+    
+    rollup_deltas = defaultdict(lambda: [0.0, 0])
+    daily_deltas = defaultdict(lambda: [0, 0])
+    for transaction, sign in ((old, -1), (row, 1)):
+        entry = rollup_deltas[rollup_key(transaction.account_id, transaction.date, transaction.transaction_type, transaction.category)]
+        entry[0] += sign * transaction.amount
+        entry[1] += sign
+        entry = daily_deltas[snapshot_key(transaction.account_id, transaction.date)]
+        entry[0] += sign * signed_cents(transaction.transaction_type, transaction.amount)
+        entry[1] += sign
+    apply_rollup_deltas(db, {key: tuple(value) for key, value in rollup_deltas.items()})
+    apply_daily_deltas(db, {key: tuple(value) for key, value in daily_deltas.items()})
+    record_changes(db, [(TRANSACTION, row.id, UPDATE)] + [(ACCOUNT, account_id, UPDATE) for account_id in {old.account_id, row.account_id}])
+    return row
+
+
+def delete_transaction(db: Session, transaction_id: int):
+    """Delete a transaction and revert its effect; returns the deleted row"""
+    transactions = Transaction.__table__
+    row = db.execute(
+        delete(transactions).where(transactions.c.id == transaction_id).returning(*TRANSACTION_COLUMNS)
+    ).first()
+    if row is None:
+        raise _not_found(db, transaction_id)
+    
+    add_to_balance(db, row.account_id, -signed_amount(row.transaction_type, row.amount))
+    add_to_rollup(db, row, -1)
+    add_to_daily_balances(db, row, -1)
+    record_changes(db, [(TRANSACTION, row.id, DELETE), (ACCOUNT, row.account_id, UPDATE)])
+    return row
+
+
+def bulk_insert_transactions(
+    db: Session, rows, apply_balances: bool = True, update_rollups: bool = True, log_changes: bool = True
+) -> dict:
+    """Insert many transactions at once.
+
+    ``rows`` are dicts with the TransactionCreate fields (plus ``id`` when
+    restoring an export). Returns the number of inserted rows and the new
+    balance of every touched account. ``log_changes`` relies on fresh ids
+    growing past the current maximum, so it must be off for explicit ids.
+    """
+    rows = list(rows)
+    _require_open_years(db, (row["date"] for row in rows))
+    account_ids = {row["account_id"] for row in rows}
+    existing = set(db.scalars(select(Account.id).where(Account.id.in_(account_ids))))
+    missing = account_ids - existing
+    if missing:
+        raise UnknownAccountError(missing)
+    
+    # Sums are kept in integer cents so thousands of rows add up exactly
+    balance_deltas = defaultdict(int)
+    rollup_deltas = defaultdict(lambda: [0, 0])
+    daily_deltas = defaultdict(lambda: [0, 0])
+    for row in rows:
+        amount = to_cents(row["amount"])
+        balance_deltas[row["account_id"]] += signed_amount(row["transaction_type"], amount)
+        entry = rollup_deltas[rollup_key(row["account_id"], row["date"], row["transaction_type"], row["category"])]
+        entry[0] += amount
+        entry[1] += 1
+        entry = daily_deltas[snapshot_key(row["account_id"], row["date"])]
+        entry[0] += signed_amount(row["transaction_type"], amount)
+        entry[1] += 1
+    
+    _ensure_row_categories(db, rows)
+    last_id = db.scalar(select(func.max(Transaction.id))) if log_changes else None
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.execute(insert(Transaction.__table__), rows[start:start + BATCH_SIZE])
+    if log_changes:
+        record_inserted_transactions(db, last_id)
+    
+    if update_rollups:
+        apply_rollup_deltas(db, {key: (from_cents(amount), count) for key, (amount, count) in rollup_deltas.items()})
+    
+    balances = {}
+    if apply_balances:
+        balances = apply_balance_deltas(db, {account_id: from_cents(delta) for account_id, delta in balance_deltas.items()})
+        # Snapshots derive from the balances, so they follow them
+        apply_daily_deltas(db, {key: tuple(value) for key, value in daily_deltas.items()})
+        if log_changes:
+            record_changes(db, [(ACCOUNT, account_id, UPDATE) for account_id in sorted(balance_deltas)])
+    return {"inserted": len(rows), "balances": balances}
+
+
+def apply_write_batch(db: Session, operations) -> list:
+    """Apply queued single writes together, merging their side effects.
+
+    ``operations`` are ``(kind, args)`` pairs, in order: ``("create",
+    (values,))``, ``("update", (transaction_id, values))`` or ``("delete",
+    (transaction_id,))``. Each row statement runs on its own, but balance,
+    rollup and daily balance deltas are summed per key and applied once for
+    the whole batch. Returns one entry per operation: the resulting row, or
+    the error it failed with (a failed operation changes nothing).
+    """
+    transactions = Transaction.__table__
+    start = hot_start(db)
+    values_list = [args[-1] for kind, args in operations if kind != "delete"]
+    account_ids = {values["account_id"] for values in values_list}
+    existing = set(db.scalars(select(Account.id).where(Account.id.in_(account_ids)))) if account_ids else set()
+    _ensure_row_categories(db, [values for values in values_list if values["account_id"] in existing])
+    
+    balance_deltas = defaultdict(int)
+    rollup_deltas = defaultdict(lambda: [0, 0])
+    daily_deltas = defaultdict(lambda: [0, 0])
+    
+    def account_for(row, sign):
+        amount = to_cents(row.amount)
+        balance_deltas[row.account_id] += sign * signed_amount(row.transaction_type, amount)
+        entry = rollup_deltas[rollup_key(row.account_id, row.date, row.transaction_type, row.category)]
+        entry[0] += sign * amount
+        entry[1] += sign
+        entry = daily_deltas[snapshot_key(row.account_id, row.date)]
+        entry[0] += sign * signed_amount(row.transaction_type, amount)
+        entry[1] += sign
+    
+    results = []
+    changes = []
+    for kind, args in operations:
+        if kind != "delete" and args[-1]["account_id"] not in existing:
+            results.append(UnknownAccountError([args[-1]["account_id"]]))
+            continue
+        if kind != "delete" and start is not None and args[-1]["date"].year < start.year:
+            results.append(ArchivedYearError(args[-1]["date"].year))
+            continue
+        
+        if kind == "create":
+            row = db.execute(insert(transactions).values(**args[0]).returning(*TRANSACTION_COLUMNS)).one()
+        elif kind == "update":
+            transaction_id, values = args
+            old = db.execute(select(*TRANSACTION_COLUMNS).where(transactions.c.id == transaction_id)).first()
+            if old is None:
+                results.append(_not_found(db, transaction_id))
+                continue
+            row = db.execute(
+                update(transactions)
+                .where(transactions.c.id == transaction_id)
+                .values(**values)
+                .returning(*TRANSACTION_COLUMNS)
+            ).one()
+            account_for(old, -1)
+        elif kind == "delete":
+            row = db.execute(
+                delete(transactions).where(transactions.c.id == args[0]).returning(*TRANSACTION_COLUMNS)
+            ).first()
+            if row is None:
+                results.append(_not_found(db, args[0]))
+                continue
+            account_for(row, -1)
+            results.append(row)
+            changes.append((TRANSACTION, row.id, DELETE))
+            continue
+        else:
+            raise ValueError(f"Unknown write operation: {kind}")
+        account_for(row, 1)
+        results.append(row)
+        changes.append((TRANSACTION, row.id, INSERT if kind == "create" else UPDATE))
+    
+    apply_rollup_deltas(db, {key: (from_cents(amount), count) for key, (amount, count) in rollup_deltas.items()})
+    apply_balance_deltas(db, {account_id: from_cents(delta) for account_id, delta in balance_deltas.items()})
+    apply_daily_deltas(db, {key: tuple(value) for key, value in daily_deltas.items()})
+    record_changes(db, changes + [(ACCOUNT, account_id, UPDATE) for account_id in sorted(balance_deltas)])
+    return results
@@ -0,0 +1,309 @@
+"""Request and SQL metrics in the Prometheus text format.
+
+``MetricsMiddleware`` times every request and keeps a per-request record in
+a context variable. The engine hooks in database.py report each statement
+through ``record_query``, and ``TimedRoute`` times the endpoint function,
+so a request's latency splits into three phases:
+
+* ``sql``: statements executing in SQLite (rows fetched included),
+* ``app``: the rest of the endpoint: ORM hydration and Python code,
+* ``serialize``: after the endpoint returns: Pydantic validation, JSON
+  encoding and sending the body (streamed bodies include their SQL here).
+
+Statements repeated ``N_PLUS_ONE_THRESHOLD`` times within one request are
+reported as a likely N+1 pattern, and statements slower than
+``SLOW_QUERY_MS`` are logged. With ``ENABLE_PROFILING`` set, adding
+``?profile=cprofile`` (or ``pyinstrument`` when installed) to a request
+returns a profile of it instead of its response.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import Counter as Tally
+from contextvars import ContextVar
+from functools import wraps
+from urllib.parse import parse_qs
+
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+PROFILING_ENABLED = os.getenv("ENABLE_PROFILING", "false").lower() in ("1", "true", "yes")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+STATEMENT_KINDS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, description, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [count per bucket..., +Inf count, sum]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for labels, series in sorted(self.values.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, [('le', '+Inf')])} {series[-2]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-1]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-2]}")
+        return lines
+
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+PHASE_LATENCY = Histogram(
+    "http_request_phase_seconds", "Request time spent in SQL, in the endpoint outside SQL and serializing", ("route", "phase")
+)
+REQUEST_QUERIES = Histogram("http_request_db_queries", "SQL statements per request", ("route",), QUERY_COUNT_BUCKETS)
+QUERY_LATENCY = Histogram("db_query_duration_seconds", "SQL statement latency", ("statement",))
+SLOW_QUERIES = Counter("db_slow_queries_total", f"Statements slower than {SLOW_QUERY_MS:g} ms", ("route",))
+N_PLUS_ONE = Counter("db_n_plus_one_total", "Requests repeating one statement like an N+1 pattern", ("route",))
+EVENTS_PUBLISHED = Counter("events_published_total", "Server-sent events published, by type", ("event",))
+EVENT_SUBSCRIBERS_DROPPED = Counter("events_dropped_subscribers_total", "Event stream clients disconnected for falling behind")
+BALANCE_DRIFTS = Counter("ledger_balance_drifts_total", "Accounts found by reconciliation with a balance off their transactions")
+
+METRICS = (
+    REQUESTS, REQUEST_LATENCY, PHASE_LATENCY, REQUEST_QUERIES, QUERY_LATENCY, SLOW_QUERIES, N_PLUS_ONE,
+    EVENTS_PUBLISHED, EVENT_SUBSCRIBERS_DROPPED, BALANCE_DRIFTS,
+)
+
+
+def render_metrics() -> str:
+    """Every metric in the Prometheus text exposition format"""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+class RequestStats:
+    """What one request did, filled in by the hooks while it runs"""
+    __slots__ = ("route", "queries", "sql_seconds", "endpoint_seconds", "statements")
+
+    def __init__(self):
+        self.route = None
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.endpoint_seconds = None
+        self.statements = Tally()
+
+
+_current_request = ContextVar("request_stats", default=None)
+
+
+def record_query(statement: str, seconds: float, executemany: bool = False):
+    """Account one executed statement (called from the engine hooks)"""
+    words = statement.split(None, 1)
+    kind = words[0].upper() if words else ""
+    QUERY_LATENCY.observe((kind if kind in STATEMENT_KINDS else "OTHER",), seconds)
+
+    stats = _current_request.get()
+    route = "-"
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += seconds
+        # Batches are one statement on purpose, not an N+1
+        if not executemany:
+            stats.statements[statement] += 1
+        route = stats.route or route
+
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc((route,))
+        logger.warning("Slow query (%.1f ms) in %s: %s", seconds * 1000, route, " ".join(statement.split())[:1000])
+
+
+def _timed(call, route_path):
+    """Wrap an endpoint so it records its route and its own duration"""
+    def start():
+        stats = _current_request.get()
+        if stats is not None:
+            stats.route = route_path
+        return stats, time.perf_counter()
+
+    def finish(stats, started):
+        if stats is not None:
+            stats.endpoint_seconds = time.perf_counter() - started
+
+    if asyncio.iscoroutinefunction(call):
+        @wraps(call)
+        async def timed_call(**values):
+            stats, started = start()
+            try:
+                return await call(**values)
+            finally:
+                finish(stats, started)
+    else:
+        @wraps(call)
+        def timed_call(**values):
+            stats, started = start()
+            try:
+                return call(**values)
+            finally:
+                finish(stats, started)
+    return timed_call
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that records its path and how long the endpoint itself takes"""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, endpoint, **kwargs)
+        # The request handler looks dependant.call up on every request
+        self.dependant.call = _timed(self.dependant.call, self.path_format)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, phases and SQL use per route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if PROFILING_ENABLED:
+            mode = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile")
+            if mode:
+                await self._profile(scope, receive, send, mode[0])
+                return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+            self._record(scope, stats, status, elapsed)
+
+    def _record(self, scope, stats, status, elapsed):
+        # Requests answered by the response cache never reach a route
+        route = stats.route or ("response_cache" if scope.get("response_cache") else "unmatched")
+        REQUESTS.inc((scope["method"], route, str(status)))
+        REQUEST_LATENCY.observe((scope["method"], route), elapsed)
+        REQUEST_QUERIES.observe((route,), stats.queries)
+
+        if stats.endpoint_seconds is not None:
+            PHASE_LATENCY.observe((route, "sql"), stats.sql_seconds)
+            PHASE_LATENCY.observe((route, "app"), max(0.0, stats.endpoint_seconds - stats.sql_seconds))
+            PHASE_LATENCY.observe((route, "serialize"), max(0.0, elapsed - stats.endpoint_seconds))
+
+        repeated = [(statement, count) for statement, count in stats.statements.items() if count >= N_PLUS_ONE_THRESHOLD]
+        if repeated:
+            N_PLUS_ONE.inc((route,))
+            for statement, count in repeated:
+                logger.warning("Possible N+1 in %s %s: %d executions of %s",
+                               scope["method"], route, count, " ".join(statement.split())[:500])
+
+    async def _profile(self, scope, receive, send, mode):
+        """Run the request under a profiler and answer with the report"""
+        status = 500
+
+        async def discard(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        # Profile the real work, not a cached copy of it
+        scope = {**scope, "profiling": True}
+
+        if mode == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                mode = "cprofile"
+            else:
+                profiler = Profiler(async_mode="enabled")
+                profiler.start()
+                try:
+                    await self.app(scope, receive, discard)
+                finally:
+                    profiler.stop()
+                await self._send_report(send, profiler.output_html().encode("utf-8"), "text/html; charset=utf-8", status)
+                return
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.disable()
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(60)
+        await self._send_report(send, report.getvalue().encode("utf-8"), "text/plain; charset=utf-8", status)
+
+    async def _send_report(self, send, body, content_type, status):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", content_type.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"x-profiled-status", str(status).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
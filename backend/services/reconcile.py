@@ -0,0 +1,222 @@
+"""Reconciliation of the stored account balances against the ledger.
+
+``accounts.balance`` is a running total that every write moves by a delta
+(see services.ledger) and nothing ever recomputes. ``reconcile_balances``
+recomputes every account's balance as its ``opening_balance`` plus its
+transactions, with one grouped SUM per partition (the hot table and each
+attached archive) in integer cents, and reports the accounts whose stored
+balance drifted from it. Both are read in one transaction, so a write
+committing meanwhile is either in the sums and the balances or in neither;
+a million transactions take well under a second.
+
+``opening_balance`` holds what no transaction explains: the balance an
+account was created with, moved by every balance set by hand through
+``PUT /accounts/{id}``. Those are legitimate and never count as drift.
+Databases from before the column existed get it filled in on startup by
+``ensure_opening_balances``, taking whatever their balances held then.
+
+With ``fix`` a drifted balance is moved onto its ledger total, and the
+account's daily balance snapshots, which are derived from it, by the same
+correction. The check runs again under the write lock first, so writes are
+only held up when there is something to fix.
+
+``manage.py reconcile [--fix]`` runs it once. With
+``RECONCILE_INTERVAL_MINUTES`` set, the API also runs it in the background
+on a connection of its own; aiosqlite executes it off the event loop, and
+the read transaction does not block writers in WAL mode.
+"""
+import asyncio
+import logging
+import os
+
+from sqlalchemy import bindparam, case, func, select, update
+
+from database import async_engine
+from models.account import Account
+from models.daily_balance import DailyBalance
+from models.transaction import Transaction
+from models.types import Money, cents, from_cents
+from services import archive, columnar
+from services.change_log import ACCOUNT, UPDATE, record_changes
+from services.data_version import bump_data_version
+from services.events import publish_balances
+from services.ledger import apply_balance_deltas
+from services.metrics import BALANCE_DRIFTS
+
+logger = logging.getLogger(__name__)
+
+# 0 leaves the background reconciliation off
+RECONCILE_INTERVAL_MINUTES = float(os.getenv("RECONCILE_INTERVAL_MINUTES", "0"))
+RECONCILE_FIX = os.getenv("RECONCILE_FIX", "false").lower() in ("1", "true", "yes")
+
+_signed_cents = case(
+    (Transaction.transaction_type == "entrada", cents(Transaction.amount)),
+    else_=-cents(Transaction.amount),
+)
+LEDGER_TOTALS = select(Transaction.account_id, func.sum(_signed_cents)).group_by(Transaction.account_id)
+
+
+class BalanceDrift:
+    """An account whose stored balance is not its opening balance plus its transactions"""
+    __slots__ = ("account_id", "name", "stored", "expected")
+
+    def __init__(self, account_id, name, stored, expected):
+        self.account_id = account_id
+        self.name = name
+        # Both in integer cents
+        self.stored = stored
+        self.expected = expected
+
+    @property
+    def drift(self) -> float:
+        """Stored minus expected, in reais"""
+        return from_cents(self.stored - self.expected)
+
+
+def ledger_totals(db) -> dict:
+    """``{account_id: cents}`` every account's transactions add up to, archives included"""
+    totals = {}
+    # Not the attachments: a replace import unregisters the archives inside this transaction
+    for schema in archive.registered_partitions(db):
+        for account_id, total in db.execute(archive.on_partition(LEDGER_TOTALS, schema)):
+            totals[account_id] = totals.get(account_id, 0) + total
+    return totals
+
+
+def set_opening_balances(db, account_ids=None):
+    """Store as opening balance what the transactions do not explain of each balance.
+
+    Covers ``account_ids``, default all. The caller commits.
+    """
+    totals = ledger_totals(db)
+    balances = select(Account.id, func.coalesce(cents(Account.balance), 0))
+    if account_ids is not None:
+        balances = balances.where(Account.id.in_(account_ids))
+    openings = [
+        {"account": account_id, "opening": from_cents(balance - totals.get(account_id, 0))}
+        for account_id, balance in db.execute(balances)
+    ]
+    if openings:
+        accounts = Account.__table__
+        db.execute(
+            update(accounts).where(accounts.c.id == bindparam("account")).values(opening_balance=bindparam("opening")),
+            openings,
+        )
+
+
+def ensure_opening_balances(conn):
+    """Fill in the opening balances of accounts created before they were stored"""
+    missing = conn.scalars(select(Account.id).where(Account.opening_balance.is_(None))).all()
+    if missing:
+        set_opening_balances(conn, missing)
+
+
+def _find_drifts(conn) -> list:
+    totals = ledger_totals(conn)
+    accounts = select(
+        Account.id,
+        Account.name,
+        func.coalesce(cents(Account.balance), 0),
+        func.coalesce(cents(Account.opening_balance), 0),
+    ).order_by(Account.id)
+    drifts = []
+    for account_id, name, stored, opening in conn.execute(accounts):
+        expected = opening + totals.get(account_id, 0)
+        if stored != expected:
+            drifts.append(BalanceDrift(account_id, name, stored, expected))
+    return drifts
+
+
+def reconcile_balances(conn, fix: bool = False) -> list:
+    """Accounts whose stored balance drifted from their opening balance plus transactions.
+
+    ``conn`` is a sync Connection with no transaction in progress; the
+    transaction this opens is left to the caller, who commits it after a
+    fix (and bumps the data version) or rolls it back.
+    """
+    conn.exec_driver_sql("BEGIN")
+    drifts = _find_drifts(conn)
+    if not (fix and drifts):
+        return drifts
+
+    conn.rollback()
+    # The write lock is held from the check to the fix, so no write can slip in between
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    drifts = _find_drifts(conn)
+    if not drifts:
+        return drifts
+    corrections = {drift.account_id: from_cents(drift.expected - drift.stored) for drift in drifts}
+    apply_balance_deltas(conn, corrections)
+    # Snapshots are the balance minus what came after, so they move with it
+    snapshots = DailyBalance.__table__
+    conn.execute(
+        update(snapshots)
+        .where(snapshots.c.account_id == bindparam("snapshot_account"))
+        .values(closing_balance=snapshots.c.closing_balance + bindparam("correction", type_=Money)),
+        [{"snapshot_account": account_id, "correction": correction} for account_id, correction in corrections.items()],
+    )
+    record_changes(conn, [(ACCOUNT, account_id, UPDATE) for account_id in corrections])
+    return drifts
+
+
+def _log(drifts, fixed):
+    for drift in drifts:
+        logger.warning(
+            "Balance of account %s (%s) is %.2f, its opening balance and transactions add up to %.2f (drift %+.2f)%s",
+            drift.account_id, drift.name, from_cents(drift.stored), from_cents(drift.expected), drift.drift,
+            ", fixed" if fixed else "",
+        )
+
+
+def _replay(store, drifts):
+    for drift in drifts:
+        store.set_balance(drift.account_id, from_cents(drift.expected))
+
+
+async def run_reconciliation(fix: bool = RECONCILE_FIX) -> list:
+    """Reconcile on a pooled async connection and publish what a fix changed"""
+    async with async_engine.connect() as conn:
+        drifts = await conn.run_sync(reconcile_balances, fix)
+        if not (fix and drifts):
+            await conn.rollback()
+        else:
+            version = await conn.run_sync(bump_data_version)
+            await columnar.commit(conn, version, lambda store: _replay(store, drifts))
+            await publish_balances(conn, version)
+    BALANCE_DRIFTS.inc(amount=len(drifts))
+    _log(drifts, fix)
+    return drifts
+
+
+class ReconcileScheduler:
+    """Background task reconciling the balances every ``interval_minutes``"""
+
+    def __init__(self, interval_minutes=RECONCILE_INTERVAL_MINUTES, fix=RECONCILE_FIX):
+        self.interval = interval_minutes * 60
+        self.fix = fix
+        self.task = None
+
+    def start(self):
+        if self.interval > 0 and self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        task, self.task = self.task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await run_reconciliation(self.fix)
+            except Exception:
+                logger.exception("Balance reconciliation failed")
+
+
+scheduler = ReconcileScheduler()
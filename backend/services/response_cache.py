@@ -0,0 +1,153 @@
+"""Server-side cache for GET responses, validated by the data version.
+
+Entries are keyed by route, query parameters and the negotiation headers,
+and remember the data version they were rendered at. A hit is served only
+while the version is unchanged, so any write makes every entry stale at
+once without tracking which routes it affected. The same version is sent as
+a weak ``ETag``; clients echoing it in ``If-None-Match`` get a bodiless 304.
+"""
+import os
+from collections import OrderedDict
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from models.types import category_codes
+from services.data_version import read_data_version
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(1024 * 1024)))
+CACHED_PREFIXES = ("/accounts", "/transactions", "/categories", "/changes")
+VARY_HEADERS = ("accept", "accept-encoding")
+
+# Clients must revalidate, but may keep the body around to do it with an ETag
+CACHE_CONTROL = "no-cache"
+
+
+class ResponseCache:
+    """Bounded LRU of rendered responses"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key, version):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] != version:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def set(self, key, version, headers, body):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (version, headers, body)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def cache_key(scope, headers: Headers):
+    """Route, query parameters (order-insensitive by name) and negotiation headers"""
+    query = parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+    # Stable sort keeps the order of repeated parameters such as account_ids
+    query.sort(key=lambda pair: pair[0])
+    return (
+        scope["path"],
+        tuple(query),
+        tuple(headers.get(name, "") for name in VARY_HEADERS),
+    )
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match requires
+    return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware serving cached GET responses and 304s"""
+
+    def __init__(self, app, prefixes=CACHED_PREFIXES, cache: ResponseCache = None):
+        self.app = app
+        self.prefixes = prefixes
+        self.cache = cache if cache is not None else ResponseCache()
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "GET"
+            or not scope["path"].startswith(self.prefixes)
+            # Profiled requests must run for real
+            or scope.get("profiling")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = Headers(scope=scope)
+        version = await read_data_version()
+        etag = f'W/"{version}"'
+
+        if etag_matches(request_headers.get("if-none-match", ""), etag):
+            scope["response_cache"] = "not_modified"
+            await self._send_not_modified(send, etag)
+            return
+
+        key = cache_key(scope, request_headers)
+        entry = self.cache.get(key, version)
+        if entry is not None:
+            scope["response_cache"] = "hit"
+            await self._send_cached(send, entry)
+            return
+
+        await self._render_and_store(scope, receive, send, key, version, etag)
+
+    async def _send_not_modified(self, send, etag):
+        await send({
+            "type": "http.response.start",
+            "status": 304,
+            "headers": [
+                (b"etag", etag.encode("latin-1")),
+                (b"cache-control", CACHE_CONTROL.encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _send_cached(self, send, entry):
+        _, headers, body = entry
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _render_and_store(self, scope, receive, send, key, version, etag):
+        """Run the endpoint, tag successful responses and keep small ones"""
+        state = {"store": False, "headers": None, "size": 0}
+        chunks = []
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                if message["status"] == 200:
+                    headers = MutableHeaders(scope=message)
+                    headers["etag"] = etag
+                    headers["cache-control"] = CACHE_CONTROL
+                    state["store"] = True
+                    state["headers"] = list(message["headers"])
+            elif message["type"] == "http.response.body" and state["store"]:
+                body = message.get("body", b"")
+                state["size"] += len(body)
+                if state["size"] > RESPONSE_CACHE_MAX_BYTES:
+                    state["store"] = False
+                    chunks.clear()
+                else:
+                    chunks.append(body)
+                    # Not while a category missed: the next request reloads them and renders it right
+                    if not message.get("more_body", False) and not category_codes.stale:
+                        self.cache.set(key, version, state["headers"], b"".join(chunks))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
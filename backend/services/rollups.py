@@ -0,0 +1,117 @@
+"""Maintenance of the monthly_rollups table.
+
+Every transaction write adds (or removes) its amount from the rollup row of
+its (account, year, month, type, category) inside the caller's session, so
+the rollup commits or rolls back together with the transaction itself.
+"""
+from sqlalchemy import delete, func, insert, literal, select, cast, tuple_, Integer
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models.monthly_rollup import MonthlyRollup
+from models.transaction import Transaction
+from models.types import CategoryName
+from services.archive import hot_start
+from services.categories import ensure_categories
+
+
+def rollup_key(account_id, date, transaction_type, category):
+    """Rollup primary key for a transaction's values"""
+    return (account_id, date.year, date.month, transaction_type, category or "")
+
+
+def apply_rollup_deltas(db: Session, deltas):
+    """Upsert a batch of ``{rollup_key: (amount, count)}`` deltas"""
+    rows = [
+        {
+            "account_id": account_id,
+            "year": year,
+            "month": month,
+            "transaction_type": transaction_type,
+            "category": category,
+            "total_amount": amount,
+            "transaction_count": count,
+        }
+        for (account_id, year, month, transaction_type, category), (amount, count) in deltas.items()
+        if count or amount
+    ]
+    if not rows:
+        return
+    
+    statement = sqlite_insert(MonthlyRollup)
+    statement = statement.on_conflict_do_update(
+        index_elements=["account_id", "year", "month", "transaction_type", "category_id"],
+        set_={
+            "total_amount": MonthlyRollup.total_amount + statement.excluded.total_amount,
+            "transaction_count": MonthlyRollup.transaction_count + statement.excluded.transaction_count,
+        },
+    )
+    db.execute(statement, rows)
+    
+    # Months emptied by deletes or edits should not linger as zero rows
+    removed = [key for key, (_, count) in deltas.items() if count < 0]
+    if removed:
+        db.execute(
+            delete(MonthlyRollup).where(
+                tuple_(
+                    MonthlyRollup.account_id,
+                    MonthlyRollup.year,
+                    MonthlyRollup.month,
+                    MonthlyRollup.transaction_type,
+                    MonthlyRollup.category,
+                ).in_(removed),
+                MonthlyRollup.transaction_count <= 0,
+            )
+        )
+
+
+def add_to_rollup(db: Session, transaction, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) one transaction from the rollups"""
+    key = rollup_key(transaction.account_id, transaction.date, transaction.transaction_type, transaction.category)
+    apply_rollup_deltas(db, {key: (sign * transaction.amount, sign)})
+
+
+def rebuild_monthly_rollups(db: Session) -> int:
+    """Recompute every rollup row from the transactions table.
+
+    Rollups of archived years cannot change and are kept: only the years of
+    the hot table are rebuilt. Returns the number of rollup rows in the
+    table. The caller commits.
+    """
+    year = cast(func.strftime('%Y', Transaction.date), Integer)
+    month = cast(func.strftime('%m', Transaction.date), Integer)
+    # Uncategorized rows are counted under the "" category
+    ensure_categories(db, [""])
+    category = func.coalesce(Transaction.category, literal("", CategoryName))
+    
+    grouped = select(
+        Transaction.account_id,
+        year,
+        month,
+        Transaction.transaction_type,
+        category,
+        func.sum(Transaction.amount),
+        func.count(Transaction.id),
+    ).where(Transaction.date.is_not(None)).group_by(
+        Transaction.account_id, year, month, Transaction.transaction_type, category
+    )
+    
+    clear = delete(MonthlyRollup)
+    start = hot_start(db)
+    if start is not None:
+        clear = clear.where(MonthlyRollup.year >= start.year)
+    db.execute(clear)
+    db.execute(
+        insert(MonthlyRollup).from_select(
+            ["account_id", "year", "month", "transaction_type", "category", "total_amount", "transaction_count"],
+            grouped,
+        )
+    )
+    return db.scalar(select(func.count()).select_from(MonthlyRollup))
+
+
+def rollups_need_rebuild(db: Session) -> bool:
+    """True when transactions exist but no rollups have been built yet"""
+    has_rollups = db.scalar(select(MonthlyRollup.account_id).limit(1)) is not None
+    has_transactions = db.scalar(select(Transaction.id).limit(1)) is not None
+    return has_transactions and not has_rollups
@@ -0,0 +1,154 @@
+"""SQLite FTS5 index over transaction descriptions and categories.
+
+``transactions_fts`` is an external-content FTS5 table: it stores only the
+token index and reads the text back from the ``transactions_search`` view,
+which resolves category ids to their names. Triggers keep it in sync with
+every insert, update and delete, whichever code path (ORM, executemany bulk
+loads, imports) makes the change.
+
+Year archives (services.archive) carry their own ``transactions_fts`` under
+the same name. Archives never change, so theirs is contentless: filled once
+when the archive is written, with no view or triggers behind it.
+"""
+import logging
+
+from sqlalchemy import Column, MetaData, Table, literal_column, select, text
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "transactions_fts"
+CONTENT_VIEW = "transactions_search"
+TOKENIZE = "unicode61 remove_diacritics 2"
+
+# Set once the index exists; searches fall back to LIKE without FTS5 support
+fts_enabled = False
+
+# A Table rather than a table() clause, so schema_translate_map reaches it
+# and the same search runs against an archive's index
+_fts = Table(FTS_TABLE, MetaData(), Column("rowid"), Column("rank"))
+
+_CREATE_VIEW = f"""
+CREATE VIEW IF NOT EXISTS {CONTENT_VIEW} AS
+SELECT transactions.id, transactions.description, categories.name AS category
+FROM transactions LEFT JOIN categories ON categories.id = transactions.category_id
+"""
+
+_CREATE_TABLE = f"""
+CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+    description,
+    category,
+    content='{CONTENT_VIEW}',
+    content_rowid='id',
+    tokenize='{TOKENIZE}'
+)
+"""
+
+_OLD_CATEGORY = "(SELECT name FROM categories WHERE id = old.category_id)"
+_NEW_CATEGORY = "(SELECT name FROM categories WHERE id = new.category_id)"
+
+_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, category)
+        VALUES (new.id, new.description, {_NEW_CATEGORY});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, category)
+        VALUES ('delete', old.id, old.description, {_OLD_CATEGORY});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description, category_id ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, description, category)
+        VALUES ('delete', old.id, old.description, {_OLD_CATEGORY});
+        INSERT INTO {FTS_TABLE}(rowid, description, category)
+        VALUES (new.id, new.description, {_NEW_CATEGORY});
+    END
+    """,
+]
+
+
+def ensure_search_index(conn) -> bool:
+    """Create the FTS table and its triggers if missing, filling it on creation.
+
+    Returns False when the SQLite build has no FTS5 support.
+    """
+    global fts_enabled
+    
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {"name": FTS_TABLE},
+    ).first()
+    
+    try:
+        conn.execute(text(_CREATE_VIEW))
+        if not exists:
+            conn.execute(text(_CREATE_TABLE))
+        for trigger in _TRIGGERS:
+            conn.execute(text(trigger))
+    except OperationalError as e:
+        logger.warning("Full-text search disabled, FTS5 is not available: %s", e)
+        fts_enabled = False
+        return False
+    
+    if not exists:
+        rebuild_search_index(conn)
+    fts_enabled = True
+    return True
+
+
+def drop_search_index(conn):
+    """Remove the FTS table and its triggers (ensure_search_index recreates them)"""
+    for trigger in ("insert", "delete", "update"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{trigger}"))
+    conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+
+
+def rebuild_search_index(conn):
+    """Re-tokenize every transaction into the FTS index"""
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def create_archive_search_index(conn, schema: str) -> bool:
+    """Create and fill the contentless FTS table of the archive attached as ``schema``.
+
+    Returns False, leaving the archive without an index, when the SQLite
+    build has no FTS5 support.
+    """
+    try:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {schema}.{FTS_TABLE} USING fts5("
+            f"description, category, content='', tokenize='{TOKENIZE}')"
+        ))
+    except OperationalError as e:
+        logger.warning("Archive %s has no full-text index, FTS5 is not available: %s", schema, e)
+        return False
+    conn.execute(text(
+        f"INSERT INTO {schema}.{FTS_TABLE}(rowid, description, category) "
+        f"SELECT archived.id, archived.description, categories.name FROM {schema}.transactions AS archived "
+        "LEFT JOIN main.categories ON categories.id = archived.category_id"
+    ))
+    return True
+
+
+def build_match_query(search: str) -> str:
+    """Turn free text into an FTS5 query: every word must match as a prefix"""
+    terms = []
+    for word in search.split():
+        terms.append('"' + word.replace('"', '""') + '"*')
+    return " ".join(terms)
+
+
+def search_subquery(search: str):
+    """Subquery of (rowid, rank) for the transactions matching ``search``.
+
+    ``rank`` is FTS5's bm25 score: lower values are better matches.
+    """
+    return (
+        select(_fts.c.rowid, _fts.c.rank)
+        .where(literal_column(FTS_TABLE).op("MATCH")(build_match_query(search)))
+        .subquery("search_matches")
+    )
@@ -0,0 +1,76 @@
+"""Response encoding: fast JSON, optional MessagePack and row-level helpers.
+
+``JSONResponse`` renders with orjson when it is installed and with the
+standard library otherwise, and is the app's default response class. Large
+list endpoints skip Pydantic entirely: they select plain rows with Core,
+turn them into dicts with ``rows_to_dicts`` and hand them to
+``negotiated_response``, which answers in MessagePack when the client asks
+for it (``Accept: application/msgpack``) and msgpack is installed.
+"""
+import json
+from datetime import date, datetime
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional: the standard json module is used without it
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: clients asking for MessagePack get JSON
+    msgpack = None
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _default(value):
+    """Encode the types the standard encoders do not know"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def dumps(value) -> bytes:
+    """Compact UTF-8 JSON, through orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class JSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class MessagePackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def rows_to_dicts(rows, fields):
+    """Plain dicts from Core rows, one zip per row instead of a model"""
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def wants_msgpack(accept: str) -> bool:
+    """True when the Accept header prefers MessagePack and it can be produced"""
+    if msgpack is None or not accept:
+        return False
+    for item in accept.split(","):
+        media_type, _, params = item.strip().partition(";")
+        if media_type.strip().lower() in MSGPACK_MEDIA_TYPES:
+            return "q=0" not in params.replace(" ", "").split(";")
+    return False
+
+
+def negotiated_response(request, content, headers=None) -> Response:
+    """MessagePack or JSON response, following the request's Accept header"""
+    if wants_msgpack(request.headers.get("accept", "")):
+        return MessagePackResponse(content, headers=headers)
+    return JSONResponse(content, headers=headers)
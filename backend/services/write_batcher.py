@@ -0,0 +1,138 @@
+"""Optional group commit for single transaction writes.
+
+With ``WRITE_BATCHING`` on, creating, updating and deleting one transaction
+no longer commits per request. The request queues its operation and waits;
+a single writer task takes everything queued (up to ``WRITE_BATCH_SIZE``),
+applies it in one session with balance, rollup and daily balance deltas
+merged per key (see ``ledger.apply_write_batch``) and commits once. A burst
+of N writes then costs one fsync and one hold of SQLite's write lock, and
+requests of this process never compete for that lock with each other.
+
+An operation that fails on its own (unknown account or transaction) gets its
+error back while the rest of its batch commits. If the batch itself fails
+before its commit, its operations are retried one at a time so only the
+faulty one reports it. Once committed, a batch is never retried: what fails
+afterwards (publishing its events) is logged and the writes stand.
+"""
+import asyncio
+import logging
+import os
+
+from database import AsyncSessionLocal
+from services import columnar
+from services.data_version import bump_data_version
+from services.events import TRANSACTION_OPS, publish_transactions
+from services.ledger import apply_write_batch
+
+logger = logging.getLogger(__name__)
+
+WRITE_BATCHING = os.getenv("WRITE_BATCHING", "false").lower() in ("1", "true", "yes")
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "64"))
+# Extra wait for company after the first write of a batch; 0 takes what is queued
+WRITE_BATCH_WAIT_MS = float(os.getenv("WRITE_BATCH_WAIT_MS", "0"))
+
+REPLAY = {"create": "insert", "update": "update", "delete": "delete"}
+
+
+def _replay(store, operations, results):
+    """Apply a committed batch to the columnar store"""
+    for (kind, _), result in zip(operations, results):
+        if not isinstance(result, Exception):
+            getattr(store, REPLAY[kind])(result)
+
+
+class WriteBatcher:
+    """Queue of pending writes and the task that group-commits them"""
+
+    def __init__(self, enabled=WRITE_BATCHING, max_batch=WRITE_BATCH_SIZE, wait_ms=WRITE_BATCH_WAIT_MS):
+        self.enabled = enabled
+        self.max_batch = max(1, max_batch)
+        self.wait = wait_ms / 1000
+        self.queue = None
+        self.task = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if self.enabled and not self.running:
+            self.queue = asyncio.Queue()
+            self.task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Commit what is still queued, then end the writer task"""
+        if not self.running:
+            return
+        task, self.task = self.task, None
+        await self.queue.put(None)
+        await task
+
+    async def submit(self, kind: str, *args):
+        """Queue ``ledger`` operation ``kind`` and wait for its committed row"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(((kind, args), future))
+        return await future
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            if self.wait:
+                await asyncio.sleep(self.wait)
+            while len(batch) < self.max_batch and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._commit(batch)
+
+    async def _commit(self, batch):
+        operations = [operation for operation, _ in batch]
+        try:
+            results = await self._apply(operations)
+        except Exception as e:
+            if len(batch) > 1:
+                logger.warning("Write batch of %d failed, retrying one by one", len(batch), exc_info=True)
+                for item in batch:
+                    await self._commit([item])
+                return
+            results = [e]
+
+        for (_, future), result in zip(batch, results):
+            # The request may have gone away; its write stands regardless
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _apply(self, operations):
+        async with AsyncSessionLocal() as db:
+            try:
+                results = await db.run_sync(apply_write_batch, operations)
+                if all(isinstance(result, Exception) for result in results):
+                    await db.rollback()
+                    return results
+                version = await db.run_sync(bump_data_version)
+                await columnar.commit(db, version, lambda store: _replay(store, operations, results))
+            except BaseException:
+                await db.rollback()
+                raise
+            try:
+                await publish_transactions(db, version, [
+                    (TRANSACTION_OPS[kind], result)
+                    for (kind, _), result in zip(operations, results)
+                    if not isinstance(result, Exception)
+                ])
+            except Exception:
+                logger.exception("Publishing a committed write batch failed")
+        return results
+
+
+batcher = WriteBatcher()
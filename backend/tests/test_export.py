@@ -0,0 +1,115 @@
+"""Exports taken while transactions are being written.
+
+database.py binds DATABASE_DIR when it is imported, so the app runs in a
+subprocess of its own against the test's database directory.
+"""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Exports the ledger while writes commit, then prints the exports and the balances before the writes
+EXPORT_DURING_WRITES = """
+import asyncio
+import json
+import random
+import httpx
+import main
+from services import export
+
+# Small chunks: more points where a write can commit in the middle of an export
+export.CHUNK_ROWS = 100
+rng = random.Random(11)
+
+def transaction():
+    return {
+        "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00",
+        "description": "Teste",
+        "transaction_type": rng.choice(["entrada", "saida"]),
+        "category": "Lazer",
+        "amount": round(rng.uniform(1, 500), 2),
+        "account_id": rng.randint(1, 3),
+    }
+
+async def export_during_writes():
+    await main.app.router.startup()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        assert (await client.post("/transactions/bulk", json=[transaction() for _ in range(20000)])).status_code == 200
+        before = (await client.get("/export")).json()
+
+        exporting = True
+
+        async def write():
+            while exporting:
+                assert (await client.post("/transactions/", json=transaction())).status_code == 200
+
+        async def export_all():
+            nonlocal exporting
+            try:
+                # Both formats, while the writers keep committing
+                return [
+                    (await client.get("/export", params={"format": export_format})).text
+                    for export_format in ("json", "ndjson") * 3
+                ]
+            finally:
+                exporting = False
+
+        exports, _, _ = await asyncio.gather(export_all(), write(), write())
+    await main.app.router.shutdown()
+    return {"before": before, "json": exports[0::2], "ndjson": exports[1::2]}
+
+print(json.dumps(asyncio.run(export_during_writes())))
+"""
+
+
+def signed_totals(transactions):
+    totals = {}
+    for row in transactions:
+        cents = round(row["amount"] * 100)
+        totals[row["account_id"]] = totals.get(row["account_id"], 0) + (cents if row["transaction_type"] == "entrada" else -cents)
+    return totals
+
+
+def assert_consistent(document, openings):
+    info, accounts, transactions = document
+    assert info["total_transactions"] == len(transactions)
+    assert info["total_accounts"] == len(accounts)
+    totals = signed_totals(transactions)
+    for account in accounts:
+        assert round(account["balance"] * 100) == openings[account["id"]] + totals.get(account["id"], 0)
+
+
+def parse_ndjson(text):
+    records = [json.loads(line) for line in text.splitlines() if line]
+    return (
+        records[0]["export_info"],
+        [record["account"] for record in records if "account" in record],
+        [record["transaction"] for record in records if "transaction" in record],
+    )
+
+
+def test_export_is_one_snapshot(tmp_path):
+    result = subprocess.run(
+        [sys.executable, "-c", EXPORT_DURING_WRITES],
+        cwd=BACKEND,
+        env={**os.environ, "DATABASE_DIR": str(tmp_path)},
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    exports = json.loads(result.stdout.splitlines()[-1])
+
+    # What each balance holds beyond its transactions, fixed since no balance is set by hand
+    before = exports["before"]
+    totals = signed_totals(before["transactions"])
+    openings = {account["id"]: round(account["balance"] * 100) - totals.get(account["id"], 0) for account in before["accounts"]}
+
+    for text in exports["json"]:
+        document = json.loads(text)
+        assert_consistent((document["export_info"], document["accounts"], document["transactions"]), openings)
+    for text in exports["ndjson"]:
+        assert_consistent(parse_ndjson(text), openings)
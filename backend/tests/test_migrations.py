@@ -0,0 +1,135 @@
+"""Upgrading databases created by the first release of the app.
+
+database.py binds DATABASE_DIR when it is imported, so each upgrade starts
+the app in a subprocess of its own against a copy of the database.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Schema as the first release created it: REAL amounts, text categories and types
+BASELINE_SCHEMA = """
+CREATE TABLE accounts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    balance REAL NOT NULL DEFAULT 0.0
+);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TIMESTAMP NOT NULL,
+    description TEXT NOT NULL,
+    transaction_type TEXT NOT NULL,
+    category TEXT,
+    amount REAL NOT NULL,
+    account_id INTEGER,
+    FOREIGN KEY (account_id) REFERENCES accounts (id)
+);
+"""
+
+START_APP = """
+import json
+from fastapi.testclient import TestClient
+import main
+with TestClient(main.app) as client:
+    accounts = client.get("/accounts/").json()
+    transactions = client.get("/transactions/", params={"limit": 100000}).json()
+print(json.dumps({"accounts": accounts, "transactions": transactions}))
+"""
+
+
+def start_app(database_dir):
+    """Start the app on ``database_dir``; returns what it serves afterwards"""
+    result = subprocess.run(
+        [sys.executable, "-c", START_APP],
+        cwd=BACKEND,
+        env={**os.environ, "DATABASE_DIR": str(database_dir)},
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def baseline_rows(path):
+    with sqlite3.connect(path) as conn:
+        accounts = conn.execute("SELECT id, name, balance FROM accounts ORDER BY id").fetchall()
+        transactions = conn.execute(
+            "SELECT id, description, transaction_type, category, amount, account_id FROM transactions ORDER BY id"
+        ).fetchall()
+    return accounts, transactions
+
+
+def assert_upgraded(served, accounts, transactions):
+    assert [(a["id"], a["name"], a["balance"]) for a in served["accounts"]] == [
+        (account_id, name, round(balance, 2)) for account_id, name, balance in accounts
+    ]
+    assert sorted(
+        (t["id"], t["description"], t["transaction_type"], t["category"], t["amount"], t["account_id"])
+        for t in served["transactions"]
+    ) == [
+        (transaction_id, description, "entrada" if kind == "entrada" else "saida", category, round(amount, 2), account_id)
+        for transaction_id, description, kind, category, amount, account_id in transactions
+    ]
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    path = tmp_path / "financial_dashboard.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+        conn.executemany(
+            "INSERT INTO accounts (name, balance) VALUES (?, ?)",
+            [("Conta Corrente", 1234.56), ("Conta Poupança", 0.1 + 0.2), ("Carteira", -10.0)],
+        )
+        conn.executemany(
+            "INSERT INTO transactions (date, description, transaction_type, category, amount, account_id) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                ("2024-01-05 10:00:00", "Salário", "entrada", "Salário", 5000.0, 1),
+                ("2024-01-06 12:30:00", "Mercado", "saida", "Alimentação", 321.99, 1),
+                ("2024-02-01 08:00:00", "Aluguel", "saida", "Moradia", 1500.0, 2),
+                ("2024-02-10 19:45:00", "Cinema", "saida", None, 45.5, 3),
+            ],
+        )
+    return path
+
+
+def test_upgrade_baseline_database(baseline_db):
+    accounts, transactions = baseline_rows(baseline_db)
+    served = start_app(baseline_db.parent)
+    assert_upgraded(served, accounts, transactions)
+    with sqlite3.connect(baseline_db) as conn:
+        assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+        assert "accounts_real" not in {name for name, in conn.execute("SELECT name FROM sqlite_master")}
+    # Already upgraded: a second start changes nothing
+    assert start_app(baseline_db.parent) == served
+    # Balances set before opening balances were stored are not drift
+    result = subprocess.run(
+        [sys.executable, "manage.py", "reconcile"],
+        cwd=BACKEND,
+        env={**os.environ, "DATABASE_DIR": str(baseline_db.parent)},
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    assert "Every account balance matches" in result.stdout, result.stdout
+
+
+def test_upgrade_tracked_database(tmp_path):
+    path = tmp_path / "financial_dashboard.db"
+    shutil.copy(os.path.join(BACKEND, "financial_dashboard.db"), path)
+    with sqlite3.connect(path) as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(transactions)")}
+    if "category" not in columns:
+        pytest.skip("the tracked database is not in the baseline schema")
+    accounts, transactions = baseline_rows(path)
+    assert_upgraded(start_app(tmp_path), accounts, transactions)
@@ -0,0 +1,95 @@
+"""Balance reconciliation after the writes that legitimately move balances.
+
+database.py binds DATABASE_DIR when it is imported, so every step runs in a
+subprocess of its own against the test's database directory.
+"""
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEED = """
+import random
+from fastapi.testclient import TestClient
+import main
+rng = random.Random(7)
+transactions = [
+    {
+        "date": f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00",
+        "description": "Teste",
+        "transaction_type": rng.choice(["entrada", "saida"]),
+        "category": rng.choice(["Alimentação", "Lazer"]),
+        "amount": round(rng.uniform(1, 500), 2),
+        "account_id": rng.randint(1, 3),
+    }
+    for year in (2021, 2022, 2023)
+    for _ in range(50)
+]
+with TestClient(main.app) as client:
+    assert client.post("/transactions/bulk", json=transactions).status_code == 200
+"""
+
+REPLACE_IMPORT = """
+from fastapi.testclient import TestClient
+import main
+with TestClient(main.app) as client:
+    export = client.get("/export").content
+    response = client.post("/import", params={"mode": "replace"}, content=export)
+    assert response.status_code == 200, response.text
+"""
+
+# Balances set by hand while transactions commit on the same account
+CONCURRENT_UPDATES = """
+import asyncio
+import httpx
+import main
+
+async def write():
+    await main.app.router.startup()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        transaction = {
+            "date": "2024-05-01T12:00:00", "description": "Teste", "transaction_type": "entrada",
+            "category": "Lazer", "amount": 10.0, "account_id": 1,
+        }
+        account = {"name": "Conta Corrente", "balance": 100.0}
+        responses = await asyncio.gather(*(
+            client.put("/accounts/1", json=account) if number % 3 == 0 else client.post("/transactions/", json=transaction)
+            for number in range(60)
+        ))
+    await main.app.router.shutdown()
+    assert all(response.status_code == 200 for response in responses)
+
+asyncio.run(write())
+"""
+
+
+def run(database_dir, *args):
+    result = subprocess.run(
+        [sys.executable, *args],
+        cwd=BACKEND,
+        env={**os.environ, "DATABASE_DIR": str(database_dir)},
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_replace_import_after_archiving(tmp_path):
+    run(tmp_path, "-c", SEED)
+    assert "archived" in run(tmp_path, "manage.py", "archive-year", "2021")
+    assert "Every account balance matches" in run(tmp_path, "manage.py", "reconcile")
+
+    # The archive stays attached to pooled connections, but the import unregistered it
+    run(tmp_path, "-c", REPLACE_IMPORT)
+    output = run(tmp_path, "manage.py", "reconcile")
+    assert "Every account balance matches" in output, output
+
+
+def test_balances_set_during_writes(tmp_path):
+    run(tmp_path, "-c", CONCURRENT_UPDATES)
+    output = run(tmp_path, "manage.py", "reconcile")
+    assert "Every account balance matches" in output, output
@@ -117,49 +117,35 @@ const AdvancedStats = ({ accounts = [], selectedAccountIds = [] }) => {
           startDate.setMonth(endDate.getMonth() - 3);
       }
 
-      const response = await fetch('http://localhost:8000/transactions/');
-      
-      if (!response.ok) {
-        throw new Error(`Erro ao carregar transações: ${response.status} ${response.statusText}`);
-      }
-      
-      const allTransactions = await response.json();
-      
-      if (!Array.isArray(allTransactions)) {
-        throw new Error('Dados de transações inválidos recebidos do servidor');
-      }
-      
-      // Filter transactions by period
-      let filteredTransactions = allTransactions.filter(t => {
-        const transactionDate = new Date(t.date);
-        return transactionDate >= startDate && transactionDate <= endDate;
+      const params = new URLSearchParams({
+        start_date: startDate.toISOString().split('T')[0],
+        end_date: endDate.toISOString().split('T')[0]
       });
-
-      // Filter by selected accounts
-      if (selectedAccounts.length > 0) {
-        filteredTransactions = filteredTransactions.filter(t => 
-          selectedAccounts.includes(t.account_id)
-        );
-      }
-
-      // Apply value filters
+      selectedAccounts.forEach(accountId => params.append('account_ids', accountId));
       if (valueFilters.minAmount !== '') {
-        const minAmount = parseFloat(valueFilters.minAmount);
-        filteredTransactions = filteredTransactions.filter(t => t.amount >= minAmount);
+        params.append('min_amount', parseFloat(valueFilters.minAmount));
       }
-
       if (valueFilters.maxAmount !== '') {
-        const maxAmount = parseFloat(valueFilters.maxAmount);
-        filteredTransactions = filteredTransactions.filter(t => t.amount <= maxAmount);
+        params.append('max_amount', parseFloat(valueFilters.maxAmount));
       }
-
       if (valueFilters.transactionType !== 'all') {
-        filteredTransactions = filteredTransactions.filter(t => 
-          t.transaction_type === valueFilters.transactionType
-        );
+        params.append('transaction_type', valueFilters.transactionType);
       }
 
-      calculateStats(filteredTransactions);
+      // Aggregation happens server-side; only the summary comes back
+      const response = await fetch(`http://localhost:8000/transactions/stats?${params.toString()}`);
+      
+      if (!response.ok) {
+        throw new Error(`Erro ao carregar estatísticas: ${response.status} ${response.statusText}`);
+      }
+      
+      const summary = await response.json();
+      
+      if (!summary || !summary.totals) {
+        throw new Error('Dados de estatísticas inválidos recebidos do servidor');
+      }
+      
+      calculateStats(summary);
     } catch (error) {
       console.error('Erro ao carregar estatísticas:', error);
       setError(error.message || 'Erro ao carregar estatísticas. Verifique se o backend está rodando.');
@@ -172,8 +158,8 @@ const AdvancedStats = ({ accounts = [], selectedAccountIds = [] }) => {
     loadAdvancedStats();
   }, [loadAdvancedStats]);
 
-  const calculateStats = (transactions) => {
-    if (!transactions || transactions.length === 0) {
+  const calculateStats = (summary) => {
+    if (!summary || summary.totals.count === 0) {
       setStats({
         totalIncome: 0,
         totalExpenses: 0,
@@ -191,60 +177,32 @@ const AdvancedStats = ({ accounts = [], selectedAccountIds = [] }) => {
       return;
     }
 
-    const income = transactions.filter(t => t.transaction_type === 'entrada');
-    const expenses = transactions.filter(t => t.transaction_type === 'saida');
-    
-    const totalIncome = income.reduce((sum, t) => sum + (t.amount || 0), 0);
-    const totalExpenses = expenses.reduce((sum, t) => sum + (t.amount || 0), 0);
-    const netIncome = totalIncome - totalExpenses;
+    const totalIncome = summary.totals.entrada || 0;
+    const totalExpenses = summary.totals.saida || 0;
+    const netIncome = summary.totals.net || 0;
 
     // Category analysis
-    const categoryMap = {};
-    expenses.forEach(t => {
-      const category = t.category || 'Não categorizado';
-      if (categoryMap[category]) {
-        categoryMap[category] += t.amount || 0;
-      } else {
-        categoryMap[category] = t.amount || 0;
-      }
-    });
-
-    const categoryStats = Object.entries(categoryMap)
-      .map(([category, amount]) => ({
-        category,
-        amount,
-        percentage: totalExpenses > 0 ? ((amount / totalExpenses) * 100).toFixed(1) : 0
+    const categoryStats = summary.by_category
+      .filter(c => c.transaction_type === 'saida')
+      .map(c => ({
+        category: c.category || 'Não categorizado',
+        amount: c.total,
+        percentage: totalExpenses > 0 ? ((c.total / totalExpenses) * 100).toFixed(1) : 0
       }))
       .sort((a, b) => b.amount - a.amount);
 
     // Monthly trends
-    const monthlyMap = {};
-    transactions.forEach(t => {
-      const transactionDate = new Date(t.date);
-      if (isNaN(transactionDate.getTime())) return; // Skip invalid dates
-      
-      const monthKey = transactionDate.toISOString().substring(0, 7);
-      if (!monthlyMap[monthKey]) {
-        monthlyMap[monthKey] = { income: 0, expense: 0 };
-      }
-      
-      if (t.transaction_type === 'entrada') {
-        monthlyMap[monthKey].income += t.amount || 0;
-      } else if (t.transaction_type === 'saida') {
-        monthlyMap[monthKey].expense += t.amount || 0;
-      }
-    });
-
-    const monthlyTrends = Object.entries(monthlyMap)
-      .map(([month, data]) => ({
-        month: new Date(month + '-01').toLocaleDateString('pt-BR', { 
+    const monthlyTrends = summary.by_month
+      .filter(m => m.month)
+      .map(m => ({
+        month: new Date(m.month + '-01').toLocaleDateString('pt-BR', { 
           month: 'short', 
           year: 'numeric' 
         }),
-        monthKey: month,
-        income: data.income,
-        expense: data.expense,
-        net: data.income - data.expense
+        monthKey: m.month,
+        income: m.entrada,
+        expense: m.saida,
+        net: m.net
       }))
       .sort((a, b) => a.monthKey.localeCompare(b.monthKey));
 
@@ -253,9 +211,8 @@ const AdvancedStats = ({ accounts = [], selectedAccountIds = [] }) => {
       ? monthlyTrends.reduce((sum, m) => sum + m.net, 0) / monthlyTrends.length 
       : 0;
 
-    const largestExpense = expenses.length > 0 
-      ? Math.max(...expenses.map(t => t.amount || 0)) 
-      : 0;
+    const expenseStats = summary.by_type.saida;
+    const largestExpense = expenseStats ? expenseStats.max : 0;
 
     const savingsRate = totalIncome > 0 ? ((netIncome / totalIncome) * 100).toFixed(1) : 0;
 
@@ -270,7 +227,7 @@ const AdvancedStats = ({ accounts = [], selectedAccountIds = [] }) => {
       performanceMetrics: {
         savingsRate,
         expenseRatio: totalIncome > 0 ? ((totalExpenses / totalIncome) * 100).toFixed(1) : 0,
-        avgDailyExpense: expenses.length > 0 ? (totalExpenses / 30).toFixed(2) : 0
+        avgDailyExpense: expenseStats ? (totalExpenses / 30).toFixed(2) : 0
       }
     });
   };
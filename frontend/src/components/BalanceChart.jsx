@@ -64,19 +64,20 @@ const BalanceChart = ({ accounts }) => {
     
     setLoading(true);
     try {
-      const historyPromises = selectedAccounts.map(async (accountId) => {
-        const response = await fetch(
-          `http://localhost:8000/accounts/${accountId}/balance-history?days=${selectedPeriod}`
-        );
-        const data = await response.json();
-        return { accountId, data };
+      // One request for every selected account; long periods use weekly points
+      const params = new URLSearchParams({
+        days: selectedPeriod,
+        resolution: selectedPeriod > 120 ? 'week' : 'day'
       });
-      
-      const results = await Promise.all(historyPromises);
+      selectedAccounts.forEach(accountId => params.append('account_ids', accountId));
+      const response = await fetch(
+        `http://localhost:8000/accounts/balance-history?${params.toString()}`
+      );
+      const data = await response.json();
       const historyMap = {};
       
-      results.forEach(({ accountId, data }) => {
-        historyMap[accountId] = data;
+      selectedAccounts.forEach(accountId => {
+        historyMap[accountId] = data[accountId] || [];
       });
       
       setBalanceHistory(historyMap);
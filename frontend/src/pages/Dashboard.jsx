@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback } from 'react';
+import React, { useState, useEffect, useCallback, useRef } from 'react';
 import {
   Container,
   Grid,
@@ -129,6 +129,67 @@ const Dashboard = () => {
     loadTransactions();
   }, [loadAccounts, loadTransactions]);
 
+  // The event stream outlives filter changes, so it calls the latest loader
+  const loadTransactionsRef = useRef(loadTransactions);
+  useEffect(() => {
+    loadTransactionsRef.current = loadTransactions;
+  }, [loadTransactions]);
+
+  // Live updates pushed by the server (/events) instead of polling
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') return undefined;
+
+    const source = new EventSource('http://localhost:8000/events');
+    let reloadTimer = null;
+
+    // One write sends several events; refetch the list once for all of them
+    const reloadTransactions = () => {
+      clearTimeout(reloadTimer);
+      reloadTimer = setTimeout(() => {
+        apiCache.clear('transactions');
+        loadTransactionsRef.current();
+      }, 300);
+    };
+
+    const applyBalances = (event) => {
+      const balances = JSON.parse(event.data);
+      setAccounts(prevAccounts =>
+        prevAccounts.map(account =>
+          balances[account.id] !== undefined ? { ...account, balance: balances[account.id] } : account
+        )
+      );
+      apiCache.clear('accounts');
+    };
+
+    const applyAccount = (event) => {
+      const updatedAccount = JSON.parse(event.data);
+      setAccounts(prevAccounts =>
+        prevAccounts.some(account => account.id === updatedAccount.id)
+          ? prevAccounts.map(account => (account.id === updatedAccount.id ? updatedAccount : account))
+          : [...prevAccounts, updatedAccount]
+      );
+      apiCache.clear('accounts');
+    };
+
+    // Changes were missed while disconnected: reload everything
+    const resync = () => {
+      apiCache.clear('accounts');
+      loadAccounts();
+      reloadTransactions();
+    };
+
+    source.addEventListener('transaction', reloadTransactions);
+    source.addEventListener('changes', reloadTransactions);
+    source.addEventListener('balances', applyBalances);
+    source.addEventListener('account', applyAccount);
+    source.addEventListener('resync', resync);
+
+    return () => {
+      clearTimeout(reloadTimer);
+      source.close();
+    };
+  }, [loadAccounts]);
+
   const handleExportDatabase = async () => {
     setExportLoading(true);
     try {
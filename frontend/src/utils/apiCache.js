@@ -1,8 +1,10 @@
-// Sistema de cache simples para melhorar performance
+// Cache de respostas revalidado pelo ETag do backend: os dados ficam em
+// memória e cada leitura pergunta ao servidor se mudaram (If-None-Match).
+// Sem alterações o backend responde 304 sem corpo, então nunca servimos
+// saldos desatualizados e uma view repetida custa quase nada.
 class ApiCache {
   constructor() {
     this.cache = new Map();
-    this.cacheTimeout = 30000; // 30 segundos
   }
 
   // Gerar chave de cache baseada na URL e parâmetros
@@ -11,28 +13,17 @@ class ApiCache {
     return `${url}${paramString ? '?' + paramString : ''}`;
   }
 
-  // Verificar se o cache é válido
-  isValid(timestamp) {
-    return Date.now() - timestamp < this.cacheTimeout;
-  }
-
   // Obter dados do cache
   get(key) {
     const cached = this.cache.get(key);
-    if (cached && this.isValid(cached.timestamp)) {
-      return cached.data;
-    }
-    // Remover cache expirado
-    if (cached) {
-      this.cache.delete(key);
-    }
-    return null;
+    return cached ? cached.data : null;
   }
 
   // Definir dados no cache
-  set(key, data) {
+  set(key, data, etag = null) {
     this.cache.set(key, {
       data,
+      etag,
       timestamp: Date.now()
     });
   }
@@ -50,26 +41,24 @@ class ApiCache {
     }
   }
 
-  // Fazer fetch com cache
+  // Fazer fetch revalidando o cache com o ETag
   async fetchWithCache(url, params = {}) {
     const key = this.generateKey(url, params);
-    const cached = this.get(key);
-    
-    if (cached) {
-      return cached;
-    }
-
-    const queryString = new URLSearchParams(params).toString();
-    const fullUrl = `${url}${queryString ? '?' + queryString : ''}`;
+    const cached = this.cache.get(key);
+    const headers = cached && cached.etag ? { 'If-None-Match': cached.etag } : {};
     
     try {
-      const response = await fetch(fullUrl);
+      const response = await fetch(key, { headers });
+      if (response.status === 304 && cached) {
+        cached.timestamp = Date.now();
+        return cached.data;
+      }
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
       
       const data = await response.json();
-      this.set(key, data);
+      this.set(key, data, response.headers.get('ETag'));
       return data;
     } catch (error) {
       console.error('Erro ao fazer fetch:', error);